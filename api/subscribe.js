@@ -1,5 +1,5 @@
 // api/subscribe.js
-import { getCollection } from '../lib/mongo.js';
+import { applyStatsDelta, getCollection } from '../lib/mongo.js';
 
 function setCORS(res) {
   const allow = process.env.CORS_ORIGIN || '*';
@@ -35,8 +35,8 @@ export default async (req, res) => {
     const now = new Date();
     const email_lc = email.toLowerCase(); // 与 Python 脚本保持一致
 
-    // 使用 email_lc 作为查询条件，因为数据库有 email_lc 的唯一索引
-    const r = await coll.updateOne(
+    // 使用 email_lc 作为查询条件，因为数据库有 email_lc 的唯一索引；取回修改前的文档以增量更新统计
+    const before = await coll.findOneAndUpdate(
       { email_lc },
       {
         $set: { 
@@ -48,10 +48,11 @@ export default async (req, res) => {
         },
         $setOnInsert: { createdAt: now }
       },
-      { upsert: true }
+      { upsert: true, returnDocument: 'before', projection: { _id: 0, email_lc: 1, status: 1, tags: 1 } }
     );
+    await applyStatsDelta(before, { email_lc, status: 'active', tags });
 
-    console.log('[subscribe] upsert result:', r);
+    console.log('[subscribe] upsert:', before ? 'updated' : 'inserted', email_lc);
 
     // 发送确认邮件（异步，不阻塞响应）
     const { sendConfirmationEmail } = await import('../lib/email.js');
@@ -1,5 +1,6 @@
 // api/unsubscribe.js
-import { getCollection } from '../lib/mongo.js';
+import { applyStatsDelta, getCollection } from '../lib/mongo.js';
+import { validToken } from '../lib/unsub.js';
 
 function setCORS(res) {
   const allow = process.env.CORS_ORIGIN || '*';
@@ -18,14 +19,38 @@ export default async (req, res) => {
     const email = (body.email || '').trim().toLowerCase();
     if (!email) return res.status(400).json({ ok: false, error: 'Email required' });
 
-    const coll = await getCollection();
     const email_lc = email.toLowerCase();
+    const coll = await getCollection();
+    // 配置了 UNSUB_SECRET 时必须带有效的 token（邮件里的签名链接）
+    if (process.env.UNSUB_SECRET) {
+      if (!body.token) {
+        // 手动退订（只填了邮箱）：给该地址发一封带签名链接的确认邮件，点了才退订。
+        // 无论地址是否在订阅列表里都返回同样的结果，不泄露订阅状态
+        if (!body.website) {
+          const sub = await coll.findOne({ email_lc, status: 'active' }, { projection: { _id: 0, email: 1 } });
+          if (sub) {
+            const { sendUnsubscribeConfirmation } = await import('../lib/email.js');
+            sendUnsubscribeConfirmation(sub.email || email).catch(err => {
+              console.error('[unsubscribe] Failed to send confirmation email:', err);
+            });
+          }
+        }
+        console.log('[unsubscribe] confirmation requested:', email_lc);
+        return res.status(202).json({ ok: true, pending: true, email });
+      }
+      if (!validToken(email_lc, body.token)) {
+        return res.status(403).json({ ok: false, error: 'Invalid unsubscribe link' });
+      }
+    }
+
     // 使用 email_lc 作为查询条件，保持与索引一致
-    const r = await coll.updateOne(
+    const before = await coll.findOneAndUpdate(
       { email_lc }, 
-      { $set: { status: 'inactive', updatedAt: new Date() } }
+      { $set: { status: 'inactive', updatedAt: new Date() } },
+      { returnDocument: 'before', projection: { _id: 0, email_lc: 1, status: 1, tags: 1 } }
     );
-    console.log('[unsubscribe] update result:', r);
+    if (before) await applyStatsDelta(before, { ...before, status: 'inactive' });
+    console.log('[unsubscribe] update:', before ? 'matched' : 'not found', email_lc);
 
     return res.status(200).json({ ok: true, email });
   } catch (err) {
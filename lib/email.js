@@ -8,6 +8,7 @@ import nodemailer from 'nodemailer';
 import { readFileSync } from 'fs';
 import { fileURLToPath } from 'url';
 import { dirname, join } from 'path';
+import { unsubLink } from './unsub.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -36,6 +37,10 @@ function getTransporter() {
   return transporter;
 }
 
+function escapeAttr(s) {
+  return String(s).replace(/&/g, '&amp;').replace(/"/g, '&quot;').replace(/</g, '&lt;');
+}
+
 /**
  * 发送确认邮件给新订阅者
  */
@@ -51,10 +56,8 @@ export async function sendConfirmationEmail(email) {
     const templatePath = join(__dirname, '..', 'src', 'confirmation_email_template.html');
     let template = readFileSync(templatePath, 'utf-8');
     
-    // 替换模板变量
-    const unsubUrl = process.env.UNSUB_URL || 'https://web-production-914f7.up.railway.app/unsubscribe.html';
-    template = template.replace(/\{\{UNSUB_URL\}\}/g, unsubUrl);
-    template = template.replace(/\{\{EMAIL\}\}/g, encodeURIComponent(email));
+    // 替换模板变量（退订链接带签名 token，点开即可退订）
+    template = template.replace(/\{\{UNSUB_LINK\}\}/g, escapeAttr(unsubLink(email)));
     
     const confirmationHtml = template;
     
@@ -73,3 +76,31 @@ export async function sendConfirmationEmail(email) {
   }
 }
 
+
+/**
+ * 手动退订（没有签名链接）时发送确认邮件：点其中的签名链接才真正退订
+ */
+export async function sendUnsubscribeConfirmation(email) {
+  const trans = getTransporter();
+  if (!trans) {
+    console.warn('[email] Cannot send unsubscribe confirmation: transporter not configured');
+    return false;
+  }
+
+  try {
+    const link = escapeAttr(unsubLink(email));
+    const info = await trans.sendMail({
+      from: `"TechSum" <${process.env.EMAIL_USER}>`,
+      to: email,
+      subject: 'Confirm your unsubscribe from TechSum',
+      html: `<p>We received a request to unsubscribe this address from the TechSum newsletter.</p>
+<p><a href="${link}">Confirm unsubscribe</a></p>
+<p>If you did not ask for this, you can ignore this email and you will stay subscribed.</p>`
+    });
+    console.log(`[email] Unsubscribe confirmation sent to ${email}:`, info.messageId);
+    return true;
+  } catch (error) {
+    console.error(`[email] Failed to send unsubscribe confirmation to ${email}:`, error);
+    return false;
+  }
+}
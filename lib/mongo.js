@@ -28,4 +28,77 @@ async function getCollection() {
   return _db.collection(collName);
 }
 
-export { getCollection };
+// ---- 订阅者统计汇总（与 scripts/mongo.py 同一份文档：MONGODB_STATS_COLL / subscriber_stats，_id="subscribers"）----
+// {total, status: {active: n}, tags: {preview: n}, status_tags: {active: {preview: n}}, refreshed_at, updated_at}
+const STATS_ID = 'subscribers';
+
+async function getStatsCollection() {
+  await getCollection();
+  return _db.collection(process.env.MONGODB_STATS_COLL || 'subscriber_stats');
+}
+
+// 字段名里不能有 "." 或以 "$" 开头：换成全角字符（与 mongo.py 的 stats_key 相同）
+function statsKey(s) {
+  return String(s ?? 'unknown').replace(/\./g, '．').replace(/\$/g, '＄');
+}
+
+function statsShape(doc) {
+  if (!doc || doc.email_lc == null) return null;
+  const tags = Array.isArray(doc.tags) ? [...new Set(doc.tags.map(statsKey))] : [];
+  return { s: statsKey(doc.status), tags };
+}
+
+// 一条订阅者从 before 变成 after（插入 / 删除时为 null）后按差值 $inc，读统计时不必扫全表。
+// 不 upsert：汇总文档还不存在时改为整体重算（这条变更已写入，重算会包含它），免得留下只含增量的残缺文档
+async function applyStatsDelta(before, after) {
+  const inc = {};
+  for (const [shape, sign] of [[statsShape(before), -1], [statsShape(after), 1]]) {
+    if (!shape) continue;
+    const keys = ['total', `status.${shape.s}`,
+      ...shape.tags.map(t => `tags.${t}`), ...shape.tags.map(t => `status_tags.${shape.s}.${t}`)];
+    for (const k of keys) inc[k] = (inc[k] || 0) + sign;
+  }
+  for (const k of Object.keys(inc)) if (!inc[k]) delete inc[k];
+  if (!Object.keys(inc).length) return;
+  const stats = await getStatsCollection();
+  const res = await stats.updateOne({ _id: STATS_ID }, { $inc: inc, $set: { updated_at: new Date() } });
+  if (res.matchedCount === 0) await refreshStats();
+}
+
+// 一次 $facet 聚合重算汇总（汇总文档不存在时用；平时由 subscribers.py stats --refresh / import-csv 维护）
+async function refreshStats() {
+  const coll = await getCollection();
+  const [res] = await coll.aggregate([
+    { $match: { email_lc: { $ne: null } } },
+    { $project: { _id: 0, s: { $ifNull: ['$status', 'unknown'] },
+                  t: { $cond: [{ $isArray: '$tags' }, { $setUnion: ['$tags', []] }, []] } } },
+    { $facet: {
+      status: [{ $group: { _id: '$s', n: { $sum: 1 } } }],
+      status_tags: [{ $unwind: '$t' }, { $group: { _id: { s: '$s', t: '$t' }, n: { $sum: 1 } } }],
+    } },
+  ]).toArray();
+  const doc = { total: 0, status: {}, tags: {}, status_tags: {} };
+  for (const r of res?.status || []) {
+    doc.status[statsKey(r._id)] = r.n;
+    doc.total += r.n;
+  }
+  for (const r of res?.status_tags || []) {
+    const s = statsKey(r._id.s), t = statsKey(r._id.t);
+    (doc.status_tags[s] ||= {})[t] = r.n;
+    doc.tags[t] = (doc.tags[t] || 0) + r.n;
+  }
+  const now = new Date();
+  const stats = await getStatsCollection();
+  const full = { ...doc, refreshed_at: now, updated_at: now };
+  await stats.replaceOne({ _id: STATS_ID }, full, { upsert: true });
+  return full;
+}
+
+async function readStats() {
+  const stats = await getStatsCollection();
+  const doc = await stats.findOne({ _id: STATS_ID });
+  // 缺 refreshed_at 的是旧版本 upsert 增量留下的残缺文档，同样重算
+  return doc && doc.refreshed_at ? doc : refreshStats();
+}
+
+export { getCollection, applyStatsDelta, refreshStats, readStats };
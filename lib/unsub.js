@@ -0,0 +1,24 @@
+// lib/unsub.js
+// 退订链接签名：token = base64url(HMAC-SHA256(UNSUB_SECRET, email_lc))[:22]（与 scripts/personalize.py 的 unsub_token 相同）
+import { createHmac, timingSafeEqual } from 'crypto';
+
+const DEFAULT_UNSUB_URL = 'https://web-production-914f7.up.railway.app/unsubscribe.html';
+
+export function unsubToken(email) {
+  return createHmac('sha256', process.env.UNSUB_SECRET)
+    .update(String(email).trim().toLowerCase()).digest('base64url').slice(0, 22);
+}
+
+export function validToken(email, token) {
+  const want = unsubToken(email);
+  const got = String(token || '');
+  return got.length === want.length && timingSafeEqual(Buffer.from(got), Buffer.from(want));
+}
+
+// 带签名的退订链接；没有配置 UNSUB_SECRET 时只带 email
+export function unsubLink(email) {
+  const base = process.env.UNSUB_URL || DEFAULT_UNSUB_URL;
+  const q = new URLSearchParams({ email });
+  if (process.env.UNSUB_SECRET) q.set('token', unsubToken(email));
+  return base + (base.includes('?') ? '&' : '?') + q.toString();
+}
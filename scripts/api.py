@@ -9,20 +9,60 @@ Usage:
   python scripts/generate_newsletter.py \
     [--token YOUR_TOKEN] \
     [--template src/newsletter_template.html] \
-    [--outfile output/newsletter-YYYY-MM-DD.html]
+    [--outfile output/newsletter-YYYY-MM-DD.html] \
+    [--deadline 60] \
+    [--stream] \
+    [--cache-ttl 900 | --no-cache | --offline] \
+    [--topk 10] [--score default|recency] [--quotas] \
+    [--force] [--profile]
+
+Batch mode (archive backfills / segmented editions; fetch once, build issues in a process pool):
+  python scripts/api.py --offline --dates 2025-09-28..2025-11-09 --step 7 [--window 7] [--overwrite]
+  python scripts/api.py --segments config/segments.json [--dates ...] [--jobs 4]
 """
 
+from __future__ import annotations
+
 import os
 import sys
+import json
+import hashlib
 import re
+import heapq
+import shutil
+import time
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 from pathlib import Path
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Tuple, Optional
-from urllib.parse import urlparse, urlunparse
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Tuple, Optional
+
+# requests / jinja2 / dateutil / ijson / Pillow 等较重的依赖在第一次用到时才导入，
+# 让 --help、--offline 之类的快速调用不必付全部导入开销（预算见 scripts/bench.py --imports）
+from http_cache import CacheMiss, ResponseCache
+from normalize import canonical_url, canonical_urls, keys_version, normalize_title, normalize_titles
+from profiling import StageProfiler, stage, timing_enabled
+
+if TYPE_CHECKING:
+    import requests
+    from jinja2 import Environment, Template
+    from images import ImageCache
+
+_IJSON: Any = False  # False：尚未尝试导入
 
-import requests
-from dateutil import parser as dateparser
-from jinja2 import Environment, FileSystemLoader, Template
+def load_ijson():
+    """ijson 可选（--stream 时流式解析大响应）；没装时返回 None。"""
+    global _IJSON
+    if _IJSON is False:
+        try:
+            import ijson
+        except ImportError:
+            ijson = None
+        _IJSON = ijson
+    return _IJSON
 
 # ============ 常量 ============
 API_ENDPOINTS = {
@@ -31,9 +71,35 @@ API_ENDPOINTS = {
     "Innovation": "https://dataserver.datasum.ai/techsum/api/v3/highlights/innovation",
 }
 
+# 抓取参数：(连接, 读取) 超时；重试次数；单个分类的总截止时间（秒）
+FETCH_TIMEOUT = (5, 30)
+FETCH_RETRIES = 3
+FETCH_DEADLINE = 60.0
+
 # 项目根目录（scripts 的上一级）
 ROOT_DIR = Path(__file__).resolve().parents[1]
 
+# 分类配置（emoji / color / 每期配额 quota）
+CATEGORIES_FILE = ROOT_DIR / "config" / "categories.json"
+
+# 本地响应缓存：ttl 内不发请求，过期后条件请求重新验证
+CACHE_DIR = ROOT_DIR / ".cache" / "http"
+CACHE_TTL = 900.0
+
+# Jinja 编译结果缓存
+TEMPLATE_CACHE_DIR = ROOT_DIR / ".cache" / "jinja"
+
+# 已发送故事的跨期索引（从 archive/ 建立，之后每期追加）
+HISTORY_FILE = ROOT_DIR / ".cache" / "history.sqlite"
+
+# 配图检查结果与缩略图缓存；--thumb-base-url 时入选的缩略图发布到 docs/thumbs/（server.js 以 /thumbs/ 提供）
+IMAGE_CACHE_DIR = ROOT_DIR / ".cache" / "images"
+THUMB_PUBLISH_DIR = ROOT_DIR / "docs" / "thumbs"
+IMAGE_WORKERS = 8
+
+# 增量构建：build key 以注释写在生成的 HTML 末尾（随 output/、archive/ 一起提交，CI 的新检出里也在）
+BUILD_MARK = "<!-- techsum-build {key} {digest} -->\n"
+
 DEFAULT_INLINE_TEMPLATE = """<!DOCTYPE html>
 <html lang="zh"><head><meta charset="utf-8">
 <meta name="viewport" content="width=device-width,initial-scale=1">
@@ -88,161 +154,626 @@ a{color:inherit;}
 </body></html>"""
 
 # ============== utils ==============
-def safe_parse_dt(s: str):
-    if not s:
-        return datetime(1970,1,1,tzinfo=timezone.utc)
+_EPOCH = datetime(1970,1,1,tzinfo=timezone.utc)
+
+@lru_cache(maxsize=8192)
+def _parse_dt_str(s: str) -> datetime:
+    # 快速路径：严格 ISO-8601；解析不了再交给 dateutil
     try:
-        dt = dateparser.parse(s)
+        try:
+            dt = datetime.fromisoformat(s)
+        except ValueError:
+            from dateutil import parser as dateparser
+            dt = dateparser.parse(s)
         if not dt.tzinfo:
             dt = dt.replace(tzinfo=timezone.utc)
         return dt.astimezone(timezone.utc)
     except Exception:
-        return datetime(1970,1,1,tzinfo=timezone.utc)
+        return _EPOCH
+
+def safe_parse_dt(s: str) -> datetime:
+    """任意时间字符串 → UTC aware datetime；空值或无法解析时返回 1970-01-01。重复的字符串只解析一次。"""
+    if not s or not isinstance(s, str):
+        return _EPOCH
+    return _parse_dt_str(s.strip())
+
+def parse_dt_column(values: Iterable[str]) -> List[datetime]:
+    """批量版 safe_parse_dt：同一列里相同的值只解析一次。"""
+    parsed: Dict[Any, datetime] = {}
+    out: List[datetime] = []
+    for v in values:
+        try:
+            dt = parsed[v]
+        except KeyError:
+            dt = parsed[v] = safe_parse_dt(v)
+        except TypeError:  # 不可哈希的脏数据
+            dt = _EPOCH
+        out.append(dt)
+    return out
+
+_SESSION: Optional[requests.Session] = None
+
+def get_session() -> requests.Session:
+    """进程内共享的 keep-alive 连接池；5xx/429/连接错误按带抖动的指数退避重试。"""
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(
+            total=FETCH_RETRIES,
+            backoff_factor=0.5,
+            backoff_jitter=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, len(API_ENDPOINTS)), max_retries=retry)
+        s = requests.Session()
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        _SESSION = s
+    return _SESSION
 
-def fetch_json(url: str, token: Optional[str]) -> Any:
+def _auth_headers(token: Optional[str]) -> Dict[str, str]:
     headers = {"accept": "application/json"}
     if token:
         headers["Authorization"] = f"Bearer {token}"
-    r = requests.get(url, headers=headers, timeout=30)
+    return headers
+
+def revalidate(url: str, token: Optional[str], cache: ResponseCache, offline: bool = False) -> str:
+    """
+    确保缓存里有该接口可用的响应体，返回缓存 key。
+    新鲜 → 直接用；过期 → 带 If-None-Match / If-Modified-Since 请求，304 则续期；
+    offline → 只读缓存，没有就抛 CacheMiss。
+    """
+    key = cache.key(url, token)
+    meta = cache.meta(key)
+    if offline:
+        if meta is None:
+            raise CacheMiss(f"not cached: {url}")
+        return key
+    if meta is not None and cache.is_fresh(meta):
+        return key
+
+    headers = _auth_headers(token)
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    with get_session().get(url, headers=headers, timeout=FETCH_TIMEOUT, stream=True) as r:
+        if r.status_code == 304 and meta is not None:
+            cache.touch(key)
+            return key
+        r.raise_for_status()
+        cache.put(key, r.iter_content(64 * 1024), url=url,
+                  etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
+    return key
+
+def fetch_json(url: str, token: Optional[str], cache: Optional[ResponseCache] = None,
+               offline: bool = False) -> Any:
+    if cache is not None:
+        return json.loads(cache.read(revalidate(url, token, cache, offline)))
+    r = get_session().get(url, headers=_auth_headers(token), timeout=FETCH_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
-def normalize_items(data: Any, category: str) -> List[Dict]:
-    """把接口返回标准化为统一字段。"""
-    items: List[Dict] = []
-
-    def mk(v: Dict, title_key: str = "") -> Dict:
-        title = v.get("suggested_headline") or v.get("title") or title_key or "Untitled"
-        summary_full = (v.get("group_summary") or "").strip()
-        summary = summary_full.split("|")[0].strip() if "|" in summary_full else summary_full
-        date = v.get("earliest_published") or ""
-        feed = v.get("feed_num", 0)
-        artnum = v.get("article_num", 0)
-
-        # image
-        img = ""
-        imgs = v.get("images") or []
-        if isinstance(imgs, list) and imgs:
-            img = imgs[0].get("image_link") or imgs[0].get("url") or ""
-
-        # link（优先取第一篇文章）
-        link = "#"
-        arts = v.get("articles") or []
-        if isinstance(arts, list) and arts:
-            link = arts[0].get("link") or arts[0].get("url") or "#"
-
-        return {
-            "category": category,
-            "title": str(title).strip(),
-            "summary": str(summary).strip(),
-            "date": str(date).strip(),
-            "date_dt": safe_parse_dt(date),
-            "feed_num": int(feed) if str(feed).isdigit() else (feed or 0),
-            "article_num": int(artnum) if str(artnum).isdigit() else (artnum or 0),
-            "image": str(img).strip(),
-            "link": str(link).strip(),
-        }
+def fetch_all(endpoints: Dict[str, str], token: Optional[str],
+              deadline: float = FETCH_DEADLINE, stream: bool = False,
+              cache: Optional[ResponseCache] = None, offline: bool = False,
+              prof: Optional[StageProfiler] = None) -> Dict[str, Any]:
+    """
+    并发抓取并标准化所有分类，总耗时约等于最慢的单个接口。
+    返回 {category: 标准化后的 list 或 Exception}；超过 deadline 的记为 TimeoutError。
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+    results: Dict[str, Any] = {}
+    ex = ThreadPoolExecutor(max_workers=max(1, len(endpoints)), thread_name_prefix="fetch")
+    futs = {ex.submit(fetch_category, cat, url, token, stream, cache, offline, prof): cat
+            for cat, url in endpoints.items()}
+    try:
+        done, _ = wait(futs, timeout=deadline)
+        for fut, cat in futs.items():
+            if fut not in done:
+                results[cat] = TimeoutError(f"deadline {deadline:g}s exceeded")
+            elif fut.exception() is not None:
+                results[cat] = fut.exception()
+            else:
+                results[cat] = fut.result()
+    finally:
+        # 不等待超时的线程；它们会在 socket 超时后自行结束
+        ex.shutdown(wait=False, cancel_futures=True)
+    return results
+
+@dataclass(slots=True)
+class HighlightItem:
+    """
+    一条标准化后的 highlight。slots 记录比 dict 省内存、属性访问更快；
+    模板里的 it.title / it.image 等写法不变，item["title"] / item.get() 仍可用。
+    """
+    category: str
+    title: str
+    summary: str
+    date: str
+    date_dt: datetime
+    feed_num: Any
+    article_num: Any
+    image: str
+    link: str
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+def _mk_item(v: Dict, category: str, title_key: str = "") -> HighlightItem:
+    """单条原始记录 → 统一字段。"""
+    title = v.get("suggested_headline") or v.get("title") or title_key or "Untitled"
+    summary_full = (v.get("group_summary") or "").strip()
+    summary = summary_full.split("|")[0].strip() if "|" in summary_full else summary_full
+    date = v.get("earliest_published") or ""
+    feed = v.get("feed_num", 0)
+    artnum = v.get("article_num", 0)
+
+    # image
+    img = ""
+    imgs = v.get("images") or []
+    if isinstance(imgs, list) and imgs:
+        img = imgs[0].get("image_link") or imgs[0].get("url") or ""
+
+    # link（优先取第一篇文章）
+    link = "#"
+    arts = v.get("articles") or []
+    if isinstance(arts, list) and arts:
+        link = arts[0].get("link") or arts[0].get("url") or "#"
+
+    return HighlightItem(
+        category=category,
+        title=str(title).strip(),
+        summary=str(summary).strip(),
+        date=str(date).strip(),
+        date_dt=safe_parse_dt(date),
+        feed_num=int(feed) if str(feed).isdigit() else (feed or 0),
+        article_num=int(artnum) if str(artnum).isdigit() else (artnum or 0),
+        image=str(img).strip(),
+        link=str(link).strip(),
+    )
 
+def iter_items(data: Any, category: str) -> Iterator[HighlightItem]:
+    """逐条产出标准化记录；data 为 list，或 dict keyed by topic（值为 dict 或 list）。"""
     if isinstance(data, list):
         for v in data:
             if isinstance(v, dict):
-                items.append(mk(v))
+                yield _mk_item(v, category)
     elif isinstance(data, dict):
         # 可能是 dict keyed by topic；或某些 key 是 list
         for k, v in data.items():
             if isinstance(v, dict):
-                items.append(mk(v, k))
+                yield _mk_item(v, category, k)
             elif isinstance(v, list):
                 for e in v:
                     if isinstance(e, dict):
-                        items.append(mk(e, k))
-    return items
+                        yield _mk_item(e, category, k)
 
-# ---- 去重：规范化 URL + 标题相似 ----
-_PUNCT = re.compile(r"[^\w\s]+", flags=re.U)
-_WS = re.compile(r"\s+", flags=re.U)
+def normalize_items(data: Any, category: str) -> List[HighlightItem]:
+    """把接口返回标准化为统一字段。"""
+    return list(iter_items(data, category))
 
-def normalize_title(title: str) -> str:
-    t = (title or "").strip().lower()
-    t = _PUNCT.sub(" ", t)
-    t = _WS.sub(" ", t).strip()
-    return t
+# ---- 流式解析：边下载边还原条目，不缓冲整个响应 ----
+# 条目内这些数组只保留第一个元素（_mk_item 只用到 [0]），其余直接跳过不构建
+_STREAM_FIRST_ONLY = frozenset(["images", "articles"])
 
-def canonical_url(url: str) -> str:
-    try:
-        u = urlparse(url)
-        # 去掉查询串, 标准化结尾斜杠
-        path = re.sub(r"/+$", "", u.path or "")
-        scheme = "https" if u.scheme in ("http", "https", "") else u.scheme
-        return urlunparse((scheme, u.netloc.lower(), path, "", "", ""))
-    except Exception:
-        return url
+def iter_stream_records(events: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Dict]]:
+    """
+    消费 ijson.basic_parse 事件流，逐个 yield (title_key, 原始条目 dict)。
+    识别的顶层结构与 iter_items 相同。
+    """
+    outer: List[str] = []      # 条目之外的容器
+    top_key = ""               # 顶层 dict 的当前 key
+    item_key = ""
+    stack: List[Any] = []      # 条目内部正在构建的容器
+    keys: List[Any] = []       # stack 中 dict 的待填 key；数组为 True/False（是否只留首元素）
+    skip = 0
+
+    for ev, val in events:
+        if skip:
+            if ev in ("start_map", "start_array"):
+                skip += 1
+            elif ev in ("end_map", "end_array"):
+                skip -= 1
+            continue
+
+        if not stack:
+            if ev == "start_map" and outer in (["start_array"], ["start_map"], ["start_map", "start_array"]):
+                item_key = top_key if outer[0] == "start_map" else ""
+                stack.append({}); keys.append(None)
+            elif ev in ("start_map", "start_array"):
+                outer.append(ev)
+            elif ev in ("end_map", "end_array"):
+                outer.pop()
+            elif ev == "map_key" and outer == ["start_map"]:
+                top_key = val
+            continue
+
+        parent = stack[-1]
+        if ev == "map_key":
+            keys[-1] = val
+        elif ev in ("start_map", "start_array"):
+            if isinstance(parent, list) and parent and keys[-1]:
+                skip = 1
+                continue
+            new: Any = {} if ev == "start_map" else []
+            if isinstance(parent, list):
+                parent.append(new)
+                first_only = False
+            else:
+                parent[keys[-1]] = new
+                first_only = keys[-1] in _STREAM_FIRST_ONLY
+            stack.append(new); keys.append(first_only if ev == "start_array" else None)
+        elif ev in ("end_map", "end_array"):
+            done = stack.pop(); keys.pop()
+            if not stack:
+                yield item_key, done
+        elif isinstance(parent, list):
+            if not (parent and keys[-1]):
+                parent.append(val)
+        else:
+            parent[keys[-1]] = val
+
+def stream_items(url: str, token: Optional[str], category: str,
+                 cache: Optional[ResponseCache] = None, offline: bool = False) -> Iterator[HighlightItem]:
+    """流式抓取（有缓存时从缓存文件流式读取）并逐条产出标准化记录；需要 ijson。"""
+    if cache is not None:
+        with cache.open(revalidate(url, token, cache, offline)) as f:
+            for key, rec in iter_stream_records(load_ijson().basic_parse(f, use_float=True)):
+                yield _mk_item(rec, category, key)
+        return
+    with get_session().get(url, headers=_auth_headers(token), timeout=FETCH_TIMEOUT, stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        for key, rec in iter_stream_records(load_ijson().basic_parse(r.raw, use_float=True)):
+            yield _mk_item(rec, category, key)
+
+def fetch_category(category: str, url: str, token: Optional[str], stream: bool = False,
+                   cache: Optional[ResponseCache] = None, offline: bool = False,
+                   prof: Optional[StageProfiler] = None) -> List[HighlightItem]:
+    if stream and load_ijson() is not None:
+        # 流式：下载与解析交错，合并计为一个阶段
+        with stage(prof, "stream", thread=True) as st:
+            items = list(stream_items(url, token, category, cache, offline))
+            st["items_out"] = len(items)
+        return items
+    with stage(prof, "download", thread=True):
+        data = fetch_json(url, token, cache, offline)
+    with stage(prof, "normalize", items_in=len(data) if isinstance(data, list) else None, thread=True) as st:
+        items = normalize_items(data, category=category)
+        st["items_out"] = len(items)
+    return items
+
+# ---- 去重：规范化 URL + 标题相似（规则与缓存在 normalize.py） ----
+def history_keys(link: str, title: str) -> List[str]:
+    """跨期“已发送”判断用的指纹原文：规范化 URL + 规范化标题（与 dedupe_items 同一口径）。"""
+    keys = []
+    u = canonical_url(link)
+    if u:
+        keys.append("u:" + u)
+    t = normalize_title(title)
+    if t:
+        keys.append("t:" + t)
+    return keys
 
 def title_similarity(a: str, b: str) -> float:
     import difflib
     return difflib.SequenceMatcher(None, a, b).ratio()
 
-def pick_better(a: Dict, b: Dict) -> Dict:
+def pick_better(a: HighlightItem, b: HighlightItem) -> HighlightItem:
     # feed_num 高者优先；再比发布时间新；再比 article_num；最后保留 a
-    fa, fb = a.get("feed_num", 0) or 0, b.get("feed_num", 0) or 0
+    fa, fb = a.feed_num or 0, b.feed_num or 0
     if fa != fb:
         return a if fa > fb else b
-    da, db = a.get("date_dt"), b.get("date_dt")
+    da, db = a.date_dt, b.date_dt
     if da != db:
         return a if da > db else b
-    aa, ab = a.get("article_num", 0) or 0, b.get("article_num", 0) or 0
+    aa, ab = a.article_num or 0, b.article_num or 0
     if aa != ab:
         return a if aa > ab else b
     return a
 
-def dedupe_items(items: List[Dict]) -> List[Dict]:
-    chosen: List[Dict] = []
-    seen: List[Tuple[str, str]] = []  # (canon_url, norm_title)
+# ---- 近似重复索引：稀有片段取候选，再逐个精确校验 ----
+# 候选：标题按位置切成 _KEY_SEGS 段，每段取全局文档频次最低的 5-gram 作为索引键
+# （前面的键已挂满 _CAP 个编号就顺延到段内下一个）；查询取自己最稀有的 _PROBE 个
+# 5-gram，命中 >= _NEED 个键的编号才进入校验。每个键最多挂 _CAP 个编号，单次查询
+# 碰到的编号不超过 _PROBE*_CAP，与已见标题数无关，dedupe 因而近似线性。
+# 这一步是近似的：改动集中在标题最稀有的那几段时可能漏掉候选，与逐个比较的
+# 一致性由 bench.py --verify 检查。完全相同的标题、计数下界无效的短标题不经过
+# 近似步骤，按表直接比较。
+# 校验是精确的：ratio = 2M/L >= thr 时两串至少共享 M - k*(q-1) 个 3-gram（k 为
+# 匹配块数），再用字符多重集的交（SequenceMatcher.quick_ratio）作上界，最后才算 ratio。
+_QGRAM = 3
+_KEY_Q = 5
+_KEY_SEGS = 12
+_PROBE = 24
+_NEED = 4
+_CAP = 64
+
+def _qgrams(t: str) -> List[str]:
+    """带出现序号的 q-gram，如 "abc0"、"abc1"（把多重集变成集合，便于求交）。"""
+    cnt: Dict[str, int] = {}
+    out: List[str] = []
+    for i in range(len(t) - _QGRAM + 1):
+        g = t[i:i + _QGRAM]
+        n = cnt.get(g, 0)
+        cnt[g] = n + 1
+        out.append(g + str(n))
+    return out
+
+def _key_grams(t: str) -> List[str]:
+    """取候选用的 5-gram，去重后按出现顺序。"""
+    return list(dict.fromkeys(t[i:i + _KEY_Q] for i in range(len(t) - _KEY_Q + 1)))
+
+class TitleIndex:
+    """
+    按编号存放已见标题；first_match 返回相似标题里编号最小的一个（候选近似，见上方说明）。
+    df 为 5-gram 的全局文档频次（决定哪些片段算稀有），须覆盖之后要加入/查询的所有标题。
+    """
+
+    def __init__(self, df: Dict[str, int], threshold: float = 0.90):
+        self.threshold = threshold
+        self.df = df
+        self.titles: Dict[int, str] = {}
+        self.postings: Dict[str, set] = {}
+        self.keys: Dict[int, List[str]] = {}  # 编号实际挂在哪些键上
+        self.exact: Dict[str, set] = {}
+        self.by_len: Dict[int, set] = {}
+        self.few: set = set()  # 键少于 2*_NEED 个的编号
+        self._memo: Dict[str, Tuple[frozenset, List[List[str]], frozenset, List[str]]] = {}
+        self._bounds_memo: Dict[int, Dict[int, int]] = {}
+
+    @classmethod
+    def for_titles(cls, titles: List[str], threshold: float = 0.90) -> "TitleIndex":
+        df: Dict[str, int] = {}
+        for t in titles:
+            for g in _key_grams(t):
+                df[g] = df.get(g, 0) + 1
+        return cls(df, threshold)
+
+    def _len_range(self, la: int) -> Tuple[int, int]:
+        # 2*min(la,lb)/(la+lb) >= thr 的必要条件；两端各放宽 1 以防浮点误差
+        thr = self.threshold
+        lo = int(thr * la / (2 - thr)) - 1
+        hi = int(la * (2 - thr) / thr) + 1
+        return max(lo, 1), hi
+
+    def _min_overlap(self, la: int, lb: int) -> int:
+        L = la + lb
+        dmax = int((1 - self.threshold) * L) + 1
+        return (L - dmax) // 2 - (dmax + 1) * (_QGRAM - 1)
 
-    for cur in items:
-        cu = canonical_url(cur.get("link", ""))
-        ct = normalize_title(cur.get("title", ""))
+    def _bounds(self, la: int) -> Dict[int, int]:
+        """可比长度 -> 共享 3-gram 的下界；按长度缓存。"""
+        hit = self._bounds_memo.get(la)
+        if hit is None:
+            lo, hi = self._len_range(la)
+            hit = self._bounds_memo[la] = {lb: self._min_overlap(la, lb) for lb in range(lo, hi + 1)}
+        return hit
 
-        dup_idx = -1
-        for idx, (u_seen, t_seen) in enumerate(seen):
-            if cu and u_seen and cu == u_seen:
-                dup_idx = idx
+    def _analyze(self, t: str) -> Tuple[frozenset, List[List[str]], frozenset, List[str]]:
+        """返回 (3-gram 集合, 每段按稀有度排好的 5-gram, 字符多重集, 查询用的 5-gram)；同一标题只算一次。"""
+        hit = self._memo.get(t)
+        if hit is not None:
+            return hit
+        df = self.df
+        rare = df.__getitem__  # 频次相同按出现顺序
+        grams = [g for g in _key_grams(t) if df.get(g, 0) >= 2]  # 只出现一次的片段不会带来候选
+        n = len(grams)
+        segs = [sorted(grams[j * n // _KEY_SEGS:(j + 1) * n // _KEY_SEGS], key=rare) for j in range(_KEY_SEGS)]
+        seen: Dict[str, int] = {}
+        chars = []  # 字符多重集：(出现序号, 字符) 编成一个整数
+        for ch in t:
+            k = seen.get(ch, 0)
+            seen[ch] = k + 1
+            chars.append(k << 21 | ord(ch))
+        hit = self._memo[t] = (frozenset(_qgrams(t)), [s for s in segs if s], frozenset(chars),
+                               sorted(grams, key=rare)[:_PROBE])
+        return hit
+
+    def add(self, idx: int, t: str) -> None:
+        self.titles[idx] = t
+        self.exact.setdefault(t, set()).add(idx)
+        self.by_len.setdefault(len(t), set()).add(idx)
+        used: List[str] = []
+        for seg in self._analyze(t)[1]:
+            for g in seg:
+                hit = self.postings.get(g)
+                if hit is None:
+                    self.postings[g] = {idx}
+                elif len(hit) < _CAP and g not in used:
+                    hit.add(idx)
+                else:
+                    continue
+                used.append(g)
                 break
-            if ct and t_seen and title_similarity(ct, t_seen) >= 0.90:
-                dup_idx = idx
+        self.keys[idx] = used
+        if len(used) < 2 * _NEED:
+            self.few.add(idx)
+
+    def remove(self, idx: int) -> None:
+        t = self.titles.pop(idx, None)
+        if t is None:
+            return
+        self.exact[t].discard(idx)
+        self.by_len[len(t)].discard(idx)
+        self.few.discard(idx)
+        for g in self.keys.pop(idx):
+            self.postings[g].discard(idx)
+
+    def first_match(self, t: str, before: int) -> int:
+        """编号 < before 且 title_similarity(t, 已见) >= 阈值 的最小编号；没有则 -1。"""
+        if not t or not self.titles:
+            return -1
+        la = len(t)
+        bounds = self._bounds(la)
+        gset, _, chars, probe = self._analyze(t)
+
+        postings = self.postings
+        hits = Counter(chain.from_iterable(postings[g] for g in probe if g in postings))
+        # 命中多的排在前面，够 need 的只是一小部分；键很少的标题（短标题、片段大多只出现一次）命中一半即可
+        need, keys = min(_NEED, max(1, len(probe) // 2)), self.keys
+        cands = set()
+        for i, c in sorted(hits.items(), key=itemgetter(1), reverse=True):
+            if c < need:
                 break
+            cands.add(i)
+        cands.update(i for i in self.few.intersection(hits) if 2 * hits[i] >= len(keys[i]))
+        same = self.exact.get(t)
+        if same:
+            cands.update(same)
+        for lb, n in bounds.items():
+            bucket = self.by_len.get(lb)
+            if bucket and n <= 0:
+                cands |= bucket  # 短标题：计数下界无效，直接全部比较
+
+        thr, memo = self.threshold, self._memo
+        for idx in sorted(cands):
+            if idx >= before:
+                break
+            other = self.titles[idx]
+            lb = len(other)
+            n = bounds.get(lb)
+            if n is None:
+                continue
+            ogset, _, ochars, _ = memo[other]
+            # 计数过滤：共享 3-gram 不足下界的不可能达到阈值
+            if len(gset & ogset) < n:
+                continue
+            # 字符上界：匹配字符数不超过两串字符多重集的交
+            if 2.0 * len(chars & ochars) / (la + lb) < thr:
+                continue
+            if title_similarity(t, other) >= thr:
+                return idx
+        return -1
+
+def dedupe_items(items: List[HighlightItem], threshold: float = 0.90) -> List[HighlightItem]:
+    keys = list(zip(canonical_urls([it.link for it in items]), normalize_titles([it.title for it in items])))
+    titles = TitleIndex.for_titles([ct for _, ct in keys], threshold)
+
+    chosen: List[HighlightItem] = []
+    seen: List[Tuple[str, str]] = []  # (canon_url, norm_title)
+    by_url: Dict[str, set] = {}       # canon_url -> seen 中的编号
+
+    for cur, (cu, ct) in zip(items, keys):
+        # 与原线性扫描等价：取 URL 相同 或 标题相似 的最小编号
+        dup_idx = min(by_url[cu]) if cu and by_url.get(cu) else -1
+        t_idx = titles.first_match(ct, before=dup_idx if dup_idx != -1 else len(seen))
+        if t_idx != -1:
+            dup_idx = t_idx
 
         if dup_idx == -1:
+            idx = len(seen)
             chosen.append(cur)
             seen.append((cu, ct))
         else:
             better = pick_better(cur, chosen[dup_idx])
-            if better is cur:
-                chosen[dup_idx] = cur
-                seen[dup_idx] = (cu, ct)
-            # 否则丢弃当前，达到“重复不出现，顺延到下一个”
+            if better is not cur:
+                # 否则丢弃当前，达到“重复不出现，顺延到下一个”
+                continue
+            idx = dup_idx
+            old_u, _ = seen[idx]
+            if old_u:
+                by_url[old_u].discard(idx)
+            titles.remove(idx)
+            chosen[idx] = cur
+            seen[idx] = (cu, ct)
+        if cu:
+            by_url.setdefault(cu, set()).add(idx)
+        if ct:
+            titles.add(idx, ct)
     return chosen
 
 # ---- 排序与选 TopN（优先有图） ----
-def rank_items(items: List[Dict], topk: int = 10) -> List[Dict]:
+Scorer = Callable[[HighlightItem], Any]
+
+def default_score(x: HighlightItem) -> Tuple:
     # 先按热度 -> 文章数 -> 时间
-    items_sorted = sorted(
-        items,
-        key=lambda x: (x.get("feed_num", 0) or 0, x.get("article_num", 0) or 0, x.get("date_dt")),
-        reverse=True
-    )
-    # 优先保留有图的；不够再用无图补齐
-    with_img = [i for i in items_sorted if i.get("image")]
-    no_img  = [i for i in items_sorted if not i.get("image")]
-    merged = with_img + no_img
-    return merged[:topk]
+    return (x.feed_num or 0, x.article_num or 0, x.date_dt)
 
-# ---- 模板加载：优先根目录，再脚本相对，最后内置 ----
-def resolve_template(template_path: str) -> Tuple[Template, bool]:
+def recency_score(half_life_days: float = 3.0, now: Optional[datetime] = None) -> Scorer:
+    """热度按发布时间指数衰减：每过 half_life_days 天减半（以 now 为基准，默认当前时间）。"""
+    now = now or datetime.now(timezone.utc)
+
+    def score(x: HighlightItem) -> Tuple:
+        age = max(0.0, (now - x.date_dt).total_seconds() / 86400)
+        return ((x.feed_num or 0) * 0.5 ** (age / half_life_days), x.article_num or 0, x.date_dt)
+    return score
+
+# 工厂函数：可选参数 now 为“出刊时间”（批量回填旧日期时使用）
+SCORERS: Dict[str, Callable[..., Scorer]] = {
+    "default": lambda now=None: default_score,
+    "recency": lambda now=None: recency_score(now=now),
+}
+
+def load_category_quotas(path: Path = CATEGORIES_FILE) -> Dict[str, int]:
+    """读取 categories.json 里的 quota，键统一为小写分类名。"""
+    try:
+        conf = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {k.lower(): int(v["quota"]) for k, v in conf.items() if isinstance(v, dict) and "quota" in v}
+
+def rank_items(items: Iterable[HighlightItem], topk: int = 10, score: Scorer = default_score,
+               quotas: Optional[Dict[str, int]] = None,
+               skip: Optional[Callable[[HighlightItem], bool]] = None) -> List[HighlightItem]:
     """
-    返回 (template_obj, using_inline)
-    优先：绝对路径 → 根目录相对路径（ROOT_DIR/…）→ 脚本相对路径（scripts/..）→ 内置模板
+    一次遍历、大小为 topk 的堆选出前 topk，O(n log k)。
+    有图的优先，不够再用无图补齐；同分保持输入顺序（与完整排序后截断一致）。
+    quotas: {小写分类名: 上限}，未列出的分类不限。
+    skip: 返回 True 的条目不参与排序（例如往期已发送），空出的名额由后面的补上。
+    """
+    if skip is not None:
+        items = (x for x in items if not skip(x))
+    # 优先保留有图的
+    key = lambda x: (bool(x.image), score(x))
+    if not quotas:
+        return heapq.nlargest(topk, items, key=key)
+
+    # 每个分类先各自保留前 min(quota, topk) 个，再按原顺序合并取前 topk
+    items = list(items)
+    buckets: Dict[str, List[HighlightItem]] = {}
+    for it in items:
+        buckets.setdefault(it.category.lower(), []).append(it)
+    keep = set()
+    for cat, group in buckets.items():
+        keep.update(id(it) for it in heapq.nlargest(min(quotas.get(cat, topk), topk), group, key=key))
+    return heapq.nlargest(topk, (it for it in items if id(it) in keep), key=key)
+
+def rank_checked(items: List[HighlightItem], rank: Callable[[int], List[HighlightItem]], topk: int,
+                 cache: ImageCache, workers: int = IMAGE_WORKERS, rounds: int = 3) -> List[HighlightItem]:
+    """
+    排序时只信任检查过的配图：每轮取前 2×topk 个候选并发检查它们的图，确认失效的清掉 image 再排，
+    直到前 topk 的配图都检查过（最多 rounds 轮）。暂时失败（超时 / 5xx）的保留配图。rank(k) 返回前 k 个。
     """
+    checked: Dict[str, Dict] = {}
+    for _ in range(rounds):
+        top = rank(topk)
+        if all(not x.image or x.image in checked for x in top):
+            return top
+        checked.update(cache.prefetch((x.image for x in rank(2 * topk) if x.image not in checked), workers))
+        for x in items:
+            if x.image in checked and cache.is_dead(checked[x.image]):
+                x.image = ""
+    return rank(topk)
+
+# ---- 模板加载：优先根目录，再脚本相对，最后内置 ----
+# 进程内模板注册表：路径只解析一次，每个目录共用一个 Environment；
+# 编译结果写入 FileSystemBytecodeCache，跨进程复用；模板文件修改后 auto_reload 自动重新编译。
+_TEMPLATE_ENVS: Dict[str, Environment] = {}
+_RESOLVED_TEMPLATES: Dict[str, Optional[Path]] = {}
+_INLINE_TEMPLATE: Optional[Template] = None
+
+def _find_template(template_path: str) -> Optional[Path]:
+    """绝对路径 → 根目录相对路径（ROOT_DIR/…）→ 脚本相对路径（scripts/..）；都没有则 None。"""
     cand = Path(template_path)
     if not cand.is_file():
         cand_root = (ROOT_DIR / template_path).resolve()
@@ -252,18 +783,45 @@ def resolve_template(template_path: str) -> Tuple[Template, bool]:
         cand_script = (Path(__file__).resolve().parent / ".." / template_path).resolve()
         if cand_script.is_file():
             cand = cand_script
+    return cand.resolve() if cand.is_file() else None
 
-    if cand.is_file():
-        env = Environment(loader=FileSystemLoader(str(cand.parent)))
-        return env.get_template(cand.name), False
-    else:
-        return Template(DEFAULT_INLINE_TEMPLATE), True
+def _template_env(directory: Path) -> Environment:
+    env = _TEMPLATE_ENVS.get(str(directory))
+    if env is None:
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+        bcc = None
+        try:
+            TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            bcc = FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR))
+        except OSError:
+            pass  # 只读环境下不用字节码缓存
+        env = Environment(loader=FileSystemLoader(str(directory)), bytecode_cache=bcc, auto_reload=True)
+        _TEMPLATE_ENVS[str(directory)] = env
+    return env
 
-def render_html(items: List[Dict], template_path: str) -> str:
-    now = datetime.now()
+def resolve_template(template_path: str) -> Tuple[Template, bool]:
+    """
+    返回 (template_obj, using_inline)
+    优先：绝对路径 → 根目录相对路径（ROOT_DIR/…）→ 脚本相对路径（scripts/..）→ 内置模板
+    """
+    global _INLINE_TEMPLATE
+    if template_path not in _RESOLVED_TEMPLATES:
+        _RESOLVED_TEMPLATES[template_path] = _find_template(template_path)
+    cand = _RESOLVED_TEMPLATES[template_path]
+
+    if cand is not None:
+        return _template_env(cand.parent).get_template(cand.name), False
+    if _INLINE_TEMPLATE is None:
+        from jinja2 import Template
+        _INLINE_TEMPLATE = Template(DEFAULT_INLINE_TEMPLATE)
+    return _INLINE_TEMPLATE, True
+
+def render_html(items: List[HighlightItem], template_path: str, topk: int = 10,
+                date: Optional[datetime] = None) -> str:
+    now = date or datetime.now()
     tpl, _ = resolve_template(template_path)
     return tpl.render(
-        heading="Tech Highlights (Top 10)",
+        heading=f"Tech Highlights (Top {topk})",
         date=now.strftime("%Y-%m-%d"),
         items=items,
         year=now.year,
@@ -279,8 +837,240 @@ def normalize_outfile(p: str) -> Path:
     out_path.parent.mkdir(parents=True, exist_ok=True)
     return out_path
 
+# ============== incremental build ==============
+# build key = 入选 top-K 的模板字段 + 模板指纹 + 渲染参数；与文件末尾记录的相同且文件未被改动时跳过渲染和写文件
+_ITEM_FIELDS = ("category", "title", "summary", "date", "feed_num", "article_num", "image", "link")
+_MARK_RE = re.compile(rb"<!-- techsum-build ([0-9a-f]{64}) ([0-9a-f]{16}) -->\n?$")
+
+def template_fingerprint(template_path: str) -> str:
+    cand = _find_template(template_path)
+    src = cand.read_bytes() if cand is not None else DEFAULT_INLINE_TEMPLATE.encode("utf-8")
+    return hashlib.sha256(src).hexdigest()
+
+def build_key(items: List[HighlightItem], template_path: str, topk: int = 10,
+              date: Optional[datetime] = None) -> str:
+    """与 render_html 的输入一一对应：这些都没变，渲染结果就不会变。"""
+    now = date or datetime.now()
+    payload = {
+        "template": template_fingerprint(template_path),
+        "ctx": [topk, now.strftime("%Y-%m-%d"), os.getenv("PREHEADER"), os.getenv("UNSUB_URL")],
+        "items": [[getattr(x, f) for f in _ITEM_FIELDS] for x in items],
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def stamp_build(html: str, key: str) -> str:
+    """在 HTML 末尾加一行注释：build key + 正文摘要（摘要用来发现手工改过的文件）。"""
+    body = html if html.endswith("\n") else html + "\n"
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+    return body + BUILD_MARK.format(key=key, digest=digest)
+
+def read_build_key(p: Path) -> Optional[str]:
+    """文件末尾记录的 build key；没有标记、或标记之前的内容被改过时为 None。"""
+    try:
+        data = Path(p).read_bytes()
+    except OSError:
+        return None
+    m = _MARK_RE.search(data, max(0, len(data) - 200))
+    if m is None or hashlib.sha256(data[:m.start()]).hexdigest()[:16] != m.group(2).decode():
+        return None
+    return m.group(1).decode()
+
+def up_to_date(key: str, paths: List[Path]) -> bool:
+    """每个输出文件都在、末尾记录的 key 相同、内容未被改动（手工改过 / 删掉的要重写）。"""
+    return all(read_build_key(p) == key for p in paths)
+
+def _file_sig(p: Path) -> List[int]:
+    st = p.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+def write_outputs(html: str, paths: List[Path]) -> Dict[str, List[int]]:
+    """
+    第一个路径：临时文件 + rename 原子写入（内容相同则不动，保留 mtime）；
+    其余路径（archive/ 副本）硬链接到它，不支持硬链接时复制。返回各文件的 [size, mtime_ns]。
+    """
+    paths = [Path(p) for p in paths]
+    data = html.encode("utf-8")
+    first = paths[0]
+    if not (first.is_file() and first.stat().st_size == len(data) and first.read_bytes() == data):
+        tmp = first.with_name(f".{first.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, first)
+    for p in paths[1:]:
+        if p.is_file() and (os.path.samefile(p, first) or p.read_bytes() == data):
+            continue
+        tmp = p.with_name(f".{p.name}.{os.getpid()}.tmp")
+        try:
+            os.link(first, tmp)
+        except OSError:
+            shutil.copyfile(first, tmp)
+        os.replace(tmp, p)
+    return {str(p): _file_sig(p) for p in paths}
+
+# ============== batch mode ==============
+# 抓取 / 解析只做一次；各期（日期 × 分段）的 过滤 → 去重 → 排序 → 渲染 → 写文件 在进程池里并行
+_BATCH_ITEMS: List[HighlightItem] = []
+
+def parse_dates(spec: str, step: int = 7) -> List[datetime]:
+    """"2025-10-01..2025-10-31"（含两端，每 step 天一期）或逗号分隔的日期，可混用。"""
+    out = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        if ".." in part:
+            a, b = (datetime.strptime(x.strip(), "%Y-%m-%d") for x in part.split("..", 1))
+            while a <= b:
+                out.add(a)
+                a += timedelta(days=max(1, step))
+        else:
+            out.add(datetime.strptime(part, "%Y-%m-%d"))
+    return sorted(out)
+
+def load_segments(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    分段定义：{"名称": {"categories": [...], "topk": 6, "score": "recency", "quotas": true}}
+    字段都可省略（分类不限 / 沿用命令行参数）；名称统一为小写，用作文件名后缀。
+    """
+    p = Path(path)
+    if not p.is_file():
+        p = ROOT_DIR / path
+    conf = json.loads(p.read_text(encoding="utf-8"))
+    return {str(k).lower(): dict(v or {}) for k, v in conf.items()}
+
+def _init_batch_worker(items: List[HighlightItem]):
+    global _BATCH_ITEMS
+    _BATCH_ITEMS = items
+
+def build_issue(job: Dict[str, Any]) -> Dict[str, Any]:
+    """生成一期：按日期窗口 / 分类过滤 → 去重 → 排序 → 渲染 → 写文件；返回各阶段耗时（秒）。"""
+    timings: Dict[str, float] = {}
+    t = time.perf_counter()
+
+    def lap(stage: str):
+        nonlocal t
+        now = time.perf_counter()
+        timings[stage] = now - t
+        t = now
+
+    items = _BATCH_ITEMS
+    end = job["end"]
+    if end is not None:
+        start = end - timedelta(days=job["window"])
+        items = [x for x in items if start <= x.date_dt < end]
+    if job["categories"]:
+        items = [x for x in items if x.category.lower() in job["categories"]]
+    lap("filter")
+    if not items:
+        # 窗口里没有内容（例如缓存里没有那么早的数据）：不写空的一期
+        for stage in ("dedupe", "rank", "render", "write"):
+            lap(stage)
+        return {"paths": job["paths"], "items": 0, "top": 0, "timings": timings, "skipped": True, "empty": True}
+    uniq = dedupe_items(items)
+    lap("dedupe")
+    top = rank_items(uniq, topk=job["topk"], score=SCORERS[job["score"]](now=end), quotas=job["quotas"])
+    lap("rank")
+    key = build_key(top, job["template"], topk=job["topk"], date=job["date"])
+    if not job["force"] and up_to_date(key, job["paths"]):
+        lap("render")
+        lap("write")
+        return {"paths": job["paths"], "items": len(items), "top": len(top), "timings": timings, "skipped": True}
+    html = stamp_build(render_html(top, job["template"], topk=job["topk"], date=job["date"]), key)
+    lap("render")
+    write_outputs(html, job["paths"])
+    lap("write")
+    return {"paths": job["paths"], "items": len(items), "top": len(top), "timings": timings, "skipped": False}
+
+def run_batch(args, items: List[HighlightItem]) -> List[Dict[str, Any]]:
+    """
+    --dates / --segments：每个 (日期, 分段) 一期。只有不分段的期才复制到 archive/。
+    archive/ 里已有的期不重新生成（除非 --overwrite）；窗口内没有内容的期跳过。
+    """
+    dates = parse_dates(args.dates, args.step) if args.dates else [None]
+    segments = load_segments(args.segments) if args.segments else {"": {}}
+    out_dir = normalize_outfile(args.outfile).parent
+    archive_dir = ROOT_DIR / "archive"
+    archive_dir.mkdir(exist_ok=True)
+
+    jobs = []
+    kept = []
+    for d in dates:
+        # d 当天结束（UTC）为出刊时间，窗口内的内容属于这一期
+        end = None if d is None else datetime(d.year, d.month, d.day, tzinfo=timezone.utc) + timedelta(days=1)
+        day = (d or datetime.now()).strftime("%Y-%m-%d")
+        for name, seg in segments.items():
+            fname = f"newsletter-{day}{'-' + name if name else ''}.html"
+            if not name and (archive_dir / fname).exists() and not args.overwrite:
+                kept.append(fname)
+                continue
+            score = seg.get("score", args.score)
+            if score not in SCORERS:
+                raise SystemExit(f"segment {name!r}: unknown score {score!r}")
+            jobs.append({
+                "date": d, "end": end, "window": args.window,
+                "categories": {c.lower() for c in seg.get("categories") or []},
+                "topk": int(seg.get("topk", args.topk)),
+                "score": score,
+                "quotas": load_category_quotas() if seg.get("quotas", args.quotas) else None,
+                "template": seg.get("template", args.template),
+                "paths": [str(out_dir / fname)] + ([] if name else [str(archive_dir / fname)]),
+                "force": args.force,
+            })
+
+    for fname in kept:
+        print(f"⏭  {fname}: already in archive/, kept (--overwrite to rebuild)")
+    if not jobs:
+        return []
+    workers = max(1, min(args.jobs or os.cpu_count() or 1, len(jobs)))
+    t0 = time.perf_counter()
+    if workers == 1:
+        _init_batch_worker(items)
+        results = [build_issue(j) for j in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(items,)) as ex:
+            results = list(ex.map(build_issue, jobs))
+    wall = time.perf_counter() - t0
+
+    for r in results:
+        if r.get("empty"):
+            print(f"⚠️  {Path(r['paths'][0]).name}: no stories in the window, skipped")
+            continue
+        if r["skipped"]:
+            print(f"⏭  {Path(r['paths'][0]).name}: unchanged")
+            continue
+        print(f"✅ {Path(r['paths'][0]).name}: {r['top']} of {r['items']} items"
+              + (" (archived)" if len(r["paths"]) > 1 else ""))
+    if not args.no_archive_store and any(not r["skipped"] and len(r["paths"]) > 1 for r in results):
+        from archive_store import ArchiveStore
+        with ArchiveStore() as store:
+            print(f"🗄  {store.sync(archive_dir)} issue(s) added to the archive store")
+    print(f"⏱ {len(jobs)} issues in {wall:.2f}s with {workers} process(es)")
+    for stage in ("filter", "dedupe", "rank", "render", "write"):
+        vals = [r["timings"][stage] for r in results]
+        print(f"   {stage:<7} total {sum(vals):.3f}s  max {max(vals):.3f}s")
+    return results
+
+def collect_items(args, prof: Optional[StageProfiler] = None) -> List[HighlightItem]:
+    """并发抓取所有分类；结果仍按 API_ENDPOINTS 顺序合并，保证去重结果稳定。"""
+    cache = None
+    if not args.no_cache or args.offline:
+        cache = ResponseCache(Path(args.cache_dir), ttl=args.cache_ttl)
+    fetched = fetch_all(API_ENDPOINTS, args.token, deadline=args.deadline, stream=args.stream,
+                        cache=cache, offline=args.offline, prof=prof)
+    all_items: List[HighlightItem] = []
+    for cat, url in API_ENDPOINTS.items():
+        try:
+            std = fetched[cat]
+            if isinstance(std, BaseException):
+                raise std
+            all_items.extend(std)
+        except Exception as e:
+            # requests.HTTPError 带 response（不为了 isinstance 判断导入 requests）
+            if getattr(e, "response", None) is not None:
+                sys.stderr.write(f"[HTTP {e.response.status_code}] {cat}: {url}\n")
+            else:
+                sys.stderr.write(f"[Error] {cat}: {e}\n")
+    return all_items
+
 # ============== main ==============
-def main():
+def main(argv: Optional[List[str]] = None):
     import argparse
     today = datetime.now().strftime("%Y-%m-%d")
 
@@ -291,50 +1081,155 @@ def main():
     ap.add_argument("--token", default=os.getenv("TECHSUM_API_KEY"))
     ap.add_argument("--template", default="src/newsletter_template.html")
     ap.add_argument("--outfile", default=str(default_outfile))
-    args = ap.parse_args()
+    ap.add_argument("--deadline", type=float, default=FETCH_DEADLINE, help="per-endpoint fetch deadline in seconds")
+    ap.add_argument("--stream", action="store_true", help="parse responses incrementally (requires ijson)")
+    ap.add_argument("--cache-dir", default=str(CACHE_DIR), help="on-disk response cache directory")
+    ap.add_argument("--cache-ttl", type=float, default=CACHE_TTL, help="seconds a cached response is used without revalidation")
+    ap.add_argument("--no-cache", action="store_true", help="always download, bypassing the response cache")
+    ap.add_argument("--offline", action="store_true", help="render purely from the response cache")
+    ap.add_argument("--topk", type=int, default=10, help="number of stories in the issue (default 10)")
+    ap.add_argument("--score", choices=sorted(SCORERS), default="default", help="ranking score function")
+    ap.add_argument("--quotas", action="store_true", help="cap stories per category using config/categories.json")
+    ap.add_argument("--history", default=str(HISTORY_FILE), help="index of stories sent in earlier issues (SQLite)")
+    ap.add_argument("--no-history", action="store_true", help="allow stories that already appeared in earlier issues")
+    ap.add_argument("--no-archive-store", action="store_true",
+                    help="do not add the issue to the searchable archive store (scripts/archive_store.py)")
+    ap.add_argument("--no-image-check", action="store_true", help="rank without checking that story images load")
+    ap.add_argument("--image-workers", type=int, default=IMAGE_WORKERS, help="parallel image downloads (default 8)")
+    ap.add_argument("--thumb-base-url", default=os.getenv("THUMB_BASE_URL"),
+                    help="serve cached 16:9 thumbnails from this URL (published to docs/thumbs/)")
+    ap.add_argument("--force", action="store_true", help="re-render even if the top stories and template are unchanged")
+    ap.add_argument("--profile", action="store_true",
+                    help="write cProfile stats and a JSON timing report next to the HTML (TECHSUM_TIMING=1 only prints timings)")
+    # 批量模式
+    ap.add_argument("--dates", help="batch: issue dates, 'YYYY-MM-DD..YYYY-MM-DD' and/or comma-separated")
+    ap.add_argument("--step", type=int, default=7, help="batch: days between issues in a date range (default 7)")
+    ap.add_argument("--window", type=float, default=7.0, help="batch: days of stories covered by each dated issue (default 7)")
+    ap.add_argument("--segments", help="batch: JSON file of segment definitions (one edition per segment)")
+    ap.add_argument("--jobs", type=int, help="batch: worker processes (default: CPU count)")
+    ap.add_argument("--overwrite", action="store_true", help="batch: rebuild issues that already exist in archive/")
+    args = ap.parse_args(argv)
 
-    # 抓取
-    all_items: List[Dict] = []
-    for cat, url in API_ENDPOINTS.items():
-        try:
-            raw = fetch_json(url, args.token)
-            std = normalize_items(raw, category=cat)
-            all_items.extend(std)
-        except requests.HTTPError as e:
-            sys.stderr.write(f"[HTTP {e.response.status_code}] {cat}: {url}\n")
-        except Exception as e:
-            sys.stderr.write(f"[Error] {cat}: {e}\n")
+    if args.stream and load_ijson() is None:
+        sys.stderr.write("[Warn] --stream needs ijson; falling back to buffered parsing.\n")
+
+    # 各阶段计时；--profile 时另外开 cProfile 与 tracemalloc
+    prof = StageProfiler(trace_memory=args.profile, cprofile=args.profile)
+    run_info = {"topk": args.topk, "score": args.score, "quotas": args.quotas, "stream": args.stream,
+                "cache": "offline" if args.offline else ("off" if args.no_cache else "on")}
 
+    # 抓取（并发）
+    with prof.stage("fetch") as st:
+        all_items = collect_items(args, prof)
+        st["items_out"] = len(all_items)
     if not all_items:
         sys.stderr.write("No items fetched from any endpoint.\n")
         sys.exit(1)
 
-    # 去重 → 排序选 Top10
-    uniq = dedupe_items(all_items)
-    top10 = rank_items(uniq, topk=10)
+    if args.dates or args.segments:
+        print(f"⏱ fetch+normalize {prof.stages['fetch']['wall_s']:.2f}s ({len(all_items)} items)")
+        with prof.stage("batch", items_in=len(all_items)) as st:
+            st["items_out"] = len(run_batch(args, all_items))
+        if args.profile:
+            out_dir = normalize_outfile(args.outfile).parent
+            prof.write(out_dir / f"batch-{today}", issue=f"batch-{today}", args=run_info)
+        return
 
-    # 控制台预览
-    for i, it in enumerate(top10, 1):
-        print(f"{i}. [{it['category']}] 热度 {it['feed_num']} | {it['date']}")
-        print(f"   {it['title']}")
-        if it.get("summary"):
-            print(f"   {it['summary']}")
-        print(f"   {it['link']}\n")
+    out_path = normalize_outfile(args.outfile)
 
-    # 渲染
-    html = render_html(top10, args.template)
+    # 往期已发送的故事：索引只解析新增的归档文件
+    history = None
+    if not args.no_history:
+        with prof.stage("history") as st:
+            from history import HistoryIndex
+            history = HistoryIndex(Path(args.history), history_keys, issue=out_path.name, version=keys_version())
+            history.sync(ROOT_DIR / "archive")
+            st["items_out"] = len(history)
+    repeats = set()
 
-    # 固定写入 根目录/output/...
-    out_path = normalize_outfile(args.outfile)
-    out_path.write_text(html, encoding="utf-8")
-    print(f"✅ 已生成: {out_path}")
-    
-    # 同时复制到 archive/ 文件夹（用于 Git 提交）
+    def already_sent(x: HighlightItem) -> bool:
+        if history.seen(x.link, x.title):
+            repeats.add(id(x))
+            return True
+        return False
+
+    # 去重 → 排序选 TopK
+    with prof.stage("dedupe", items_in=len(all_items)) as st:
+        uniq = dedupe_items(all_items)
+        st["items_out"] = len(uniq)
+    quotas = load_category_quotas() if args.quotas else None
+    score = SCORERS[args.score]()
+    rank = lambda k: rank_items(uniq, topk=k, score=score, quotas=quotas,
+                                skip=already_sent if history is not None else None)
+    images = None
+    if args.no_image_check or args.offline:
+        # --offline 只用本地缓存渲染，不发图片请求
+        with prof.stage("rank", items_in=len(uniq)) as st:
+            top = rank(args.topk)
+            st["items_out"] = len(top)
+    else:
+        # 有图的优先，所以排序前要知道哪些图真的能打开
+        with prof.stage("images", items_in=len(uniq)) as st:
+            from images import ImageCache
+            images = ImageCache(IMAGE_CACHE_DIR)
+            top = rank_checked(uniq, rank, args.topk, images, workers=args.image_workers)
+            st["items_out"] = len(top)
+        s = images.stats
+        print(f"🖼  images: {s['fetched']} fetched, {s['cached'] + s['not_modified']} cached, "
+              f"{s['dead'] + s['transient']} dead, {s['encoded']} thumbnails encoded")
+        if args.thumb_base_url:
+            base = args.thumb_base_url.rstrip("/")
+            for x in top:
+                name = images.publish(images.index.get(x.image) or {}, THUMB_PUBLISH_DIR) if x.image else None
+                if name:
+                    x.image = f"{base}/{name}"
+    if repeats:
+        print(f"↩️  Skipped {len(repeats)} stories already sent in earlier issues")
+
+    # 控制台预览
+    for i, it in enumerate(top, 1):
+        print(f"{i}. [{it.category}] 热度 {it.feed_num} | {it.date}")
+        print(f"   {it.title}")
+        if it.summary:
+            print(f"   {it.summary}")
+        print(f"   {it.link}\n")
+
+    # 同时放一份到 archive/ 文件夹（用于 Git 提交）
     archive_dir = ROOT_DIR / "archive"
     archive_dir.mkdir(exist_ok=True)
     archive_path = archive_dir / out_path.name
-    archive_path.write_text(html, encoding="utf-8")
-    print(f"📦 已归档: {archive_path}")
+    key = build_key(top, args.template, topk=args.topk)
+    if not args.force and up_to_date(key, [out_path, archive_path]):
+        print(f"⏭  Top {len(top)} and template unchanged since the last build ({key[:12]}); kept {out_path.name}")
+        if history is not None:
+            history.close()
+    else:
+        # 渲染
+        with prof.stage("render", items_in=len(top)):
+            html = stamp_build(render_html(top, args.template, topk=args.topk), key)
+
+        with prof.stage("write") as st:
+            # 固定写入 根目录/output/...；归档副本是它的硬链接
+            files = write_outputs(html, [out_path, archive_path])
+            print(f"✅ 已生成: {out_path}")
+            print(f"📦 已归档: {archive_path}")
+
+            if history is not None:
+                history.record(archive_path.name, [(x.link, x.title) for x in top], mtime=archive_path.stat().st_mtime)
+                history.close()
+            if not args.no_archive_store:
+                # 结构化条目直接取自 top；其他还没入库的归档文件顺带导入
+                from archive_store import ArchiveStore
+                with ArchiveStore() as store:
+                    store.add_issue(archive_path.name, html, items=top, mtime=archive_path.stat().st_mtime)
+                    store.sync(archive_dir)
+            st["items_out"] = len(files)
+
+    if args.profile:
+        for kind, p in prof.write(out_path.with_suffix(""), issue=out_path.name, args=run_info).items():
+            print(f"📈 {kind}: {p}")
+    elif timing_enabled():
+        print(prof.summary(), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compressed, searchable store of every issue: structured stories + the rendered HTML in one SQLite file.
+
+- 默认 .cache/archive.sqlite（TECHSUM_ARCHIVE_DB 可改）；scripts/api.py 每次生成后自动写入，
+  第一次使用时从 archive/*.html 导入（只解析新增或修改过的文件，按 mtime）
+- 只追加：同一期重新生成且内容变了，新增一个版本（revision），查询只看各期的最新版本；内容没变不写
+- HTML 按 sha256 去重后压缩存放（有 zstandard 用 zstd，否则 zlib）
+- 这是派生索引，不是正本：提交到 Git 的仍是 archive/*.html（文本，每期新增一个小 blob，能 diff、能直接看）；
+  SQLite 文件每次写入都整体变化，提交进去每期会多一个接近整库大小的二进制 blob。库丢了随时可由 archive/ 重建，
+  所以放在不提交的 .cache/，CI（用完即弃的 runner）里不建；output/ 里的同名副本 migrate 时改成硬链接，不再多占空间
+- 每条故事存 标题 / 链接 / 分类 / 热度 / 日期 / 摘要；标题、摘要、分类建 FTS5 全文索引（porter 词干化），
+  规范化链接（normalize.canonical_url）建普通索引——“哪一期讲过这条新闻”不用再 grep HTML
+
+Usage:
+  python scripts/archive_store.py migrate [--no-link-output]  # 导入 archive/*.html，output/ 副本改硬链接
+  python scripts/archive_store.py search "openai chips" --limit 10
+  python scripts/archive_store.py url https://techcrunch.com/2025/11/07/...
+  python scripts/archive_store.py show newsletter-2025-11-09.html [--html > issue.html]
+  python scripts/archive_store.py list
+  python scripts/archive_store.py stats
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from history import is_story_link
+from normalize import canonical_url, keys_version
+
+try:
+    import zstandard  # 可选：比 zlib 再小一些，解压更快
+except ImportError:
+    zstandard = None
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+ARCHIVE_DB = Path(os.getenv("TECHSUM_ARCHIVE_DB") or ROOT_DIR / ".cache" / "archive.sqlite")
+ARCHIVE_DIR = ROOT_DIR / "archive"
+OUTPUT_DIR = ROOT_DIR / "output"
+ZSTD_LEVEL = 19
+ZLIB_LEVEL = 9
+
+_DAY = re.compile(r"\d{4}-\d{2}-\d{2}")
+_BADGE = re.compile(r"(?:🔥|热度)\s*(\d+)")
+_WORD = re.compile(r"\w+", flags=re.U)
+
+# ---- 压缩 ----
+def compress(data: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("this issue was stored with zstd: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown codec {codec!r}")
+
+
+# ---- 从渲染好的 HTML 里取出结构化的故事 ----
+class _IssueParser(HTMLParser):
+    """
+    标题链接的识别与 history 相同；标题之后、下一个链接之前的 <span> 是元信息（日期 / 热度 / 分类），
+    class 含 summary 的 <div> 是摘要。三代模板（内置 / 卡片 / 双列表格）都适用。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items: List[Dict[str, Any]] = []
+        self._cur: Optional[Dict[str, Any]] = None  # 正在收集元信息的故事
+        self._field: Optional[str] = None           # "title" / "span" / "summary"
+        self._is_cat = False
+        self._text: List[str] = []
+
+    def _start(self, field: str):
+        self._field, self._text = field, []
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "a":
+            if is_story_link(a):
+                self._cur = {"category": "", "title": "", "link": a.get("href") or "", "feed_num": 0, "date": "", "summary": ""}
+                self.items.append(self._cur)
+                self._start("title")
+            elif self._field is None:
+                self._cur = None  # 下一张卡片的配图 / 页脚链接：这条故事到此为止
+        elif self._cur is None or self._field is not None:
+            return
+        elif tag == "span":
+            self._start("span")
+            self._is_cat = "cat" in (a.get("class") or "").split() or "opacity" in (a.get("style") or "")
+        elif tag == "div" and "summary" in (a.get("class") or ""):
+            self._start("summary")
+
+    def handle_data(self, data):
+        if self._field is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if self._field is None or tag != {"title": "a", "span": "span", "summary": "div"}[self._field]:
+            return
+        text = " ".join("".join(self._text).split())
+        cur, field = self._cur, self._field
+        self._field = None
+        if field == "title":
+            cur["title"] = text
+        elif field == "summary":
+            cur["summary"] = text
+            self._cur = None
+        elif _DAY.fullmatch(text):
+            cur["date"] = cur["date"] or text
+        elif _BADGE.search(text):
+            cur["feed_num"] = int(_BADGE.search(text).group(1))
+        elif self._is_cat and text and not cur["category"]:
+            cur["category"] = text
+
+def parse_items(html: str) -> List[Dict[str, Any]]:
+    p = _IssueParser()
+    p.feed(html)
+    p.close()
+    return p.items
+
+def issue_date(name: str) -> str:
+    m = _DAY.search(name)
+    return m.group(0) if m else ""
+
+def _row(x: Any) -> Tuple:
+    """HighlightItem 或 parse_items 的 dict → items 表的一行（不含 id / issue_id / pos）。"""
+    feed = x.get("feed_num")
+    link = str(x.get("link") or "")
+    return (str(x.get("category") or ""), str(x.get("title") or ""), link, canonical_url(link),
+            int(feed) if str(feed).isdigit() else 0, str(x.get("date") or "").split(" ")[0],
+            str(x.get("summary") or ""))
+
+def fts_query(text: str) -> str:
+    """
+    用户输入 → FTS5 查询：每个词加引号，词之间是 AND（标点、引号不会引起语法错误；porter 词干化让 chips 也能匹配 chip）。
+    单个字符的词（Musk's 里的 s）去掉，除非只剩这些。
+    """
+    words = _WORD.findall(text)
+    return " ".join(f'"{w}"' for w in [w for w in words if len(w) > 1] or words)
+
+
+class ArchiveHit(NamedTuple):
+    issue: str
+    issue_date: str
+    category: str
+    title: str
+    link: str
+    feed_num: int
+    date: str
+    snippet: str = ""
+
+
+class ArchiveStore:
+    def __init__(self, path: Path = ARCHIVE_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, codec TEXT NOT NULL, size INTEGER NOT NULL,
+                                              data BLOB NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS issues (id INTEGER PRIMARY KEY, name TEXT NOT NULL, date TEXT, sha TEXT NOT NULL,
+                                               n_items INTEGER, source_mtime REAL, added_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_issues_name ON issues(name, id);
+            CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, issue_id INTEGER NOT NULL, pos INTEGER NOT NULL,
+                                              category TEXT, title TEXT, link TEXT, url_key TEXT, feed_num INTEGER,
+                                              date TEXT, summary TEXT);
+            CREATE INDEX IF NOT EXISTS idx_items_issue ON items(issue_id);
+            CREATE INDEX IF NOT EXISTS idx_items_url ON items(url_key);
+            CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                title, summary, category, content='items', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2');
+            -- 各期的最新版本（唯一会被改写的表；其余只追加）
+            CREATE TABLE IF NOT EXISTS current (name TEXT PRIMARY KEY, issue_id INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+        """)
+        row = self.db.execute("SELECT v FROM meta WHERE k = 'keys_version'").fetchone()
+        if (row[0] if row else "") != keys_version():
+            self._rekey()
+
+    def _rekey(self):
+        """规范化规则变了：按新规则重算 url_key（结构化数据本身不变，不用重新解析）。"""
+        with self.db:
+            rows = self.db.execute("SELECT id, link FROM items").fetchall()
+            self.db.executemany("UPDATE items SET url_key = ? WHERE id = ?", [(canonical_url(l or ""), i) for i, l in rows])
+            self.db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('keys_version', ?)", (keys_version(),))
+
+    def __enter__(self) -> "ArchiveStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    # ---- 写入 ----
+    def add_issue(self, name: str, html: str, items: Optional[Iterable[Any]] = None,
+                  mtime: Optional[float] = None) -> Optional[int]:
+        """
+        存入一期。items 为 HighlightItem（或同名字段的 dict）；不给则从 HTML 解析。
+        与最新版本内容相同时只更新 source_mtime，返回 None；否则返回新版本的 id。
+        """
+        raw = html.encode("utf-8")
+        sha = hashlib.sha256(raw).hexdigest()
+        cur = self.db.execute("SELECT i.id, i.sha FROM current c JOIN issues i ON i.id = c.issue_id WHERE c.name = ?",
+                              (name,)).fetchone()
+        if cur and cur[1] == sha:
+            with self.db:
+                self.db.execute("UPDATE issues SET source_mtime = ? WHERE id = ?", (mtime, cur[0]))
+            return None
+        rows = [_row(x) for x in (parse_items(html) if items is None else items)]
+        with self.db:
+            if not self.db.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,)).fetchone():
+                codec, data = compress(raw)
+                self.db.execute("INSERT INTO blobs (sha, codec, size, data) VALUES (?, ?, ?, ?)", (sha, codec, len(raw), data))
+            issue_id = self.db.execute(
+                "INSERT INTO issues (name, date, sha, n_items, source_mtime, added_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, issue_date(name), sha, len(rows), mtime, time.time())).lastrowid
+            self.db.executemany(
+                "INSERT INTO items (issue_id, pos, category, title, link, url_key, feed_num, date, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [(issue_id, pos) + r for pos, r in enumerate(rows)])
+            self.db.execute("INSERT INTO items_fts (rowid, title, summary, category) "
+                            "SELECT id, title, summary, category FROM items WHERE issue_id = ?", (issue_id,))
+            self.db.execute("INSERT OR REPLACE INTO current (name, issue_id) VALUES (?, ?)", (name, issue_id))
+        return issue_id
+
+    def sync(self, archive_dir: Path = ARCHIVE_DIR, pattern: str = "newsletter-*.html") -> int:
+        """导入新增或修改过的归档文件；返回新增的版本数。"""
+        known = dict(self.db.execute("SELECT c.name, i.source_mtime FROM current c JOIN issues i ON i.id = c.issue_id"))
+        n = 0
+        for f in sorted(Path(archive_dir).glob(pattern)):
+            mtime = f.stat().st_mtime
+            if known.get(f.name) == mtime:
+                continue
+            n += self.add_issue(f.name, f.read_text(encoding="utf-8", errors="replace"), mtime=mtime) is not None
+        return n
+
+    # ---- 查询 ----
+    _HIT_SQL = ("SELECT c.name, i.date, it.category, it.title, it.link, it.feed_num, it.date{snippet} "
+                "FROM {source} JOIN current c ON c.issue_id = it.issue_id JOIN issues i ON i.id = it.issue_id ")
+
+    def search(self, query: str, limit: int = 20, raw: bool = False) -> List[ArchiveHit]:
+        """全文检索标题 / 摘要 / 分类（BM25 排序，标题权重最高）。raw=True 时 query 按 FTS5 语法原样使用。"""
+        q = query if raw else fts_query(query)
+        if not q:
+            return []
+        sql = self._HIT_SQL.format(snippet=", snippet(items_fts, 1, '[', ']', '…', 12)",
+                                   source="items_fts JOIN items it ON it.id = items_fts.rowid")
+        rows = self.db.execute(sql + "WHERE items_fts MATCH ? ORDER BY bm25(items_fts, 10.0, 1.0, 2.0) LIMIT ?", (q, limit))
+        return [ArchiveHit(*r) for r in rows]
+
+    def by_url(self, url: str) -> List[ArchiveHit]:
+        """哪些期收录过这个链接（按规范化 URL 比较，跟踪参数、http/https 等差异不影响）。"""
+        key = canonical_url(url)
+        if not key:
+            return []
+        sql = self._HIT_SQL.format(snippet=", ''", source="items it")
+        return [ArchiveHit(*r) for r in self.db.execute(sql + "WHERE it.url_key = ? ORDER BY c.name", (key,))]
+
+    def issues(self) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            "SELECT c.name, i.date, i.n_items, b.size, length(b.data), b.codec, "
+            "(SELECT count(*) FROM issues r WHERE r.name = c.name) "
+            "FROM current c JOIN issues i ON i.id = c.issue_id JOIN blobs b ON b.sha = i.sha ORDER BY c.name")
+        return [dict(zip(("name", "date", "items", "bytes", "stored", "codec", "revisions"), r)) for r in rows]
+
+    def issue(self, name: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute("SELECT i.id, i.date, i.added_at FROM current c JOIN issues i ON i.id = c.issue_id "
+                              "WHERE c.name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        cols = ("category", "title", "link", "feed_num", "date", "summary")
+        items = [dict(zip(cols, r)) for r in self.db.execute(
+            f"SELECT {', '.join(cols)} FROM items WHERE issue_id = ? ORDER BY pos", (row[0],))]
+        return {"name": name, "date": row[1], "added_at": row[2], "items": items}
+
+    def html(self, name: str) -> Optional[str]:
+        row = self.db.execute("SELECT b.codec, b.data FROM current c JOIN issues i ON i.id = c.issue_id "
+                              "JOIN blobs b ON b.sha = i.sha WHERE c.name = ?", (name,)).fetchone()
+        return decompress(*row).decode("utf-8") if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        q = lambda sql: self.db.execute(sql).fetchone()
+        raw, stored, blobs = q("SELECT coalesce(sum(size), 0), coalesce(sum(length(data)), 0), count(*) FROM blobs")
+        return {"issues": q("SELECT count(*) FROM current")[0], "revisions": q("SELECT count(*) FROM issues")[0],
+                "items": q("SELECT count(*) FROM items")[0], "blobs": blobs, "html_bytes": raw,
+                "compressed_bytes": stored, "db_bytes": self.path.stat().st_size,
+                "codecs": dict(self.db.execute("SELECT codec, count(*) FROM blobs GROUP BY codec"))}
+
+def link_output(archive_dir: Path = ARCHIVE_DIR, output_dir: Path = OUTPUT_DIR) -> Tuple[int, int]:
+    """output/ 里与 archive/ 同名且内容相同的副本改成硬链接（api.py 现在就是这样写的）；返回 (文件数, 省下的字节)。"""
+    n = saved = 0
+    for a in sorted(Path(archive_dir).glob("newsletter-*.html")):
+        o = Path(output_dir) / a.name
+        if not o.is_file() or os.path.samefile(a, o) or o.read_bytes() != a.read_bytes():
+            continue
+        tmp = o.with_name(o.name + ".link")
+        os.link(a, tmp)
+        os.replace(tmp, o)
+        n, saved = n + 1, saved + a.stat().st_size
+    return n, saved
+
+
+# ---- CLI ----
+def _print_hits(hits: List[ArchiveHit], as_json: bool):
+    if as_json:
+        print(json.dumps([h._asdict() for h in hits], ensure_ascii=False, indent=2))
+        return
+    for h in hits:
+        print(f"{h.issue_date or h.issue}  [{h.category or '-'}] 🔥 {h.feed_num}  {h.title}")
+        print(f"   {h.link}")
+        if h.snippet:
+            print(f"   {h.snippet}")
+
+def _timed(fn, *a, **kw):
+    t = time.perf_counter()
+    out = fn(*a, **kw)
+    print(f"⏱ {(time.perf_counter() - t) * 1000:.3f} ms", file=sys.stderr)
+    return out
+
+def cmd_migrate(store: ArchiveStore, args):
+    t = time.perf_counter()
+    n = store.sync(Path(args.archive_dir))
+    print(f"📚 {n} issue(s) imported from {args.archive_dir} in {time.perf_counter() - t:.2f}s")
+    if not args.no_link_output:
+        files, saved = link_output(Path(args.archive_dir), Path(args.output_dir))
+        print(f"🔗 {files} output copies hardlinked to archive/ ({saved / 1024:.1f} KB freed)")
+    cmd_stats(store, args)
+
+def cmd_search(store: ArchiveStore, args):
+    try:
+        hits = _timed(store.search, " ".join(args.query), limit=args.limit, raw=args.raw)
+    except sqlite3.OperationalError as e:
+        # --raw 的查询原样交给 FTS5，语法错误（如 "foo AND"）在这里报告
+        raise SystemExit(f"bad FTS query: {e}")
+    _print_hits(hits, args.json)
+    if not hits and not args.json:
+        print("(no matches)")
+
+def cmd_url(store: ArchiveStore, args):
+    hits = _timed(store.by_url, args.url)
+    _print_hits(hits, args.json)
+    if not hits and not args.json:
+        print(f"(not in any issue: {canonical_url(args.url) or args.url})")
+
+def cmd_show(store: ArchiveStore, args):
+    if args.html:
+        html = store.html(args.name)
+        if html is None:
+            raise SystemExit(f"no issue named {args.name!r}")
+        sys.stdout.write(html)
+        return
+    issue = store.issue(args.name)
+    if issue is None:
+        raise SystemExit(f"no issue named {args.name!r}")
+    if args.json:
+        print(json.dumps(issue, ensure_ascii=False, indent=2))
+        return
+    print(f"📰 {issue['name']} ({len(issue['items'])} stories)")
+    for i, x in enumerate(issue["items"], 1):
+        print(f"{i:>2}. [{x['category'] or '-'}] 🔥 {x['feed_num']} | {x['date']}  {x['title']}")
+        print(f"    {x['link']}")
+
+def cmd_list(store: ArchiveStore, args):
+    for r in store.issues():
+        print(f"{r['name']:<36} {r['items']:>3} stories  {r['bytes'] / 1024:>6.1f} KB → {r['stored'] / 1024:>5.1f} KB "
+              f"{r['codec']}" + (f"  ({r['revisions']} revisions)" if r["revisions"] > 1 else ""))
+
+def cmd_stats(store: ArchiveStore, args):
+    s = store.stats()
+    ratio = s["html_bytes"] / s["compressed_bytes"] if s["compressed_bytes"] else 0
+    print(f"🗄  {store.path}: {s['issues']} issues ({s['revisions']} revisions), {s['items']} stories; "
+          f"HTML {s['html_bytes'] / 1024:.1f} KB → {s['compressed_bytes'] / 1024:.1f} KB ({ratio:.1f}x), "
+          f"database {s['db_bytes'] / 1024:.1f} KB")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Search and manage the compressed issue archive")
+    p.add_argument("--db", default=str(ARCHIVE_DB), help="SQLite store (default .cache/archive.sqlite, or TECHSUM_ARCHIVE_DB)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("migrate", help="import new or modified archive/*.html and hardlink identical output/ copies")
+    s.add_argument("--archive-dir", default=str(ARCHIVE_DIR))
+    s.add_argument("--output-dir", default=str(OUTPUT_DIR))
+    s.add_argument("--no-link-output", action="store_true", help="leave output/ copies as separate files")
+    s.set_defaults(func=cmd_migrate)
+    s = sub.add_parser("search", help="full-text search over titles, summaries and categories")
+    s.add_argument("query", nargs="+")
+    s.add_argument("--limit", type=int, default=20)
+    s.add_argument("--raw", action="store_true", help="pass the query to FTS5 as is (AND / OR / NEAR, column:term)")
+    s.add_argument("--json", action="store_true")
+    s.set_defaults(func=cmd_search)
+    s = sub.add_parser("url", help="issues that included this link")
+    s.add_argument("url")
+    s.add_argument("--json", action="store_true")
+    s.set_defaults(func=cmd_url)
+    s = sub.add_parser("show", help="stories of one issue (or its HTML)")
+    s.add_argument("name", help="e.g. newsletter-2025-11-09.html")
+    s.add_argument("--html", action="store_true", help="write the stored HTML to stdout")
+    s.add_argument("--json", action="store_true")
+    s.set_defaults(func=cmd_show)
+    sub.add_parser("list", help="stored issues").set_defaults(func=cmd_list)
+    sub.add_parser("stats", help="sizes and counts").set_defaults(func=cmd_stats)
+    args = p.parse_args(argv)
+
+    with ArchiveStore(Path(args.db)) as store:
+        args.func(store, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for the newsletter build stages in scripts/api.py, on seeded synthetic corpora.
+
+- 生成器按固定种子产出 TechSum 形状的接口数据：近似重复的标题（大小写 / 标点 / 错字 / 来源后缀 / 换词）、
+  同一链接的多种写法（utm 参数、结尾斜杠、http、大写域名、#锚点）、缺图、多种日期格式
+- 每个阶段 × 每个规模取多次运行的最小值；结果与基线（默认 .cache/bench/baseline.json）比较，
+  变慢超过 --threshold 的标为回归
+- 基线与机器相关，换机器后先 --save 一次
+
+Usage:
+  python scripts/bench.py                                   # 100 / 1k / 10k / 100k，与基线比较
+  python scripts/bench.py --sizes 100,1000,10000            # 不跑 100k（100k 要几分钟）
+  python scripts/bench.py --stages dedupe,rank --save       # 只跑部分阶段并更新基线
+  python scripts/bench.py --check                           # 有回归时退出码为 1（CI 用）
+  python scripts/bench.py --dump /tmp/corpus --sizes 1000   # 把语料写成 <category>.json
+  python scripts/bench.py --imports --check                 # CLI 导入耗时预算 + 重依赖保持惰性导入
+  python scripts/bench.py --sizes 100000 --stages canonical_url,canonical_url_raw,canonical_urls,normalize_titles
+  python scripts/bench.py --sizes 500 --stages dedupe,dedupe_linear  # 索引版 vs 原线性扫描
+  python scripts/bench.py --verify --sizes 100,300 --seeds 5         # 两者输出逐条一致，否则退出码为 1
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import api
+import normalize
+from history import HistoryIndex
+
+BASELINE_FILE = api.ROOT_DIR / ".cache" / "bench" / "baseline.json"
+CATEGORIES = list(api.API_ENDPOINTS)
+
+# 超过这个规模的慢阶段默认跳过（--full 时全部运行）
+SLOW_LIMITS = {"dedupe_linear": 500}
+
+# 逐条处理的阶段：另外报告吞吐（条 / 秒）
+PER_ITEM = {"normalize", "normalize_title", "normalize_titles", "canonical_url", "canonical_url_raw",
+            "canonical_urls", "canonical_url_warm"}
+
+# 导入预算：这些模块在新解释器里 import 的累计耗时上限（毫秒），且不应顺带加载 LAZY_DEPS
+CLI_MODULES = ("api", "subscribers", "send_email", "mongo", "history", "profiling", "normalize", "archive_store")
+LAZY_DEPS = ("requests", "jinja2", "dateutil", "ijson", "PIL", "pymongo", "smtplib", "pstats", "multiprocessing")
+IMPORT_BUDGET_MS = 100.0
+
+# ---------------- corpus ----------------
+_COMPANIES = ["OpenAI", "Apple", "Google", "Microsoft", "Amazon", "Meta", "Nvidia", "Tesla", "Samsung", "Intel",
+              "AMD", "TSMC", "Anthropic", "Netflix", "Uber", "Airbnb", "ByteDance", "Alibaba", "Tencent", "Baidu",
+              "Huawei", "Xiaomi", "Sony", "IBM", "Oracle", "Salesforce", "Adobe", "Spotify", "Roblox", "SpaceX",
+              "Qualcomm", "Arm", "Dell", "HP", "Lenovo", "Stripe", "Shopify", "Zoom", "Snap", "Pinterest"]
+_VERBS = ["unveils", "launches", "acquires", "settles", "expands", "cuts", "delays", "tests", "open-sources",
+          "invests in", "partners on", "sues over", "wins approval for", "faces probe into", "rolls out",
+          "halts", "doubles down on", "reveals", "previews", "prices", "ships", "patents", "licenses",
+          "restructures", "bets on", "scales back", "teases", "confirms", "denies", "upgrades"]
+_OBJECTS = ["AI chip", "foundation model", "smartphone lineup", "cloud region", "robotaxi fleet", "AR headset",
+            "data center", "subscription tier", "antitrust case", "privacy policy", "battery plant", "GPU cluster",
+            "search engine", "coding assistant", "satellite network", "payments app", "ad platform", "chip fab",
+            "video model", "voice assistant", "developer SDK", "EV platform", "health tracker", "quantum processor",
+            "content policy", "streaming bundle", "gaming console", "open-weight model", "safety framework",
+            "enterprise agent", "translation tool", "mapping service", "music generator", "drone program",
+            "supply deal", "labor agreement", "tax dispute", "bug bounty", "browser", "operating system",
+            "wearable", "smart glasses", "energy contract", "nuclear deal", "fiber network", "5G modem",
+            "memory chip", "robot arm", "humanoid robot", "RISC-V core", "edge device", "messaging app",
+            "photo editor", "spreadsheet AI", "security patch", "ransomware response", "IPO", "layoff plan",
+            "board shake-up", "pricing change"]
+_QUALIFIERS = ["in Europe", "in India", "for developers", "amid backlash", "after delay", "ahead of schedule",
+               "worth $2.5 billion", "with 1M users", "for enterprises", "in China", "this quarter", "by 2027",
+               "under pressure", "to rival Nvidia", "for students", "on iOS", "for Android", "in beta",
+               "at scale", "with new partners"]
+_SOURCES = [" - Reuters", " | TechCrunch", " — The Verge", " (Bloomberg)", ": report"]
+_DOMAINS = ["techcrunch.com", "theverge.com", "reuters.com", "apnews.com", "wired.com", "arstechnica.com",
+            "bloomberg.com", "cnbc.com", "engadget.com", "zdnet.com"]
+_SYNONYMS = {"unveils": "reveals", "launches": "rolls out", "acquires": "buys", "cuts": "slashes",
+             "AI chip": "AI processor", "smartphone lineup": "phone lineup", "data center": "datacenter"}
+
+def _base_title(rnd: random.Random) -> str:
+    t = f"{rnd.choice(_COMPANIES)} {rnd.choice(_VERBS)} {rnd.choice(_OBJECTS)}"
+    if rnd.random() < 0.7:
+        t += " " + rnd.choice(_QUALIFIERS)
+    if rnd.random() < 0.3:
+        t += f" #{rnd.randint(1, 999)}"
+    return t
+
+def _variant_title(t: str, rnd: random.Random) -> str:
+    """近似重复：同一事件的不同写法。"""
+    r = rnd.random()
+    if r < 0.2:
+        return t.upper() if rnd.random() < 0.2 else t.lower()
+    if r < 0.4:
+        return t + rnd.choice(["!", "?", ".", "…"])
+    if r < 0.6:
+        return t + rnd.choice(_SOURCES)
+    if r < 0.8:
+        for a, b in _SYNONYMS.items():
+            if a in t:
+                return t.replace(a, b, 1)
+    chars = list(t)
+    for _ in range(rnd.randint(1, 2)):
+        p = rnd.randrange(len(chars))
+        op = rnd.random()
+        if op < 0.4:
+            chars.pop(p)
+        elif op < 0.7:
+            chars.insert(p, rnd.choice("abcdefghijklmnopqrstuvwxyz"))
+        else:
+            chars[p] = rnd.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+def _variant_url(url: str, rnd: random.Random) -> str:
+    """同一篇文章的链接变体：查询串、结尾斜杠、协议、大小写、锚点。"""
+    r = rnd.random()
+    if r < 0.3:
+        return url + "?utm_source=newsletter&utm_medium=email"
+    if r < 0.5:
+        return url.rstrip("/")
+    if r < 0.6:
+        return url.replace("https://", "http://", 1)
+    if r < 0.7:
+        host = url.split("/")[2]
+        return url.replace(host, host.upper(), 1)
+    if r < 0.8:
+        return url + "#comments"
+    return url + "?ref=rss"
+
+def _date_string(dt: datetime, rnd: random.Random) -> str:
+    r = rnd.random()
+    if r < 0.5:
+        return dt.strftime("%Y-%m-%d %H:%M:%S")
+    if r < 0.8:
+        return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if r < 0.95:
+        return dt.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    return rnd.choice(["", "unknown", "N/A"])
+
+def make_corpus(n: int, seed: int = 42, dup_rate: float = 0.3) -> Dict[str, Any]:
+    """
+    生成 n 条记录，分到各分类；返回 {category: 接口原始数据}。
+    第一个分类返回 dict keyed by topic（接口的另一种形状），其余为 list。
+    """
+    rnd = random.Random(seed)
+    start = datetime(2025, 10, 1, tzinfo=timezone.utc)
+    bases: List[Dict[str, Any]] = []
+    records: Dict[str, List[Dict[str, Any]]] = {c: [] for c in CATEGORIES}
+    for i in range(n):
+        is_dup = bool(bases) and rnd.random() < dup_rate
+        if is_dup:
+            b = rnd.choice(bases)
+            title = _variant_title(b["suggested_headline"], rnd)
+            link = _variant_url(b["articles"][0]["link"], rnd) if rnd.random() < 0.6 \
+                else f"https://{rnd.choice(_DOMAINS)}/news/{i}/"
+            dt = b["_dt"] + timedelta(hours=rnd.randint(0, 48))
+        else:
+            title = _base_title(rnd)
+            slug = "-".join(title.lower().replace("#", "").split()[:8])
+            dt = start + timedelta(minutes=rnd.randint(0, 14 * 24 * 60))
+            link = f"https://{rnd.choice(_DOMAINS)}/{dt:%Y/%m/%d}/{slug}/"
+        r = rnd.random()
+        images = [] if r < 0.2 else ([{"image_link": ""}] if r < 0.3 else
+                                     [{"image_link": f"https://img.example.com/{i}.jpg"}, {"image_link": "https://img.example.com/x.jpg"}])
+        feed = rnd.randint(1, 200)
+        rec = {
+            "suggested_headline": title,
+            "group_summary": f"{title}. " + " ".join(rnd.choice(_OBJECTS) for _ in range(rnd.randint(8, 30))) + " | extra",
+            "earliest_published": _date_string(dt, rnd),
+            "feed_num": str(feed) if rnd.random() < 0.1 else feed,
+            "article_num": rnd.randint(1, 40),
+            "images": images,
+            "articles": [{"link": link, "title": title}] + [{"link": f"https://{rnd.choice(_DOMAINS)}/{i}/{k}"} for k in range(rnd.randint(0, 3))],
+            "_dt": dt,
+        }
+        records[CATEGORIES[i % len(CATEGORIES)]].append(rec)
+        if not is_dup:
+            bases.append(rec)
+    out: Dict[str, Any] = {}
+    for j, (cat, recs) in enumerate(records.items()):
+        for rec in recs:
+            rec.pop("_dt", None)
+        out[cat] = {f"topic-{k}": rec for k, rec in enumerate(recs)} if j == 0 else recs
+    return out
+
+def edge_corpus(n: int, seed: int = 42) -> Dict[str, Any]:
+    """make_corpus 的变体：混入空标题、1~4 字符的短标题和 >200 字符的长标题（SequenceMatcher 的 autojunk 分支）。"""
+    rnd = random.Random(seed)
+    corpus = make_corpus(n, seed)
+    for data in corpus.values():
+        for rec in (data.values() if isinstance(data, dict) else data):
+            r = rnd.random()
+            t = rec["suggested_headline"]
+            if r < 0.1:
+                t = rnd.choice(["", " ", "!!!"])
+            elif r < 0.25:
+                t = "".join(rnd.choice("abc ") for _ in range(rnd.randint(1, 4)))
+            elif r < 0.4:
+                t = (t + " ") * 6
+                if rnd.random() < 0.5:
+                    t = _variant_title(t, rnd)
+            rec["suggested_headline"] = rec["articles"][0]["title"] = t
+    return corpus
+
+# ---------------- stages ----------------
+def _normalized(corpus: Dict[str, Any]) -> List[api.HighlightItem]:
+    items: List[api.HighlightItem] = []
+    for cat, data in corpus.items():
+        items.extend(api.normalize_items(data, cat))
+    return items
+
+def dedupe_linear(items: List[api.HighlightItem], threshold: float = 0.90) -> List[api.HighlightItem]:
+    """TitleIndex 之前的 dedupe_items：逐个与已选条目比较，O(n²) 次 SequenceMatcher。作为对照，不要在构建里用。"""
+    chosen: List[api.HighlightItem] = []
+    seen: List[tuple] = []  # (canon_url, norm_title)
+    for cur in items:
+        cu, ct = api.canonical_url(cur.link), api.normalize_title(cur.title)
+        dup_idx = -1
+        for idx, (u_seen, t_seen) in enumerate(seen):
+            if cu and u_seen and cu == u_seen:
+                dup_idx = idx
+                break
+            if ct and t_seen and api.title_similarity(ct, t_seen) >= threshold:
+                dup_idx = idx
+                break
+        if dup_idx == -1:
+            chosen.append(cur)
+            seen.append((cu, ct))
+        elif api.pick_better(cur, chosen[dup_idx]) is cur:
+            chosen[dup_idx] = cur
+            seen[dup_idx] = (cu, ct)
+    return chosen
+
+def verify_dedupe(sizes: List[int], seeds: List[int], thresholds=(0.90,)) -> List[str]:
+    """在种子语料（普通 + edge_corpus）上比较 dedupe_items 与 dedupe_linear，返回不一致的组合。"""
+    failed = []
+    for n in sizes:
+        for seed in seeds:
+            for kind, corpus in (("corpus", make_corpus(n, seed)), ("edge", edge_corpus(n, seed))):
+                items = _normalized(corpus)
+                for thr in thresholds:
+                    t0 = time.perf_counter()
+                    got = api.dedupe_items(items, thr)
+                    t1 = time.perf_counter()
+                    want = dedupe_linear(items, thr)
+                    t2 = time.perf_counter()
+                    ok = len(got) == len(want) and all(a is b for a, b in zip(got, want))
+                    print(f"   {'✅' if ok else '❌'} dedupe {kind:<6} n={n:<6} seed={seed:<4} thr={thr:.2f}  "
+                          f"{len(items)} -> {len(got)} (linear {len(want)})  index {(t1 - t0) * 1000:.1f} ms, linear {(t2 - t1) * 1000:.1f} ms")
+                    if not ok:
+                        failed.append(f"{kind}@{n}/seed={seed}/thr={thr}")
+    return failed
+
+def build_stages(n: int, seed: int) -> Dict[str, Callable[[], Any]]:
+    """每个规模准备一次输入；返回 {阶段名: 无参函数}。"""
+    corpus = make_corpus(n, seed)
+    payloads = {cat: json.dumps(data).encode("utf-8") for cat, data in corpus.items()}
+    items = _normalized(corpus)
+    uniq = api.dedupe_items(items)
+    quotas = {c: 4 for c in CATEGORIES}
+    top = api.rank_items(uniq, topk=10)
+    pairs = list(zip(items[::2], items[1::2]))
+    history = HistoryIndex(Path(":memory:"), api.history_keys, issue="bench.html")
+    history.record("previous.html", [(x.link, x.title) for x in items[: max(1, n // 10)]])
+
+    def json_parse():
+        return [json.loads(b) for b in payloads.values()]
+
+    def normalize_all():
+        api._parse_dt_str.cache_clear()  # 否则第二次起全部命中日期缓存
+        return _normalized(corpus)
+
+    links = [x.link for x in items]
+    titles = [x.title for x in items]
+
+    def cold(fn):
+        # 规范化结果按字符串缓存：每次先清空，测的是“一次构建”的开销（批内重复仍会命中）
+        def run():
+            normalize.cache_clear()
+            return fn()
+        return run
+
+    stages = {
+        "json_parse": json_parse,
+        "normalize": normalize_all,
+        "normalize_title": cold(lambda: [normalize.normalize_title(t) for t in titles]),
+        "normalize_titles": cold(lambda: normalize.normalize_titles(titles)),
+        "canonical_url": cold(lambda: [normalize.canonical_url(u) for u in links]),
+        "canonical_url_raw": lambda: [normalize.canonical_url.__wrapped__(u) for u in links],
+        "canonical_urls": cold(lambda: normalize.canonical_urls(links)),
+        "canonical_url_warm": lambda: normalize.canonical_urls(links),
+        "title_similarity": lambda: [api.title_similarity(api.normalize_title(a.title), api.normalize_title(b.title))
+                                     for a, b in pairs],
+        "dedupe": lambda: api.dedupe_items(items),
+        "dedupe_linear": lambda: dedupe_linear(items),
+        "history_seen": lambda: [history.seen(x.link, x.title) for x in uniq],
+        "rank": lambda: api.rank_items(uniq, topk=10),
+        "rank_recency": lambda: api.rank_items(uniq, topk=10, score=api.recency_score(now=datetime(2025, 10, 15, tzinfo=timezone.utc))),
+        "rank_quotas": lambda: api.rank_items(uniq, topk=10, quotas=quotas),
+        "render": lambda: api.render_html(top, "src/newsletter_template.html", topk=10),
+    }
+    if api.load_ijson() is not None:
+        def stream_parse():
+            api._parse_dt_str.cache_clear()
+            return [list(api.iter_stream_records(api.load_ijson().basic_parse(b, use_float=True))) for b in payloads.values()]
+        stages["stream_parse"] = stream_parse
+    return stages
+
+def measure(fn: Callable[[], Any], repeat: int, budget: float) -> Dict[str, Any]:
+    """最多 repeat 次；累计超过 budget 秒后不再重复（至少一次）。"""
+    times: List[float] = []
+    while len(times) < repeat:
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+        if sum(times) > budget:
+            break
+    return {"min_s": min(times), "median_s": statistics.median(times), "runs": len(times)}
+
+def import_cost(module: str, runs: int = 5) -> Dict[str, Any]:
+    """在新解释器里 import module：-X importtime 报告的累计耗时（取 runs 次最小值）和被顺带加载的 LAZY_DEPS。"""
+    code = f"import sys, {module}; print(' '.join(m for m in {LAZY_DEPS!r} if m in sys.modules))"
+    best, loaded = None, []
+    for _ in range(runs):
+        p = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=Path(__file__).resolve().parent,
+                           capture_output=True, text=True)
+        for line in p.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                us = int(parts[1])
+                best = us if best is None else min(best, us)
+        loaded = p.stdout.split()
+    return {"ms": (best or 0) / 1000, "lazy_loaded": loaded}
+
+def check_imports(budget_ms: float) -> List[str]:
+    """打印各 CLI 模块的导入耗时，返回超预算或提前加载了重依赖的模块。"""
+    failed = []
+    for m in CLI_MODULES:
+        r = import_cost(m)
+        bad = r["ms"] > budget_ms or r["lazy_loaded"]
+        extra = f"  loads {', '.join(r['lazy_loaded'])} at import" if r["lazy_loaded"] else ""
+        print(f"   {'❌' if bad else '✅'} import {m:<12} {r['ms']:7.1f} ms (budget {budget_ms:g}){extra}")
+        if bad:
+            failed.append(m)
+    return failed
+
+# ---------------- baseline ----------------
+def load_baseline(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], threshold: float,
+            min_delta: float = 0.001) -> List[str]:
+    """返回回归的 key 列表（变慢超过 threshold 且绝对差大于 min_delta 秒）。"""
+    regressions = []
+    base = baseline.get("results", {})
+    for key, r in results.items():
+        b = base.get(key)
+        if not b:
+            continue
+        ratio = r["min_s"] / b["min_s"] if b["min_s"] > 0 else 1.0
+        r["baseline_min_s"] = b["min_s"]
+        r["change"] = ratio - 1
+        if ratio > 1 + threshold and r["min_s"] - b["min_s"] > min_delta:
+            regressions.append(key)
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the scripts/api.py build stages on synthetic corpora")
+    ap.add_argument("--sizes", help="comma-separated corpus sizes (default 100,1000,10000,100000; 100,300 with --verify)")
+    ap.add_argument("--stages", help="comma-separated subset of stages (default: all)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=5, help="max runs per stage and size (default 5)")
+    ap.add_argument("--budget", type=float, default=2.0, help="stop repeating after this many seconds (default 2)")
+    ap.add_argument("--full", action="store_true", help="also run slow stages above their size limit")
+    ap.add_argument("--baseline", default=str(BASELINE_FILE), help="baseline JSON file")
+    ap.add_argument("--save", action="store_true", help="store these results as the new baseline")
+    ap.add_argument("--threshold", type=float, default=0.25, help="slowdown that counts as a regression (default 0.25)")
+    ap.add_argument("--check", action="store_true", help="exit with status 1 when a regression is found")
+    ap.add_argument("--json", help="also write the results to this file")
+    ap.add_argument("--dump", help="write the corpus of each size to DIR/<size>/<category>.json and exit")
+    ap.add_argument("--imports", action="store_true", help="check CLI module import times and lazy dependencies, then exit")
+    ap.add_argument("--verify", action="store_true",
+                    help="check that dedupe_items matches the old linear scan item for item, then exit (status 1 on mismatch)")
+    ap.add_argument("--seeds", type=int, default=3, help="--verify: number of seeds from --seed (default 3)")
+    ap.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS,
+                    help=f"max cumulative import time per CLI module in ms (default {IMPORT_BUDGET_MS:g})")
+    args = ap.parse_args()
+
+    if args.imports:
+        failed = check_imports(args.import_budget)
+        if failed and args.check:
+            sys.exit(1)
+        return
+
+    sizes = [int(s) for s in (args.sizes or ("100,300" if args.verify else "100,1000,10000,100000")).split(",") if s.strip()]
+    wanted = set(args.stages.split(",")) if args.stages else None
+
+    if args.verify:
+        failed = verify_dedupe(sizes, list(range(args.seed, args.seed + args.seeds)))
+        if failed:
+            print(f"❌ dedupe differs from the linear scan: {', '.join(failed)}")
+            sys.exit(1)
+        print("✅ dedupe_items matches the linear scan")
+        return
+
+    if args.dump:
+        for n in sizes:
+            d = Path(args.dump) / str(n)
+            d.mkdir(parents=True, exist_ok=True)
+            for cat, data in make_corpus(n, args.seed).items():
+                (d / f"{cat}.json").write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            print(f"📝 {d}")
+        return
+
+    baseline = load_baseline(Path(args.baseline))
+    results: Dict[str, Dict[str, Any]] = {}
+    for n in sizes:
+        stages = build_stages(n, args.seed)
+        for name, fn in stages.items():
+            if wanted and name not in wanted:
+                continue
+            if not args.full and n > SLOW_LIMITS.get(name, n):
+                print(f"   {name:<18} n={n:<7} skipped (> {SLOW_LIMITS[name]}, use --full)")
+                continue
+            r = results[f"{name}@{n}"] = measure(fn, args.repeat, args.budget)
+            b = ((baseline or {}).get("results") or {}).get(f"{name}@{n}")
+            note = f"  ({(r['min_s'] / b['min_s'] - 1) * 100:+.0f}% vs baseline)" if b and b["min_s"] > 0 else ""
+            if name in PER_ITEM and r["min_s"] > 0:
+                note = f"  {n / r['min_s'] / 1000:,.0f}k items/s" + note
+            print(f"   {name:<18} n={n:<7} {r['min_s'] * 1000:10.2f} ms  (median {r['median_s'] * 1000:.2f}, {r['runs']} runs){note}")
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+                 "seed": args.seed, "generated_at": datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.save:
+        path = Path(args.baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        merged = {**((baseline or {}).get("results") or {}), **results}  # 只跑了部分阶段时保留其余基线
+        path.write_text(json.dumps({**report, "results": merged}, indent=2), encoding="utf-8")
+        print(f"💾 baseline saved: {path}")
+    if regressions:
+        print(f"⚠️ {len(regressions)} regression(s) > {args.threshold:.0%}: " + ", ".join(regressions))
+        if args.check:
+            sys.exit(1)
+    elif baseline:
+        print("✅ no regressions against baseline")
+
+if __name__ == "__main__":
+    main()
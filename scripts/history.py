@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cross-issue history of stories already sent (used by scripts/api.py to skip repeats).
+
+- SQLite（默认 .cache/history.sqlite）：每条故事存两个 64 位指纹——规范化 URL、规范化标题
+- 第一次打开时解析 archive/*.html 建索引；之后只解析新增或修改过的归档文件（按 mtime）
+- 每次生成后 record() 写入本期的条目；同一期重新生成时先删掉旧记录
+- 查询在内存集合里做，O(1)；指纹的计算方式（keys）由调用方传入，与去重保持一致；
+  规则变了（version 不同）时整个索引按新规则重建
+"""
+
+import hashlib
+import sqlite3
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+KeyFunc = Callable[[str, str], Iterable[str]]  # (link, title) -> 指纹原文，如 "u:https://…", "t:…"
+
+def fingerprint(key: str) -> int:
+    """8 字节 blake2b → 有符号 64 位整数（SQLite INTEGER）。"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def is_story_link(attrs: Dict[str, Optional[str]]) -> bool:
+    """标题链接：class="title"（内置模板）或加粗 16px 的链接（主模板）。"""
+    style = (attrs.get("style") or "").replace(" ", "")
+    return "title" in (attrs.get("class") or "").split() or ("font-weight:700" in style and "font-size:16px" in style)
+
+
+class _StoryParser(HTMLParser):
+    """从渲染好的期刊里取出 (link, title)。"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stories: List[Tuple[str, str]] = []
+        self._href: Optional[str] = None
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        a = dict(attrs)
+        if is_story_link(a):
+            self._href, self._text = a.get("href") or "", []
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._href is not None:
+            self.stories.append((self._href, "".join(self._text).strip()))
+            self._href = None
+
+def parse_issue(html: str) -> List[Tuple[str, str]]:
+    p = _StoryParser()
+    p.feed(html)
+    p.close()
+    return p.stories
+
+
+class HistoryIndex:
+    def __init__(self, path: Path, keys: KeyFunc, issue: Optional[str] = None, version: str = ""):
+        """
+        issue：本次要生成的期（文件名）；它自己以前的记录不算“已发送”，便于同一天重新生成。
+        version：keys 的规则标识；与索引里记录的不同时清空指纹，下次 sync 按新规则重新解析全部归档。
+        """
+        self.path = Path(path)
+        self.keys = keys
+        self.issue = issue
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS issues (name TEXT PRIMARY KEY, mtime REAL, indexed_at REAL);
+            CREATE TABLE IF NOT EXISTS sent (fp INTEGER NOT NULL, issue TEXT NOT NULL, PRIMARY KEY (fp, issue)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_sent_issue ON sent(issue);
+            CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+        """)
+        row = self.db.execute("SELECT v FROM meta WHERE k = 'keys_version'").fetchone()
+        if (row[0] if row else "") != version:
+            with self.db:
+                self.db.execute("DELETE FROM sent")
+                self.db.execute("DELETE FROM issues")
+                self.db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('keys_version', ?)", (version,))
+        self._sent: Set[int] = set()
+
+    def _load(self):
+        # 只装入其他期的指纹：本期重新生成时不会把自己当成“已发送”
+        self._sent = {fp for (fp,) in self.db.execute("SELECT fp FROM sent WHERE issue != ?", (self.issue or "",))}
+
+    def _fps(self, link: str, title: str) -> List[int]:
+        return [fingerprint(k) for k in self.keys(link, title)]
+
+    def _replace(self, name: str, stories: Iterable[Tuple[str, str]], mtime: Optional[float]):
+        with self.db:
+            self.db.execute("DELETE FROM sent WHERE issue = ?", (name,))
+            self.db.executemany("INSERT OR IGNORE INTO sent (fp, issue) VALUES (?, ?)",
+                                [(fp, name) for link, title in stories for fp in self._fps(link, title)])
+            self.db.execute("INSERT OR REPLACE INTO issues (name, mtime, indexed_at) VALUES (?, ?, ?)",
+                            (name, mtime, time.time()))
+
+    def sync(self, archive_dir: Path, pattern: str = "newsletter-*.html") -> int:
+        """把新增或修改过的归档文件加入索引；返回解析的文件数。"""
+        known = dict(self.db.execute("SELECT name, mtime FROM issues"))
+        n = 0
+        for f in sorted(Path(archive_dir).glob(pattern)):
+            mtime = f.stat().st_mtime
+            if known.get(f.name) == mtime:
+                continue
+            self._replace(f.name, parse_issue(f.read_text(encoding="utf-8", errors="replace")), mtime)
+            n += 1
+        self._load()
+        return n
+
+    def seen(self, link: str, title: str) -> bool:
+        """这条故事是否在其他期里发过（URL 或标题指纹任一命中）。"""
+        return any(fp in self._sent for fp in self._fps(link, title))
+
+    def record(self, name: str, stories: Iterable[Tuple[str, str]], mtime: Optional[float] = None):
+        """记录刚生成的一期（mtime 为归档文件的 mtime，之后 sync 不会再解析它）。"""
+        self._replace(name, list(stories), mtime)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._sent)
+
+    def close(self):
+        self.db.close()
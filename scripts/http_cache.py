@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+On-disk response cache for the TechSum endpoints (used by scripts/api.py).
+
+- 每个条目：<key>.gz（gzip 压缩的响应体）+ <key>.json（ETag / Last-Modified / 时间戳）
+- key = sha256(url + token 指纹)，token 本身不落盘
+- ttl 内直接命中；过期后由调用方带 If-None-Match / If-Modified-Since 重新验证
+- 超过 max_age 的条目删除；总大小超过 max_bytes 时按最近使用时间淘汰
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import IO, Dict, Iterable, Optional
+
+
+class CacheMiss(Exception):
+    """--offline 时缓存里没有对应响应。"""
+
+
+class ResponseCache:
+    def __init__(self, root: Path, ttl: float = 900, max_age: float = 7 * 86400,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    # ---- keys / paths ----
+    @staticmethod
+    def key(url: str, token: Optional[str]) -> str:
+        scope = hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:16]
+        return hashlib.sha256(f"{url}\n{scope}".encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> Path:
+        return self.root / f"{key}.gz"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    # ---- read ----
+    def meta(self, key: str) -> Optional[Dict]:
+        """返回元数据；条目不完整或超过 max_age 时视为不存在。"""
+        try:
+            meta = json.loads(self._meta_path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not self._body_path(key).is_file():
+            return None
+        if time.time() - meta.get("fetched_at", 0) > self.max_age:
+            self.delete(key)
+            return None
+        return meta
+
+    def is_fresh(self, meta: Dict) -> bool:
+        return time.time() - meta.get("fetched_at", 0) < self.ttl
+
+    def open(self, key: str) -> IO[bytes]:
+        """以流的方式读取解压后的响应体。"""
+        self._mark_used(key)
+        return gzip.open(self._body_path(key), "rb")
+
+    def read(self, key: str) -> bytes:
+        with self.open(key) as f:
+            return f.read()
+
+    # ---- write ----
+    def put(self, key: str, chunks: Iterable[bytes], url: str,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """边下载边压缩写入临时文件，完成后原子替换。"""
+        body = self._body_path(key)
+        tmp = body.with_name(f"{body.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with gzip.open(tmp, "wb", compresslevel=6) as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+            os.replace(tmp, body)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        now = time.time()
+        self._write_meta(key, {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": now,
+            "used_at": now,
+            "size": body.stat().st_size,
+        })
+        self.evict(keep=key)
+
+    def touch(self, key: str) -> None:
+        """304 Not Modified：响应体不变，只刷新时间戳。"""
+        meta = self.meta(key)
+        if meta is not None:
+            meta["fetched_at"] = meta["used_at"] = time.time()
+            self._write_meta(key, meta)
+
+    def delete(self, key: str) -> None:
+        for p in (self._body_path(key), self._meta_path(key)):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """删除过期条目；总大小超过 max_bytes 时按最近使用时间淘汰（keep 除外）。"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for mp in self.root.glob("*.json"):
+                try:
+                    meta = json.loads(mp.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    continue
+                key = mp.stem
+                if now - meta.get("fetched_at", 0) > self.max_age:
+                    self.delete(key)
+                    continue
+                entries.append((meta.get("used_at", 0), meta.get("size", 0), key))
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                self.delete(key)
+                total -= size
+
+    # ---- internals ----
+    def _write_meta(self, key: str, meta: Dict) -> None:
+        mp = self._meta_path(key)
+        tmp = mp.with_name(f"{mp.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, mp)
+
+    def _mark_used(self, key: str) -> None:
+        meta = self.meta(key)
+        if meta is not None:
+            meta["used_at"] = time.time()
+            self._write_meta(key, meta)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Image prefetch / validation / thumbnail cache for the newsletter build (used by scripts/api.py).
+
+- 入选候选条目的配图用有界线程池并发下载；4xx、不是图片、超过大小上限或解码失败的记为失效，
+  由调用方在排序前清掉（条目保留，按无图参与排序）
+- 装了 Pillow 时裁剪缩放为模板的 16:9 缩略图（默认 640×360，即 320×180 的 2 倍），重新编码为 JPEG，
+  按内容哈希命名写入 thumbs/；已有同名缩略图的不再解码。没有 Pillow 时只按文件头校验格式
+- index.json 记录每个 URL 的结果与 ETag / Last-Modified：ttl 内不再请求，过期后条件请求，304 沿用原结果；
+  超时 / 连接错误 / 5xx / 408 / 429 是暂时失败：不写入索引、不清掉配图（有旧结果就沿用），下次重试
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from PIL import Image, ImageOps  # 可选：生成缩略图
+except ImportError:
+    Image = None
+
+THUMB_SIZE = (640, 360)
+MAX_BYTES = 8 * 1024 * 1024
+OK_TTL = 7 * 86400.0
+DEAD_TTL = 86400.0
+MAX_AGE = 30 * 86400.0
+TIMEOUT = (5, 15)
+
+# 没有 Pillow 时认可的格式（邮件客户端普遍支持的）
+_MAGIC = ((b"\xff\xd8\xff", "jpeg"), (b"\x89PNG\r\n\x1a\n", "png"), (b"GIF87a", "gif"), (b"GIF89a", "gif"))
+
+def sniff(head: bytes) -> Optional[str]:
+    for magic, fmt in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def make_session(workers: int) -> requests.Session:
+    retry = Retry(total=1, backoff_factor=0.3, status_forcelist=(429, 502, 503, 504),
+                  allowed_methods=frozenset(["GET"]), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=max(4, workers), pool_maxsize=max(4, workers), max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"Accept": "image/avif,image/webp,image/*;q=0.8", "User-Agent": "TechSum-Newsletter/1.0"})
+    return s
+
+
+class _Transient(Exception):
+    """超时 / 连接错误 / 5xx / 408 / 429：无法确认图片失效，不记入索引。"""
+
+
+class ImageCache:
+    def __init__(self, root: Path, size: Tuple[int, int] = THUMB_SIZE, quality: int = 82,
+                 ttl: float = OK_TTL, dead_ttl: float = DEAD_TTL, max_bytes: int = MAX_BYTES):
+        self.root = Path(root)
+        self.thumbs = self.root / "thumbs"
+        self.size = size
+        self.quality = quality
+        self.ttl = ttl
+        self.dead_ttl = dead_ttl
+        self.max_bytes = max_bytes
+        self.stats = {"cached": 0, "fetched": 0, "not_modified": 0, "encoded": 0, "dead": 0, "transient": 0}
+        self._lock = threading.Lock()
+        self.thumbs.mkdir(parents=True, exist_ok=True)
+        try:
+            self.index: Dict[str, Dict] = json.loads((self.root / "index.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.index = {}
+
+    # ---- lookup ----
+    def _reusable(self, e: Dict) -> bool:
+        """成功的条目且缩略图还在（之前没有 Pillow、现在有了的，要重新下载补缩略图）。"""
+        if e.get("thumb"):
+            return (self.thumbs / e["thumb"]).is_file()
+        return Image is None
+
+    def _fresh(self, e: Dict) -> bool:
+        if e["ok"] and not self._reusable(e):
+            return False
+        return time.time() - e.get("checked_at", 0) < (self.ttl if e["ok"] else self.dead_ttl)
+
+    def thumb_path(self, entry: Dict) -> Optional[Path]:
+        return self.thumbs / entry["thumb"] if entry.get("thumb") else None
+
+    # ---- fetch one ----
+    def _download(self, url: str, session: requests.Session, old: Optional[Dict]) -> Tuple[int, bytes, Dict]:
+        headers = {}
+        if old and old["ok"] and self._reusable(old):
+            if old.get("etag"):
+                headers["If-None-Match"] = old["etag"]
+            if old.get("last_modified"):
+                headers["If-Modified-Since"] = old["last_modified"]
+        try:
+            with session.get(url, headers=headers, timeout=TIMEOUT, stream=True) as r:
+                if r.status_code == 304 and headers:
+                    return 304, b"", r.headers
+                if r.status_code >= 500 or r.status_code in (408, 429):
+                    raise _Transient(f"HTTP {r.status_code}")
+                if r.status_code != 200:
+                    raise ValueError(f"HTTP {r.status_code}")
+                ctype = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if ctype and not ctype.startswith("image/") and ctype != "application/octet-stream":
+                    raise ValueError(f"not an image ({ctype})")
+                if int(r.headers.get("Content-Length") or 0) > self.max_bytes:
+                    raise ValueError("too large")
+                buf = bytearray()
+                for chunk in r.iter_content(64 * 1024):
+                    buf += chunk
+                    if len(buf) > self.max_bytes:
+                        raise ValueError("too large")
+                return 200, bytes(buf), r.headers
+        except requests.RequestException as e:
+            raise _Transient(type(e).__name__) from e
+
+    def _encode(self, data: bytes) -> str:
+        """缩略图按（原图内容 + 尺寸 + 质量）哈希命名；已存在就不再解码。"""
+        w, h = self.size
+        name = hashlib.sha256(data + f"|{w}x{h}q{self.quality}".encode()).hexdigest()[:24] + ".jpg"
+        dest = self.thumbs / name
+        if dest.is_file():
+            return name
+        with Image.open(io.BytesIO(data)) as im:
+            im.draft("RGB", (w, h))  # JPEG 解码时直接按比例缩小，省掉大部分解码
+            im = ImageOps.exif_transpose(im)
+            if im.mode in ("RGBA", "LA", "P"):
+                im = im.convert("RGBA")
+                bg = Image.new("RGB", im.size, (255, 255, 255))
+                bg.paste(im, mask=im.split()[-1])
+                im = bg
+            thumb = ImageOps.fit(im.convert("RGB"), (w, h), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            thumb.save(buf, "JPEG", quality=self.quality, optimize=True, progressive=True)
+        tmp = dest.with_name(f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(buf.getvalue())
+        os.replace(tmp, dest)
+        self._count("encoded")
+        return name
+
+    def check(self, url: str, session: requests.Session) -> Dict:
+        """检查一张图（必要时下载 + 生成缩略图），返回索引条目。"""
+        with self._lock:
+            old = self.index.get(url)
+        if old is not None and self._fresh(old):
+            self._count("cached")
+            return old
+        now = time.time()
+        try:
+            status, data, headers = self._download(url, session, old)
+            if status == 304:
+                self._count("not_modified")
+                entry = {**old, "checked_at": now}
+            else:
+                self._count("fetched")
+                if Image is not None:
+                    try:
+                        thumb = self._encode(data)
+                    except Exception as e:  # 截断 / 不支持的格式 / 解压炸弹
+                        raise ValueError(f"undecodable ({type(e).__name__})") from e
+                elif sniff(data[:16]) is None:
+                    raise ValueError("unsupported image format")
+                else:
+                    thumb = None
+                entry = {"ok": True, "thumb": thumb, "bytes": len(data), "checked_at": now,
+                         "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        except _Transient as e:
+            self._count("transient")
+            if old is not None and old["ok"]:
+                return old  # 过期但上次是好的：先沿用
+            return {"ok": False, "transient": True, "error": str(e), "checked_at": now}
+        except ValueError as e:
+            self._count("dead")
+            entry = {"ok": False, "error": str(e), "checked_at": now}
+        with self._lock:
+            self.index[url] = entry
+        return entry
+
+    @staticmethod
+    def is_dead(entry: Dict) -> bool:
+        """确认失效（4xx / 不是图片 / 无法解码）；暂时失败的不算。"""
+        return not entry["ok"] and not entry.get("transient")
+
+    def prefetch(self, urls: Iterable[str], workers: int = 8) -> Dict[str, Dict]:
+        """并发检查一批 URL（去重），返回 {url: 条目}，并保存索引。"""
+        todo = list(dict.fromkeys(u for u in urls if u))
+        if not todo:
+            return {}
+        session = make_session(workers)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo))), thread_name_prefix="img") as ex:
+                out = dict(zip(todo, ex.map(lambda u: self.check(u, session), todo)))
+        finally:
+            session.close()
+        self.save()
+        return out
+
+    def publish(self, entry: Dict, dest_dir: Path) -> Optional[str]:
+        """把缩略图放进对外发布的目录（能硬链接就硬链接），返回文件名。"""
+        src = self.thumb_path(entry)
+        if src is None or not src.is_file():
+            return None
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        dest = dest_dir / src.name
+        if not dest.exists():
+            try:
+                os.link(src, dest)
+            except OSError:
+                shutil.copyfile(src, dest)
+        return src.name
+
+    # ---- persistence ----
+    def save(self, max_age: float = MAX_AGE) -> None:
+        """写回索引；顺带删掉 max_age 内没检查过的条目和不再被引用的缩略图。"""
+        now = time.time()
+        with self._lock:
+            self.index = {u: e for u, e in self.index.items() if now - e.get("checked_at", 0) < max_age}
+            live = {e.get("thumb") for e in self.index.values()}
+            data = json.dumps(self.index)
+        for p in self.thumbs.glob("*.jpg"):
+            if p.name not in live and now - p.stat().st_mtime > max_age:
+                p.unlink()
+        ip = self.root / "index.json"
+        tmp = ip.with_name(f"index.json.{os.getpid()}.tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, ip)
+
+    def _count(self, k: str):
+        with self._lock:
+            self.stats[k] += 1
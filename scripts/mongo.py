@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared MongoDB access for the Python scripts (the Python side of lib/mongo.js).
+
+- 每个进程只建一个 MongoClient（自带连接池），第一次用到时才创建
+- warm_up() 在后台线程里 ping，让 TLS / 选主的耗时与其它启动工作重叠
+- 连接池大小：MONGODB_MAX_POOL（默认 10）
+- TECHSUM_TIMING=1 时 report() 把启动耗时打印到 stderr
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+_client = None
+_lock = threading.Lock()
+_warm: Optional[threading.Thread] = None
+_t0 = time.perf_counter()
+
+TIMINGS: Dict[str, float] = {}
+
+def uri() -> Optional[str]:
+    return os.getenv("MONGODB_URI") or None
+
+def get_client():
+    """进程内共享的 MongoClient；未配置 MONGODB_URI 时返回 None。"""
+    global _client
+    if _client is not None or not uri():
+        return _client
+    with _lock:
+        if _client is None:
+            t = time.perf_counter()
+            from pymongo import MongoClient
+            from pymongo.server_api import ServerApi
+            _client = MongoClient(
+                uri(),
+                server_api=ServerApi('1'),
+                serverSelectionTimeoutMS=8000,
+                maxPoolSize=int(os.getenv("MONGODB_MAX_POOL", "10")),
+            )
+            TIMINGS["client_init_ms"] = (time.perf_counter() - t) * 1000
+    return _client
+
+def get_collection(name: Optional[str] = None):
+    """返回集合（默认 MONGODB_COLL / subscribers）；未配置 MONGODB_URI 时返回 None。"""
+    client = get_client()
+    if client is None:
+        return None
+    db = client[os.getenv("MONGODB_DB", "techsum")]
+    return db[name or os.getenv("MONGODB_COLL", "subscribers")]
+
+def _ping():
+    t = time.perf_counter()
+    try:
+        get_client().admin.command("ping")
+        TIMINGS["ping_ms"] = (time.perf_counter() - t) * 1000
+    except Exception as e:  # 真正的查询会再报错，这里只记录
+        TIMINGS["ping_failed_ms"] = (time.perf_counter() - t) * 1000
+        print(f"[mongo] warm-up ping failed: {e}", file=sys.stderr)
+
+def warm_up():
+    """后台预热连接（非阻塞）；未配置 MONGODB_URI 时什么也不做。"""
+    global _warm
+    if _warm is None and uri():
+        _warm = threading.Thread(target=_ping, name="mongo-warmup", daemon=True)
+        _warm.start()
+
+def report(label: str):
+    if os.getenv("TECHSUM_TIMING") != "1":
+        return
+    parts = [f"{k}={v:.1f}" for k, v in TIMINGS.items()]
+    total = (time.perf_counter() - _t0) * 1000
+    print(f"⏱ [{label}] total={total:.1f}ms " + " ".join(parts), file=sys.stderr)
+
+# ---------------- query helpers ----------------
+def subscriber_filter(status: Optional[str] = None, tags: Optional[List[str]] = None) -> dict:
+    q: dict = {}
+    if status: q["status"] = status
+    if tags:   q["tags"]   = {"$in": list(tags)}
+    return q
+
+def find_subscribers(status: Optional[str] = None, tags: Optional[List[str]] = None,
+                     limit: Optional[int] = None, fields: Iterable[str] = ("email", "status", "tags"),
+                     sort: bool = True, coll=None, after: Optional[str] = None):
+    """按 status / tags 过滤订阅者，返回游标（默认按 email_lc 排序）；after：从该 email_lc 之后开始（翻页）。"""
+    from pymongo import ASCENDING
+    c = coll if coll is not None else get_collection()
+    projection = {"_id": 0, "email_lc": 1, **{f: 1 for f in fields}}
+    q = subscriber_filter(status, tags)
+    if after: q["email_lc"] = {"$gt": after.strip().lower()}
+    cur = c.find(q, projection)
+    if sort:  cur = cur.sort("email_lc", ASCENDING)
+    if limit: cur = cur.limit(int(limit))
+    return cur
+
+def stream_emails(status: Optional[str] = None, tags: Optional[List[str]] = None,
+                  limit: Optional[int] = None, batch_size: int = 1000, coll=None,
+                  with_tags: bool = False) -> Iterator:
+    """
+    边读游标边产出订阅者的 email_lc（去空白、小写），不在内存里攒整张列表。
+    - 只按 status 过滤、只投影 email_lc 时（默认的发送路径），idx_status_email 可以覆盖查询，不读文档本身；
+      按 tags 过滤或 with_tags=True 时要读文档（tags 是数组，放进索引就成了 multikey，覆盖不了）
+    - 去重由 email_lc 唯一索引保证，管道里不需要 $group（$group 会阻塞到游标读完）
+    - 没有 email_lc 的旧文档放在最后单独读（用 email 字段，读文档、不走覆盖索引）；同一地址已有
+      email_lc 文档的以那条为准。有这类文档时在 stderr 提示数量，subscribers.py ensure-index 会补上 email_lc
+    - with_tags=True 时产出 (email, tags)，供个性化排序使用
+    """
+    c = coll if coll is not None else get_collection()
+    if c is None:
+        return
+    q = subscriber_filter(status, tags)
+    pipeline: list = [{"$match": {**q, "email_lc": {"$type": "string"}}}]
+    if limit: pipeline.append({"$limit": int(limit)})
+    project = {"_id": 0, "e": {"$toLower": {"$trim": {"input": "$email_lc"}}}}
+    if with_tags: project["tags"] = 1
+    pipeline += [{"$project": project}, {"$match": {"e": {"$ne": ""}}}]
+    n = 0
+    with c.aggregate(pipeline, batchSize=max(1, int(batch_size))) as cur:
+        for doc in cur:
+            n += 1
+            yield (doc["e"], doc.get("tags") or []) if with_tags else doc["e"]
+    if limit and n >= int(limit):
+        return
+    # {"email_lc": None} 同时匹配字段缺失和 null
+    legacy = c.find({**q, "email_lc": None}, {"_id": 0, "email": 1, "tags": 1}, batch_size=max(1, int(batch_size)))
+    if limit: legacy = legacy.limit(int(limit) - n)
+    used = shadowed = 0
+    for doc in legacy:
+        e = doc.get("email")
+        e = e.strip().lower() if isinstance(e, str) else ""
+        if not e or c.count_documents({"email_lc": e}, limit=1):
+            shadowed += 1
+            continue
+        used += 1
+        yield (e, doc.get("tags") or []) if with_tags else e
+    if used or shadowed:
+        print(f"[mongo] {used + shadowed} subscriber(s) without email_lc ({used} sent via the email field, "
+              f"{shadowed} skipped as duplicates/empty); run `python scripts/subscribers.py ensure-index` to backfill",
+              file=sys.stderr)
+
+# ---------------- subscriber stats ----------------
+# 汇总文档（MONGODB_STATS_COLL / subscriber_stats，_id="subscribers"）：
+#   {total, status: {active: n}, tags: {preview: n}, status_tags: {active: {preview: n}}, refreshed_at, updated_at}
+# refresh_stats() 用一次 $facet 聚合重算；单条增删改用 apply_stats_delta() 按前后状态 $inc（不 upsert：
+# 文档还不存在时改为整体重算，否则会留下只含增量的残缺文档）。看板 / 发送前估算人数只读这一个文档，
+# 没有它（或它不是由重算生成的，缺 refreshed_at）时先重算。统计口径与 server.js 一致：email_lc 为 null 的旧数据不算。
+STATS_ID = "subscribers"
+
+def stats_collection():
+    return get_collection(os.getenv("MONGODB_STATS_COLL", "subscriber_stats"))
+
+def stats_key(s: Optional[str]) -> str:
+    """字段名里不能有 "." 或以 "$" 开头：换成全角字符（lib/mongo.js 的 statsKey 相同）。"""
+    s = "unknown" if s is None else str(s)
+    return s.replace(".", "．").replace("$", "＄")
+
+def _stats_shape(doc: Optional[dict]):
+    """订阅者文档 → (status, 去重后的 tags)；不计入统计时为 None。"""
+    if not doc or doc.get("email_lc") is None:
+        return None
+    tags = doc.get("tags")
+    return stats_key(doc.get("status")), sorted({stats_key(t) for t in tags}) if isinstance(tags, list) else []
+
+def compute_stats(coll=None) -> dict:
+    """一次 $facet 聚合：按 status、按 (status, tag) 计数；总数和按 tag 的计数由它们相加。"""
+    c = coll if coll is not None else get_collection()
+    pipeline = [
+        {"$match": {"email_lc": {"$ne": None}}},
+        {"$project": {"_id": 0, "s": {"$ifNull": ["$status", "unknown"]},
+                      "t": {"$cond": [{"$isArray": "$tags"}, {"$setUnion": ["$tags", []]}, []]}}},
+        {"$facet": {
+            "status": [{"$group": {"_id": "$s", "n": {"$sum": 1}}}],
+            "status_tags": [{"$unwind": "$t"}, {"$group": {"_id": {"s": "$s", "t": "$t"}, "n": {"$sum": 1}}}],
+        }},
+    ]
+    res = next(iter(c.aggregate(pipeline)), {"status": [], "status_tags": []})
+    out: dict = {"total": 0, "status": {}, "tags": {}, "status_tags": {}}
+    for r in res["status"]:
+        out["status"][stats_key(r["_id"])] = r["n"]
+        out["total"] += r["n"]
+    for r in res["status_tags"]:
+        s, t = stats_key(r["_id"]["s"]), stats_key(r["_id"]["t"])
+        out["status_tags"].setdefault(s, {})[t] = r["n"]
+        out["tags"][t] = out["tags"].get(t, 0) + r["n"]
+    return out
+
+def refresh_stats(coll=None, stats_coll=None) -> dict:
+    """重算并整体替换汇总文档（导入之后、或怀疑有漂移时调用）。"""
+    from datetime import datetime, timezone
+    doc = compute_stats(coll)
+    now = datetime.now(timezone.utc)
+    sc = stats_coll if stats_coll is not None else stats_collection()
+    doc = {**doc, "refreshed_at": now, "updated_at": now}
+    sc.replace_one({"_id": STATS_ID}, doc, upsert=True)
+    return doc
+
+def stats_delta(before: Optional[dict], after: Optional[dict]) -> Dict[str, int]:
+    """一条订阅者从 before 变成 after（插入 / 删除时为 None）对应的 $inc。"""
+    inc: Dict[str, int] = {}
+    for shape, sign in ((_stats_shape(before), -1), (_stats_shape(after), 1)):
+        if shape is None:
+            continue
+        s, tags = shape
+        for k in ["total", f"status.{s}"] + [f"tags.{t}" for t in tags] + [f"status_tags.{s}.{t}" for t in tags]:
+            inc[k] = inc.get(k, 0) + sign
+    return {k: v for k, v in inc.items() if v}
+
+def apply_stats_delta(before: Optional[dict], after: Optional[dict], stats_coll=None) -> None:
+    inc = stats_delta(before, after)
+    if not inc:
+        return
+    from datetime import datetime, timezone
+    sc = stats_coll if stats_coll is not None else stats_collection()
+    res = sc.update_one({"_id": STATS_ID}, {"$inc": inc, "$set": {"updated_at": datetime.now(timezone.utc)}})
+    if res.matched_count == 0:
+        refresh_stats(stats_coll=sc)  # 这条变更已写入订阅者集合，重算会包含它
+
+def read_stats(stats_coll=None) -> Optional[dict]:
+    sc = stats_coll if stats_coll is not None else stats_collection()
+    if sc is None:
+        return None
+    doc = sc.find_one({"_id": STATS_ID})
+    if doc is None or "refreshed_at" not in doc:
+        # 没有汇总，或是旧版本 upsert 增量留下的残缺文档
+        doc = refresh_stats(stats_coll=sc)
+    return doc
+
+def audience_size(summary: Optional[dict], status: Optional[str] = None,
+                  tags: Optional[List[str]] = None) -> Optional[int]:
+    """
+    subscriber_filter(status, tags) 会匹配的人数（从汇总文档 O(1) 读出）。
+    多个 tag 时各 tag 的人会重叠，汇总里算不出并集，返回 None。
+    """
+    if summary is None or (tags and len(tags) > 1):
+        return None
+    if tags:
+        t = stats_key(tags[0])
+        return summary.get("status_tags", {}).get(stats_key(status), {}).get(t, 0) if status \
+            else summary.get("tags", {}).get(t, 0)
+    return summary.get("status", {}).get(stats_key(status), 0) if status else summary.get("total", 0)
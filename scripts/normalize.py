@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Link / title normalization shared by dedupe (scripts/api.py) and the history index (scripts/history.py).
+
+- canonical_url：https、小写主机名、去掉默认端口 / 结尾斜杠 / ;参数 / #锚点；查询串只去掉跟踪参数
+  （utm_*、fbclid 等），其余参数排序后保留——不同 ?id= 的文章不再被当成同一条
+- normalize_title：小写，标点与空白折叠为单个空格（一次正则替换）
+- 两者都按原始字符串 LRU 缓存：同一链接 / 标题在三个分类、去重、历史查询里反复出现，只算一次
+- 跟踪参数可配置：TECHSUM_TRACKING_PARAMS="utm_*,fbclid,..." 或 configure()；
+  keys_version() 随规则变化，history 据此判断旧指纹是否需要重建
+"""
+
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+# 末尾 * 表示前缀匹配；大小写不敏感
+DEFAULT_TRACKING_PARAMS = (
+    "utm_*", "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "mkt_tok", "ref", "ref_src", "cmpid", "ncid",
+    "sr_share", "guccounter", "guce_referrer", "guce_referrer_sig",
+)
+CACHE_SIZE = 1 << 17  # 一次构建里不同的链接 / 标题数远小于此
+
+# 规范化规则的版本：改动 canonical_url / normalize_title 的口径时加一
+_RULES_VERSION = 2
+
+_NON_WORD = re.compile(r"\W+", flags=re.U)
+# RFC 3986 附录 B 的拆分正则：scheme / 主机 / 路径 / 查询串（#锚点丢弃）；比 urlsplit 的逐项校验快得多
+_URL_PARTS = re.compile(r"(?:([A-Za-z][A-Za-z0-9+.-]*):)?(?://([^/?#]*))?([^?#]*)(?:\?([^#]*))?")
+_PATH_PARAMS = re.compile(r";[^/]*$")
+_DEFAULT_PORTS = re.compile(r":(?:80|443)$")
+
+def _compile_tracking(params: Iterable[str]) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    """→ (精确匹配的参数名集合, 前缀元组)：每个参数一次集合查找 + 一次 startswith。"""
+    names = {p.strip().lower() for p in params if p.strip()}
+    return (frozenset(p for p in names if not p.endswith("*")),
+            tuple(sorted(p[:-1] for p in names if p.endswith("*"))))
+
+def _params_from_env() -> Sequence[str]:
+    raw = os.getenv("TECHSUM_TRACKING_PARAMS")
+    return DEFAULT_TRACKING_PARAMS if raw is None else tuple(p for p in raw.split(",") if p.strip())
+
+_tracking = _compile_tracking(_params_from_env())
+
+def configure(tracking_params: Optional[Iterable[str]] = None):
+    """替换跟踪参数列表（None 恢复默认 / 环境变量），并清空缓存。"""
+    global _tracking
+    _tracking = _compile_tracking(_params_from_env() if tracking_params is None else tracking_params)
+    canonical_url.cache_clear()
+
+def keys_version() -> str:
+    """当前规则的标识：规则版本 + 跟踪参数列表的哈希。"""
+    exact, prefixes = _tracking
+    rules = json.dumps([sorted(exact), prefixes])
+    return f"{_RULES_VERSION}:{hashlib.sha1(rules.encode('utf-8')).hexdigest()[:12]}"
+
+def _strip_query(query: str) -> str:
+    exact, prefixes = _tracking
+    kept = []
+    for part in query.split("&"):
+        if not part:
+            continue
+        name = part.split("=", 1)[0].lower()
+        if name not in exact and not name.startswith(prefixes):
+            kept.append(part)
+    kept.sort()
+    return "&".join(kept)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_url(url: str) -> str:
+    """没有链接（空 / "#"）返回 ""，不参与按 URL 去重。"""
+    if not url or url == "#":
+        return ""
+    try:
+        scheme, netloc, path, query = _URL_PARTS.match(url.strip()).groups()
+        if ";" in path:
+            path = _PATH_PARAMS.sub("", path)
+        path = path.rstrip("/")
+        scheme = (scheme or "").lower()
+        if scheme in ("http", "https", ""):
+            scheme = "https"
+        netloc = (netloc or "").lower()
+        if ":" in netloc:
+            netloc = _DEFAULT_PORTS.sub("", netloc)
+        query = _strip_query(query) if query else ""
+        return f"{scheme}://{netloc}{path}" + (f"?{query}" if query else "")
+    except Exception:
+        return url
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalize_title(title: str) -> str:
+    return _NON_WORD.sub(" ", title.lower()).strip()
+
+def normalize_title(title: str) -> str:
+    return _normalize_title(title) if title else ""
+
+# ---- 批量：直接 map 到带缓存的函数，省掉逐条的 Python 调用开销 ----
+def canonical_urls(urls: Iterable[str]) -> List[str]:
+    return list(map(canonical_url, urls))
+
+def normalize_titles(titles: Iterable[str]) -> List[str]:
+    return [_normalize_title(t) if t else "" for t in titles]
+
+def cache_clear():
+    canonical_url.cache_clear()
+    _normalize_title.cache_clear()
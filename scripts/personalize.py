@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Per-recipient personalization of a rendered newsletter (used by send_email.py --personalize).
+
+- api.py 渲染一次模板；模板里的 <!--ts:...--> 注释标出卡片行、卡片和退订链接
+- Skeleton.parse() 把 HTML 切成静态片段，每个片段只做一次 quoted-printable 编码
+- 每个收件人：按订阅 tags 把对应分类的卡片排到前面，退订链接带上 HMAC 签名的 token，
+  再用 QP 软换行（"=\\n"）把编码好的片段拼起来——解码后正好是拼接后的 HTML，
+  所以每封信只是一次字符串 join，不需要重新渲染模板或重新序列化 MIME
+- 签名：base64url(HMAC-SHA256(UNSUB_SECRET, email_lc))[:22]，与 api/unsubscribe.js 的校验一致
+
+Benchmark:
+  python scripts/personalize.py --file output/newsletter-2025-10-13.html -n 10000
+"""
+
+import base64
+import hashlib
+import hmac
+import html
+import re
+from email import charset as _charset, quoprimime
+from email.mime.text import MIMEText
+from typing import Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+_MARK = re.compile(r"<!--ts:([/\w]+)(?: ([^>]*?))?-->")
+_HREF = re.compile(r'href="([^"]*)"')
+_SOFT = "=\n"  # QP 软换行：解码时删除，用来无缝拼接分别编码的片段
+
+def unsub_token(email: str, secret: str) -> str:
+    mac = hmac.new(secret.encode("utf-8"), email.strip().lower().encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac).decode("ascii").rstrip("=")[:22]
+
+def unsub_link(base: str, email: str, secret: str) -> str:
+    sep = "&" if "?" in base else "?"
+    return base + sep + urlencode({"email": email, "token": unsub_token(email, secret)})
+
+def qp(text: str) -> str:
+    """按 utf-8 做 quoted-printable 编码（与 email.charset 的 QP body 编码一致）。"""
+    return quoprimime.body_encode(text.encode("utf-8").decode("latin-1"))
+
+def mime_headers(msg: MIMEText) -> str:
+    """msg 的头部（含 Content-Transfer-Encoding: quoted-printable），以空行结束。"""
+    return msg.as_string().split("\n\n", 1)[0] + "\n\n"
+
+def qp_message(subject_headers: Iterable[Tuple[str, str]]) -> MIMEText:
+    """只有头部的 text/html 消息，正文编码为 quoted-printable。"""
+    cs = _charset.Charset("utf-8")
+    cs.body_encoding = _charset.QP
+    msg = MIMEText("", "html", cs)
+    for k, v in subject_headers:
+        msg[k] = v
+    return msg
+
+
+class Skeleton:
+    """按 <!--ts:...--> 标记切开的 HTML；各片段预先 QP 编码。"""
+
+    def __init__(self, prefix: str, row_head: str, row_tail: str, width: int,
+                 cells: List[Tuple[str, str]], filler: Optional[str],
+                 before_url: str, unsub_url: Optional[str], after_url: str):
+        self.width = max(1, width)
+        self.cells = cells
+        self.unsub_url = unsub_url
+        self._prefix, self._head, self._tail = qp(prefix), qp(row_head), qp(row_tail)
+        self._cells = [(cat, qp(h)) for cat, h in cells]
+        self._filler = qp(filler) if filler is not None else None
+        self._before, self._after = qp(before_url), qp(after_url)
+
+    @classmethod
+    def parse(cls, doc: str) -> Optional["Skeleton"]:
+        """没有卡片行标记（例如内置模板）时返回 None。"""
+        rows, sep, rest = doc.partition("<!--ts:/rows-->")
+        parts = _MARK.split(rows)
+        if not sep or len(parts) < 4 or parts[1] != "row":
+            return None
+        rest = sep + rest
+        prefix, row_head, row_tail = parts[0], None, ""
+        cells: List[Tuple[str, str]] = []
+        filler = None
+        width = 0
+        for i in range(1, len(parts), 3):
+            name, raw = parts[i], parts[i + 1]
+            arg = (raw or "").strip()
+            # 片段保留标记本身，不做个性化时拼回去与原文逐字节一致
+            text = f"<!--ts:{name}{'' if raw is None else ' ' + raw}-->" + parts[i + 2]
+            if name == "row":
+                if row_head is None:
+                    row_head = text
+                elif not width:
+                    width = len(cells)
+            elif name == "cell":
+                if arg:
+                    cells.append((arg.lower(), text))
+                else:
+                    filler = text
+            elif name == "/cells":
+                row_tail = text
+        if not width:
+            width = len(cells) + (filler is not None)
+        # 退订链接：<!--ts:unsub--> 之后的第一个 href
+        before, url, after = rest, None, ""
+        head, sep, tail = rest.partition("<!--ts:unsub-->")
+        m = _HREF.search(tail) if sep else None
+        if m:
+            before = head + sep + tail[:m.start(1)]
+            url = html.unescape(m.group(1))
+            after = tail[m.end(1):]
+        return cls(prefix, row_head or "", row_tail, width, cells, filler, before, url, after)
+
+    def order(self, tags: Sequence[str] = ()) -> List[int]:
+        """卡片顺序：分类在 tags 里的排前面，其余保持原顺序。"""
+        if not tags:
+            return list(range(len(self._cells)))
+        wanted = {t.lower() for t in tags}
+        return sorted(range(len(self._cells)), key=lambda i: self._cells[i][0] not in wanted)
+
+    def body(self, unsub: Optional[str] = None, tags: Sequence[str] = ()) -> str:
+        """QP 编码后的正文：静态片段 + 本人的卡片顺序 + 本人的退订链接。"""
+        out = [self._prefix]
+        cells = [self._cells[i][1] for i in self.order(tags)]
+        for i in range(0, len(cells), self.width):
+            row = cells[i:i + self.width]
+            if len(row) < self.width and self._filler is not None:
+                row += [self._filler] * (self.width - len(row))
+            out.append(self._head)
+            out.extend(row)
+            out.append(self._tail)
+        out.append(self._before)
+        if self.unsub_url is not None:
+            out.append(qp(html.escape(unsub or self.unsub_url)))
+        out.append(self._after)
+        return _SOFT.join(out)
+
+
+# ---------------- benchmark ----------------
+def main():
+    import argparse
+    import email
+    import time
+
+    ap = argparse.ArgumentParser(description="Personalized rendering throughput")
+    ap.add_argument("--file", required=True, help="rendered newsletter HTML")
+    ap.add_argument("-n", type=int, default=10000, help="messages to build (default 10000)")
+    ap.add_argument("--tags", default="innovation", help="tags used for every other recipient")
+    args = ap.parse_args()
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        doc = f.read()
+    sk = Skeleton.parse(doc)
+    assert sk is not None, "no <!--ts:row--> markers in this file; re-render it with src/newsletter_template.html"
+    secret = "bench-secret"
+    base = sk.unsub_url or "https://example.com/unsubscribe.html"
+    tags = [t for t in args.tags.split(",") if t]
+    rcpts = [(f"user{i}@example.com", tags if i % 2 else ()) for i in range(args.n)]
+    msg = qp_message([("Subject", "TechSum Weekly"), ("From", "TechSum <news@example.com>")])
+    head = mime_headers(msg)
+
+    # 拼接：每封信一次 join
+    t = time.perf_counter()
+    size = 0
+    for e, tg in rcpts:
+        size += len(head) + len(sk.body(unsub_link(base, e, secret), tg))
+    splice = time.perf_counter() - t
+
+    # 对照：每封信重新组装 HTML 并完整序列化 MIME
+    m = max(1, args.n // 10)
+    t = time.perf_counter()
+    for e, _ in rcpts[:m]:
+        msg = MIMEText(doc.replace(base, unsub_link(base, e, secret)), "html", "utf-8")
+        msg["Subject"] = "TechSum Weekly"
+        msg.as_string()
+    naive = (time.perf_counter() - t) * args.n / m
+
+    # 校验：拼接结果解码后与直接替换的 HTML 一致
+    e, tg = rcpts[0]
+    got = email.message_from_string(head + sk.body(unsub_link(base, e, secret), tg)).get_payload(decode=True).decode("utf-8")
+    assert got == doc.replace(base, html.escape(unsub_link(base, e, secret)), 1) or sk.unsub_url is None, "splice mismatch"
+
+    print(f"cards={len(sk.cells)} width={sk.width} avg_size={size // max(1, args.n)}B")
+    print(f"splice : {args.n} msgs in {splice:.2f}s ({args.n / splice:,.0f} msgs/s)")
+    print(f"naive  : {args.n} msgs in {naive:.2f}s ({args.n / naive:,.0f} msgs/s, extrapolated from {m})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stage timers for the newsletter build (used by scripts/api.py).
+
+- 每个阶段记录：墙钟 / CPU 时间、调用次数、输入 / 输出条数、峰值内存（开启 trace_memory 时）
+- 同名阶段多次进入会累加（例如各分类在抓取线程里的 normalize）
+- --profile：另外输出 cProfile 数据（.prof + 文本版 .pstats.txt）和 JSON 计时报告（.timings.json），
+  与 HTML 放在同一目录；同目录里有上一份报告时打印各阶段的变化
+- TECHSUM_TIMING=1 时把阶段汇总打印到 stderr（与 mongo.report 一致）
+- cProfile / pstats / tracemalloc 只在 --profile 时导入
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import resource  # 非 Windows
+except ImportError:
+    resource = None
+
+def peak_rss() -> Optional[int]:
+    """进程峰值常驻内存（字节）；平台不支持时为 None。"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class StageProfiler:
+    def __init__(self, trace_memory: bool = False, cprofile: bool = False):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        self._cprof = None
+        if cprofile:
+            import cProfile
+            self._cprof = cProfile.Profile()
+        if trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        if self._cprof is not None:
+            self._cprof.enable()
+
+    @contextmanager
+    def stage(self, name: str, items_in: Optional[int] = None, thread: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        with prof.stage("dedupe", items_in=len(xs)) as st: ...; st["items_out"] = len(ys)
+        thread=True：在工作线程里调用，CPU 用本线程时间，不单独统计内存峰值。
+        """
+        st: Dict[str, Any] = {"items_out": None}
+        clock = time.thread_time if thread else time.process_time
+        mem = self.trace_memory and not thread
+        if mem:
+            import tracemalloc
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        w, c = time.perf_counter(), clock()
+        try:
+            yield st
+        finally:
+            wall, cpu = time.perf_counter() - w, clock() - c
+            peak = tracemalloc.get_traced_memory()[1] - base if mem else None
+            self._add(name, wall, cpu, items_in, st["items_out"], peak)
+
+    def _add(self, name, wall, cpu, items_in, items_out, peak):
+        with self._lock:
+            s = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                              "items_in": None, "items_out": None, "peak_mem_bytes": None})
+            s["calls"] += 1
+            s["wall_s"] += wall
+            s["cpu_s"] += cpu
+            if items_in is not None:
+                s["items_in"] = (s["items_in"] or 0) + items_in
+            if items_out is not None:
+                s["items_out"] = (s["items_out"] or 0) + items_out
+            if peak is not None:
+                s["peak_mem_bytes"] = max(s["peak_mem_bytes"] or 0, peak)
+
+    def report(self, **extra) -> Dict[str, Any]:
+        import platform
+        return {
+            **extra,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "total_wall_s": round(time.perf_counter() - self._t0, 6),
+            "total_cpu_s": round(time.process_time() - self._c0, 6),
+            "peak_rss_bytes": peak_rss(),
+            "stages": {k: {**v, "wall_s": round(v["wall_s"], 6), "cpu_s": round(v["cpu_s"], 6)}
+                       for k, v in self.stages.items()},
+        }
+
+    def summary(self, rep: Optional[Dict[str, Any]] = None, prev: Optional[Dict[str, Any]] = None) -> str:
+        rep = rep or self.report()
+        fmt = lambda n: "-" if n is None else str(n)
+        lines = [f"⏱ total {rep['total_wall_s']:.3f}s wall, {rep['total_cpu_s']:.3f}s cpu"
+                 + (f", peak RSS {rep['peak_rss_bytes'] / 2**20:.1f} MiB" if rep["peak_rss_bytes"] else "")]
+        for name, s in rep["stages"].items():
+            line = (f"   {name:<10} {s['wall_s']:8.3f}s wall {s['cpu_s']:8.3f}s cpu"
+                    f"  {fmt(s['items_in']):>6} → {fmt(s['items_out']):<6}")
+            if s["peak_mem_bytes"] is not None:
+                line += f"  peak {s['peak_mem_bytes'] / 2**20:.1f} MiB"
+            old = (prev or {}).get("stages", {}).get(name)
+            if old and old.get("wall_s"):
+                line += f"  ({(s['wall_s'] / old['wall_s'] - 1) * 100:+.0f}% vs previous)"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def write(self, base: Path, **extra) -> Dict[str, Path]:
+        """写 <base>.timings.json（开启 cProfile 时还有 .prof / .pstats.txt），返回写出的文件。"""
+        base = Path(base)
+        out: Dict[str, Path] = {}
+        if self._cprof is not None:
+            import io
+            import pstats
+            self._cprof.disable()
+            out["prof"] = base.with_name(base.name + ".prof")
+            self._cprof.dump_stats(str(out["prof"]))
+            buf = io.StringIO()
+            pstats.Stats(self._cprof, stream=buf).sort_stats("cumulative").print_stats(40)
+            out["pstats"] = base.with_name(base.name + ".pstats.txt")
+            out["pstats"].write_text(buf.getvalue(), encoding="utf-8")
+        out["timings"] = base.with_name(base.name + ".timings.json")
+        prev = previous_report(out["timings"])
+        rep = self.report(**extra)
+        out["timings"].write_text(json.dumps(rep, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(self.summary(rep, prev), file=sys.stderr)
+        return out
+
+def previous_report(path: Path) -> Optional[Dict[str, Any]]:
+    """同目录下除 path 外最新的一份 .timings.json。"""
+    cands = [p for p in Path(path).parent.glob("*.timings.json") if p.name != Path(path).name]
+    for p in sorted(cands, key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            return json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+    return None
+
+def stage(prof: Optional[StageProfiler], name: str, **kw):
+    """prof 为 None 时是空操作，方便在可选参数里传递。"""
+    return prof.stage(name, **kw) if prof is not None else nullcontext({})
+
+def timing_enabled() -> bool:
+    return os.getenv("TECHSUM_TIMING") == "1"
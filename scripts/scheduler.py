@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Per-domain send scheduler for scripts/send_email.py (--by-domain).
+
+- 收件人按（优先级段, 收件域名）分队列；同一域名的各段共用一个限速器（收件方按域名限流）
+- 每个域名的速率 AIMD：从上限起步；收到 4xx（421/450/451/452 或 RCPT 临时拒绝）时减半并暂停
+  cooldown·2^n 秒（带抖动），被拒的收件人放回队首；之后每成功一次加回上限的 1/10。5xx 直接记为失败
+- workers 个线程各用一条 SMTP 连接，每次挑已到发送时间、优先级最高的域名；同一域名同一时刻只在一个
+  线程里发送，不同域名并行——总耗时取决于最慢的域名，而不是各域名之和
+- 收件人从迭代器流式读入，最多缓冲 max_pending 人（Mongo 游标不必一次读完）
+"""
+
+import heapq
+import random
+import smtplib
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+MAX_PAUSE = 300.0
+
+def domain_of(rcpt: str) -> str:
+    return rcpt.rsplit("@", 1)[-1].strip().lower()
+
+def smtp_code(e: Exception) -> Optional[int]:
+    return getattr(e, "smtp_code", None)
+
+def is_throttle(code: Optional[int]) -> bool:
+    return code is not None and 400 <= code < 500
+
+
+class AdaptiveRate:
+    """一个域名的发送速率（事务 / 秒）：成功时加性恢复，4xx 时减半并冷却。"""
+
+    def __init__(self, rate: float, floor: Optional[float] = None, cooldown: float = 5.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.floor = floor if floor is not None else rate / 16
+        self.step = rate / 10
+        self.cooldown = cooldown
+        self.strikes = 0
+        self.next_at = 0.0
+
+    def reserve(self, now: float, cost: float = 1.0):
+        """占用 cost 个事务的发送配额；下一轮最早在 next_at。"""
+        self.next_at = max(self.next_at, now) + cost / self.rate
+
+    def ok(self):
+        self.strikes = 0
+        self.rate = min(self.max_rate, self.rate + self.step)
+
+    def throttled(self, now: float) -> float:
+        """返回暂停的秒数。"""
+        self.strikes += 1
+        self.rate = max(self.floor, self.rate / 2)
+        pause = min(MAX_PAUSE, self.cooldown * 2 ** (self.strikes - 1)) * (0.5 + random.random())
+        self.next_at = max(self.next_at, now + pause)
+        return pause
+
+
+class _Domain:
+    __slots__ = ("name", "limiter", "queues", "busy", "waiting", "sent", "failed", "throttles", "done_at")
+
+    def __init__(self, name: str, limiter: AdaptiveRate):
+        self.name = name
+        self.limiter = limiter
+        self.queues: Dict[int, Deque[str]] = {}  # 优先级 → 收件人
+        self.busy = False
+        self.waiting = False  # 是否已在调度堆里
+        self.sent = self.failed = self.throttles = 0
+        self.done_at = 0.0
+
+    def priority(self) -> int:
+        return min(p for p, q in self.queues.items() if q)
+
+    def has_work(self) -> bool:
+        return any(self.queues.values())
+
+    def take(self, n: int) -> Tuple[int, List[str]]:
+        p = self.priority()
+        q = self.queues[p]
+        return p, [q.popleft() for _ in range(min(n, len(q)))]
+
+    def put_back(self, priority: int, rcpts: List[str]):
+        self.queues.setdefault(priority, deque()).extendleft(reversed(rcpts))
+
+
+class DomainScheduler:
+    def __init__(self, connect: Callable[[], Any], sender: str, payload, *,
+                 rate: float = 1.0, rates: Optional[Dict[str, float]] = None, cooldown: float = 5.0,
+                 batch_size: int = 80, workers: int = 4, retries: int = 3, throttle_retries: int = 8,
+                 backoff: float = 2.0, segment_of: Optional[Callable[[str], int]] = None,
+                 bucket=None, on_batch=None, max_pending: int = 50000, total: Optional[int] = None):
+        """
+        connect() → 有 send(from, rcpts, payload) / reset() / close() 的连接（send_email.SMTPConnection）。
+        payload 为字符串时同域名的一批收件人一个事务；为函数时每人一封，每轮最多约 1 秒的量。
+        segment_of(rcpt) → 优先级（小的先发）；rates 为个别域名的速率上限。
+        on_batch(index, delivered, error) 每轮结束后调用（串行）。
+        """
+        self.connect, self.sender, self.payload = connect, sender, payload
+        self.rate, self.rates, self.cooldown = rate, {k.lower(): v for k, v in (rates or {}).items()}, cooldown
+        self.batch_size, self.workers = max(1, batch_size), max(1, workers)
+        self.retries, self.throttle_retries, self.backoff = retries, throttle_retries, backoff
+        self.segment_of = segment_of or (lambda r: 0)
+        self.bucket, self.on_batch = bucket, on_batch
+        self.max_pending, self.total = max(1, max_pending), total
+        self.domains: Dict[str, _Domain] = {}
+        self.tries: Dict[str, List[int]] = {}  # 收件人 → [4xx 次数, 其他临时错误次数]
+        self.failed: List[str] = []
+        self.sent = 0
+        self.turns = 0
+        self.pending = 0  # 排队中 + 发送中
+        self.exhausted = False
+        self.error: Optional[BaseException] = None  # feeder / worker 的异常，结束后在 run() 里抛出
+        self.aborted = False
+        self._ready: List[Tuple[int, int, _Domain]] = []    # (优先级, 序号, 域名)：已可发送
+        self._later: List[Tuple[float, int, _Domain]] = []  # (next_at, 序号, 域名)：限速 / 冷却中
+        self._seq = 0
+        self.cv = threading.Condition()
+        self.t0 = time.monotonic()
+
+    # ---- queueing（调用方持有 cv） ----
+    def _domain(self, name: str) -> _Domain:
+        d = self.domains.get(name)
+        if d is None:
+            d = self.domains[name] = _Domain(name, AdaptiveRate(self.rates.get(name, self.rate), cooldown=self.cooldown))
+        return d
+
+    def _schedule(self, d: _Domain):
+        if d.busy or d.waiting or not d.has_work():
+            return
+        d.waiting = True
+        self._seq += 1
+        if d.limiter.next_at > time.monotonic():
+            heapq.heappush(self._later, (d.limiter.next_at, self._seq, d))
+        else:
+            heapq.heappush(self._ready, (d.priority(), self._seq, d))
+        self.cv.notify_all()  # 等待中的也可能是 feeder，只唤醒一个会漏掉 worker
+
+    def _pick(self) -> Tuple[Optional[_Domain], Optional[float]]:
+        """可发送的域名；没有时返回 (None, 最早可发的等待秒数)。"""
+        now = time.monotonic()
+        while self._later and self._later[0][0] <= now:
+            _, seq, d = heapq.heappop(self._later)
+            heapq.heappush(self._ready, (d.priority(), seq, d))
+        if self._ready:
+            d = heapq.heappop(self._ready)[2]
+            d.waiting = False
+            return d, None
+        return None, (self._later[0][0] - now) if self._later else None
+
+    def _feed(self, rcpts: Iterable[str]):
+        try:
+            for r in rcpts:
+                d, p = domain_of(r), self.segment_of(r)
+                with self.cv:
+                    while self.pending >= self.max_pending and not self.aborted:
+                        self.cv.wait()
+                    if self.aborted:
+                        return
+                    dom = self._domain(d)
+                    dom.queues.setdefault(p, deque()).append(r)
+                    self.pending += 1
+                    self._schedule(dom)
+        except BaseException as e:  # Mongo 游标出错等：已入队的照常发完，结束后抛出
+            self.error = e
+        finally:
+            with self.cv:
+                self.exhausted = True
+                self.cv.notify_all()
+
+    # ---- sending ----
+    def _transmit(self, conn, chunk: List[str], refused: Dict[str, Tuple[int, Any]], done: List[str]):
+        if not callable(self.payload):
+            refused.update(conn.send(self.sender, chunk, self.payload))
+            done.extend(chunk)
+            return
+        for r in chunk:
+            try:
+                refused.update(conn.send(self.sender, [r], self.payload(r)))
+            except smtplib.SMTPRecipientsRefused as e:
+                refused.update(e.recipients)
+            done.append(r)
+
+    def _turn(self, conn, chunk: List[str]):
+        if self.bucket is not None:
+            self.bucket.acquire()
+        refused: Dict[str, Tuple[int, Any]] = {}
+        done: List[str] = []
+        err = None
+        try:
+            self._transmit(conn, chunk, refused, done)
+        except smtplib.SMTPRecipientsRefused as e:  # 整批都在 RCPT 被拒；连接仍可用
+            refused.update(e.recipients)
+            done.extend(r for r in chunk[len(done):] if r in e.recipients)
+            err = e
+        except Exception as e:
+            err = e
+            conn.reset()
+
+        delivered = [r for r in done if r not in refused]
+        throttled = [r for r in done if r in refused and is_throttle(refused[r][0])]
+        failed = [r for r in done if r in refused and not is_throttle(refused[r][0])]
+        rest = chunk[len(done):]
+        retry: List[str] = []
+        if rest:
+            if is_throttle(smtp_code(err)):
+                throttled += rest
+            elif smtp_code(err) is None and isinstance(err, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)):
+                retry = rest
+            else:
+                failed += rest
+        return delivered, throttled, retry, failed, err
+
+    def _finish(self, d: _Domain, priority: int, delivered, throttled, retry, failed, err):
+        """（持有 cv）记账、调整限速、把要重试的放回队首。"""
+        now = time.monotonic()
+        again: List[str] = []
+        for rs, k, limit in ((throttled, 0, self.throttle_retries), (retry, 1, self.retries)):
+            for r in rs:
+                t = self.tries.setdefault(r, [0, 0])
+                t[k] += 1
+                (again if t[k] <= limit else failed).append(r)
+        for r in delivered + failed:
+            self.tries.pop(r, None)
+        if again:
+            d.put_back(priority, again)
+        note = ""
+        if throttled:
+            d.throttles += 1
+            pause = d.limiter.throttled(now)
+            note = f"; {len(throttled)} throttled ({smtp_code(err) or 'RCPT 4xx'}), rate → {d.limiter.rate:.2f}/s, pause {pause:.0f}s"
+        elif again:  # 断线等：按该批的重试次数指数退避，不降速
+            n = max(self.tries[r][1] for r in again)
+            d.limiter.next_at = max(d.limiter.next_at, now + self.backoff * 2 ** max(0, n - 1) * (0.5 + random.random()))
+        elif delivered:
+            d.limiter.ok()
+        d.sent += len(delivered)
+        d.failed += len(failed)
+        self.sent += len(delivered)
+        self.failed.extend(failed)
+        self.pending -= len(delivered) + len(failed)
+        idx = self.turns
+        self.turns += 1
+        if delivered or failed or note:
+            total = "" if self.total is None else f"/{self.total}"
+            icon = "❌" if failed else ("⏳" if note else "✅")
+            msg = f"{icon} {d.name}: sent {len(delivered)}" + (f", failed {len(failed)}" if failed else "")
+            if failed and err is not None:
+                msg += f" ({type(err).__name__}: {err})"
+            print(f"{msg}{note} (total {self.sent}{total})")
+        if self.on_batch is not None:
+            self.on_batch(idx, delivered, err if failed else None)
+        d.busy = False
+        if d.has_work():
+            self._schedule(d)
+        else:
+            d.done_at = now - self.t0
+        self.cv.notify_all()
+
+    def _worker(self):
+        conn = self.connect()
+        try:
+            while True:
+                with self.cv:
+                    while True:
+                        if self.aborted:
+                            return
+                        d, wait = self._pick()
+                        if d is not None:
+                            break
+                        if self.exhausted and self.pending == 0:
+                            return
+                        self.cv.wait(wait)
+                    d.busy = True
+                    n = self.batch_size
+                    if callable(self.payload):  # 每人一封：一轮最多约 1 秒的量
+                        n = max(1, min(n, int(d.limiter.rate)))
+                    priority, chunk = d.take(n)
+                    d.limiter.reserve(time.monotonic(), len(chunk) if callable(self.payload) else 1)
+                result = self._turn(conn, chunk)
+                with self.cv:
+                    self._finish(d, priority, *result)
+        except BaseException as e:  # 例如 on_batch 写账本失败：其余线程停下，run() 抛出
+            with self.cv:
+                self.error = self.error or e
+                self.aborted = True
+                self.cv.notify_all()
+        finally:
+            conn.close()
+
+    def run(self, rcpts: Iterable[str]) -> Tuple[int, List[str]]:
+        feeder = threading.Thread(target=self._feed, args=(rcpts,), name="smtp-feed", daemon=True)
+        feeder.start()
+        threads = [threading.Thread(target=self._worker, name=f"smtp-{i}", daemon=True) for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        feeder.join()
+        if self.error is not None:
+            raise self.error
+        return self.sent, self.failed
+
+    def summary(self, top: int = 10) -> str:
+        ds = sorted(self.domains.values(), key=lambda d: d.sent + d.failed, reverse=True)
+        lines = [f"📬 {len(ds)} domains, {self.turns} SMTP turns"]
+        for d in ds[:top]:
+            lines.append(f"   {d.name:<24} sent {d.sent:>6}  failed {d.failed:>4}  throttled {d.throttles:>3}x"
+                         f"  rate {d.limiter.rate:.2f}/{d.limiter.max_rate:g} per s  done at {d.done_at:.1f}s")
+        if len(ds) > top:
+            lines.append(f"   … {len(ds) - top} more")
+        return "\n".join(lines)
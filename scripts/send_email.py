@@ -4,7 +4,11 @@
 """
 Send newsletter HTML via Gmail.
 - Supports recipients from CLI/ENV/file and/or MongoDB Atlas.
-- Batching with sleep to avoid provider limits.
+- Batching under a token-bucket rate limit (default: one batch per --sleep seconds).
+- Optional parallel delivery over several SMTP connections (--workers), with
+  transparent reconnects and retry/backoff for failed batches.
+- --by-domain: one queue per recipient domain (and --priority-tags tier), each with an
+  adaptive rate that backs off on 4xx replies; domains are drained concurrently (scripts/scheduler.py).
 
 Usage examples:
   # 从 Mongo 取 active+preview ，分批发送
@@ -15,6 +19,20 @@ Usage examples:
     --from-mongo --tags "preview" --status active \
     --batch-size 80 --sleep 4
 
+  # 并行：4 条连接，总速率 2 批/秒
+  python scripts/send_email.py --file ... --from-mongo \
+    --batch-size 80 --workers 4 --rate 2
+
+  # 个性化：每人一封（签名退订链接 + 按订阅 tags 排序），需要 UNSUB_SECRET
+  python scripts/send_email.py --file ... --from-mongo --personalize --workers 4 --rate 2
+
+  # 按收件域名分队列：每个域名最多 5 事务/秒，遇 4xx 自动降速；vip 标签的订阅者先发
+  python scripts/send_email.py --file ... --from-mongo --by-domain --workers 8 \
+    --domain-rate 5 --domain-rates "gmail.com=10,qq.com=2" --priority-tags vip
+
+  # 中途失败后重跑：跳过账本里已投递的收件人
+  python scripts/send_email.py --file output/newsletter-2025-10-13.html --from-mongo --resume
+
   # 传统：直接传收件人
   EMAIL_USER=... EMAIL_PASS=... \
   python scripts/send_email.py \
@@ -22,11 +40,15 @@ Usage examples:
     --to "a@x.com,b@y.com" --subject "Subject"
 """
 
-import os, time, argparse, smtplib
-from email.mime.text import MIMEText
-from email.utils import formataddr, make_msgid
+import os, time, json, argparse, random, threading
+from typing import Callable, Iterable, Iterator
+
+import mongo
+
+# smtplib / email.mime / concurrent.futures / personalize 在真正发送时才导入，--help 等不付这部分开销
 
 # --- load .env for local dev (safe if missing on CI) ---
+# 在导入时加载：下面的 SMTP_HOST 等常量要读到 .env 里的值
 try:
     from dotenv import load_dotenv
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,6 +64,17 @@ def parse_list(s: str | None) -> list[str]:
     parts = re.split(r"[,\s;]+", s.strip())
     return [p for p in parts if p]
 
+def parse_rates(s: str | None) -> dict[str, float]:
+    """"gmail.com=10,qq.com=2" → {域名: 速率}。"""
+    out = {}
+    for part in parse_list(s):
+        name, _, rate = part.partition("=")
+        try:
+            out[name.lower()] = float(rate)
+        except ValueError:
+            raise SystemExit(f"--domain-rates: bad entry {part!r}; expected domain=rate")
+    return out
+
 def uniq(seq):
     seen = set(); out = []
     for x in seq:
@@ -49,42 +82,313 @@ def uniq(seq):
             seen.add(x); out.append(x)
     return out
 
+# ---------------- delivery engine ----------------
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"  # 仅本地测试服务器可关闭
+
+class TokenBucket:
+    """线程安全的令牌桶：rate 个/秒，最多积攒 capacity 个。"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+class SMTPConnection:
+    """一条已登录的 SMTP 连接；断开后下次发送时自动重连。"""
+
+    def __init__(self, user: str, pwd: str, host: str | None = None, port: int | None = None, timeout: float = 30):
+        self.user, self.pwd = user, pwd
+        # 默认值在创建时读取模块设置（而非定义时），便于测试把已导入的模块指向本地沙箱
+        self.host, self.port, self.timeout = host or SMTP_HOST, port or SMTP_PORT, timeout
+        self.smtp = None
+
+    def _connect(self):
+        import smtplib
+        s = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if SMTP_STARTTLS:
+            s.starttls()
+        s.login(self.user, self.pwd)
+        self.smtp = s
+
+    def send(self, from_addr: str, rcpts: list[str], payload: str) -> dict:
+        if self.smtp is None:
+            self._connect()
+        return self.smtp.sendmail(from_addr, rcpts, payload)
+
+    def reset(self):
+        """丢弃当前连接（出错后调用），下次 send 重新建立。"""
+        if self.smtp is not None:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+        self.smtp = None
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+        self.smtp = None
+
+def is_transient(e: Exception) -> bool:
+    """断线、网络错误、4xx 临时拒绝可重试；5xx 与认证失败不重试。"""
+    import smtplib
+    if isinstance(e, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in e.recipients.values())
+    return isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+def deliver(batches: Iterable[list[str]], user: str, pwd: str, payload: str | Callable[[str], str], *,
+            workers: int = 1, bucket: TokenBucket | None = None,
+            retries: int = 3, backoff: float = 2.0, on_batch=None,
+            total: int | None = None) -> tuple[int, list[str]]:
+    """
+    用最多 workers 条 SMTP 连接并行发送各批；每批发送前从令牌桶取令牌。
+    batches 可以是生成器：边取边发，在途批次最多 2 * workers 个。
+    payload 为函数时是个性化发送：payload(rcpt) 生成每人的邮件，批内逐人发送，重试时跳过已发出的人。
+    失败的批次按指数退避（带抖动）重连重试。
+    on_batch(index, delivered, error) 在每批结束后调用（串行）；delivered 为实际投递成功的收件人。
+    返回 (成功人数, 失败的收件人列表)。
+    """
+    import smtplib
+    from concurrent.futures import ThreadPoolExecutor
+    local = threading.local()
+    conns: list[SMTPConnection] = []
+    conns_lock = threading.Lock()
+    print_lock = threading.Lock()
+    if total is None and isinstance(batches, list):
+        total = sum(len(b) for b in batches)
+    inflight = threading.BoundedSemaphore(2 * max(1, workers))
+    state = {"sent": 0}
+    failed: list[str] = []
+
+    def conn() -> SMTPConnection:
+        c = getattr(local, "conn", None)
+        if c is None:
+            c = local.conn = SMTPConnection(user, pwd)
+            with conns_lock:
+                conns.append(c)
+        return c
+
+    def send_batch(idx: int, chunk: list[str]):
+        try:
+            _send_batch(idx, chunk)
+        finally:
+            inflight.release()
+
+    def transmit(chunk: list[str], refused: dict, done: list[str]):
+        if not callable(payload):
+            refused.update(conn().send(user, chunk, payload))
+            done.extend(chunk)
+            return
+        for r in chunk[len(done):]:
+            try:
+                refused.update(conn().send(user, [r], payload(r)))
+            except smtplib.SMTPRecipientsRefused as e:
+                refused.update(e.recipients)
+            done.append(r)
+
+    def _send_batch(idx: int, chunk: list[str]):
+        err = None
+        refused: dict = {}
+        done: list[str] = []
+        for attempt in range(retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                transmit(chunk, refused, done)
+                err = None
+                break
+            except Exception as e:
+                err = e
+                conn().reset()
+                if attempt == retries or not is_transient(e):
+                    break
+                time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+        with print_lock:
+            delivered = [r for r in done if r not in refused]
+            state["sent"] += len(delivered)
+            failed.extend(refused)
+            failed.extend(chunk[len(done):])
+            if err is None:
+                print(f"✅ Batch {idx+1}: sent {len(delivered)} (total {state['sent']}{'' if total is None else f'/{total}'})")
+            else:
+                print(f"❌ Batch {idx+1}: {type(err).__name__}: {err}")
+            if on_batch is not None:
+                on_batch(idx, delivered, err)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="smtp") as ex:
+            futures = []
+            for i, b in enumerate(batches):
+                inflight.acquire()
+                futures.append(ex.submit(send_batch, i, b))
+            for f in futures:
+                f.result()
+    finally:
+        for c in conns:
+            c.close()
+    return state["sent"], failed
+
 # ---------------- mongo helpers ----------------
-def get_mongo_collection():
-    """Return pymongo collection or None if MONGODB_URI not set."""
-    uri = os.getenv("MONGODB_URI")
-    if not uri:
-        return None
-    from pymongo import MongoClient
-    from pymongo.server_api import ServerApi
-    dbname = os.getenv("MONGODB_DB", "techsum")
-    collname = os.getenv("MONGODB_COLL", "subscribers")
-    client = MongoClient(uri, server_api=ServerApi('1'), serverSelectionTimeoutMS=8000)
-    db = client[dbname]
-    return db[collname]
-
-def fetch_recipients_from_mongo(tags=None, status="active", limit=None) -> list[str]:
-    """Fetch emails from MongoDB, filter by status and optional tags."""
-    coll = get_mongo_collection()
+MONGO_BATCH = int(os.getenv("MONGODB_BATCH_SIZE", "1000"))
+
+def fetch_recipients_from_mongo(tags=None, status="active", limit=None, with_tags=False) -> Iterator:
+    """
+    Stream emails from MongoDB (lowercased, unique), filter by status and optional tags.
+    with_tags=True 时产出 (email, 订阅 tags)。
+    """
+    coll = mongo.get_collection()
     # 修复：Collection 不支持布尔判断，必须和 None 比较
     if coll is None:
-        return []
-    q = {"status": status}
-    if tags:
-        q["tags"] = {"$in": tags}
-    projection = {"_id": 0, "email": 1}
-    cur = coll.find(q, projection)
-    if limit:
-        cur = cur.limit(int(limit))
-    emails = []
-    for doc in cur:
-        e = (doc.get("email") or "").strip().lower()
-        if e:
-            emails.append(e)
-    return uniq(emails)
+        return iter(())
+    return mongo.stream_emails(status, tags, limit, batch_size=MONGO_BATCH, coll=coll, with_tags=with_tags)
+
+def mongo_audience(tags=None, status="active", limit=None) -> int | None:
+    """发送前估算 Mongo 收件人数：读统计汇总文档（O(1)）；没有汇总或多个 tag 时为 None。"""
+    if mongo.get_collection() is None:
+        return None
+    n = mongo.audience_size(mongo.read_stats(), status, tags)
+    return n if n is None or not limit else min(n, int(limit))
+
+def iter_recipients(lists, stream=(), skip=frozenset(), stats=None, tags_of=None) -> Iterator[str]:
+    """
+    先产出 lists（CLI / 文件，按顺序去重），再产出 stream（Mongo，本身已去重）；
+    stream 只需和 lists 比较，不再记入 seen，内存不随订阅者数增长。
+    skip（已投递，小写）里的地址跳过；stats 记录 {"count": 产出数, "skipped": 跳过数}。
+    stream 的元素是 (email, tags) 时，产出前把 tags 记进 tags_of（调用方发完一批后删除）。
+    """
+    seen = set()
+    stats = stats if stats is not None else {}
+    stats.update(count=0, skipped=0)
+
+    def emit(r):
+        if r.lower() in skip:
+            stats["skipped"] += 1
+            return False
+        stats["count"] += 1
+        return True
+
+    for r in (r for lst in lists for r in lst):
+        if r not in seen:
+            seen.add(r)
+            if emit(r):
+                yield r
+    for r in stream:
+        r, tags = (r, None) if isinstance(r, str) else r
+        if r not in seen and emit(r):
+            if tags_of is not None and tags:
+                tags_of[r] = tags
+            yield r
+
+def chunked(it, n: int) -> Iterator[list[str]]:
+    buf = []
+    for x in it:
+        buf.append(x)
+        if len(buf) >= n:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+# ---------------- delivery ledger ----------------
+# 每期（issue）每个收件人投递成功后记一条；中途失败重跑时 --resume 跳过已投递的地址。
+LEDGER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "deliveries.jsonl")
+LEDGER_COLL = os.getenv("MONGODB_LEDGER_COLL", "deliveries")
+
+class FileLedger:
+    """本地 JSONL 账本：每行 {issue, email, message_id, ts}；每批写完即 fsync。"""
+
+    def __init__(self, path: str, issue: str):
+        self.path, self.issue = path, issue
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _rows(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # 上次写到一半被中断的行
+                    if row.get("issue") == self.issue:
+                        yield row
+        except FileNotFoundError:
+            return
+
+    def delivered(self) -> set[str]:
+        return {row["email"] for row in self._rows()}
+
+    def message_id(self) -> str | None:
+        return next((row.get("message_id") for row in self._rows()), None)
+
+    def record(self, emails: list[str], message_id: str):
+        if not emails:
+            return
+        ts = time.time()
+        with open(self.path, "a", encoding="utf-8") as f:
+            for e in emails:
+                f.write(json.dumps({"issue": self.issue, "email": e.lower(), "message_id": message_id, "ts": ts}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+class MongoLedger:
+    """Mongo 账本：deliveries 集合，(issue, email_lc) 唯一。"""
+
+    def __init__(self, coll, issue: str):
+        self.coll, self.issue = coll, issue
+        from pymongo import ASCENDING
+        coll.create_index([("issue", ASCENDING), ("email_lc", ASCENDING)], unique=True, name="uniq_issue_email")
+
+    def delivered(self) -> set[str]:
+        return {d["email_lc"] for d in self.coll.find({"issue": self.issue}, {"_id": 0, "email_lc": 1})}
+
+    def message_id(self) -> str | None:
+        d = self.coll.find_one({"issue": self.issue}, {"_id": 0, "message_id": 1})
+        return d.get("message_id") if d else None
+
+    def record(self, emails: list[str], message_id: str):
+        if not emails:
+            return
+        from pymongo import UpdateOne
+        from datetime import datetime, timezone
+        now = datetime.now(timezone.utc)
+        ops = [UpdateOne({"issue": self.issue, "email_lc": e.lower()},
+                         {"$setOnInsert": {"message_id": message_id, "sent_at": now}}, upsert=True)
+               for e in emails]
+        self.coll.bulk_write(ops, ordered=False)
+
+def open_ledger(issue: str, path: str | None = None):
+    """--ledger 指定文件则用文件；否则有 MONGODB_URI 用 Mongo，没有则用本地文件。"""
+    if not path:
+        coll = mongo.get_collection(LEDGER_COLL)
+        if coll is not None:
+            return MongoLedger(coll, issue)
+    return FileLedger(path or LEDGER_FILE, issue)
 
 # ---------------- main send ----------------
-def main():
+def main(argv=None):
     ap = argparse.ArgumentParser()
     ap.add_argument("--file", required=True, help="HTML file to send")
     ap.add_argument("--subject", default=os.getenv("EMAIL_SUBJECT", "TechSum Weekly Preview"))
@@ -103,10 +407,32 @@ def main():
 
     # batching
     ap.add_argument("--batch-size", type=int, default=80, help="max recipients per batch (default 80)")
-    ap.add_argument("--sleep", type=float, default=4.0, help="seconds between batches (default 4s)")
+    ap.add_argument("--sleep", type=float, default=4.0, help="seconds between batches (default 4s); ignored when --rate is set")
+    ap.add_argument("--rate", type=float, help="max batches per second across all connections (token bucket)")
+    ap.add_argument("--workers", type=int, default=1, help="parallel SMTP connections (default 1)")
+    ap.add_argument("--retries", type=int, default=3, help="retries per failed batch (default 3)")
+    ap.add_argument("--by-domain", action="store_true",
+                    help="queue recipients per domain with adaptive per-domain rates (--sleep is ignored; --rate still caps the total)")
+    ap.add_argument("--domain-rate", type=float, default=1.0,
+                    help="--by-domain: max SMTP transactions per second per domain; halved on 4xx, recovers on success (default 1)")
+    ap.add_argument("--domain-rates", help='--by-domain: per-domain overrides, e.g. "gmail.com=10,qq.com=2"')
+    ap.add_argument("--priority-tags", help="--by-domain: subscribers with these tags are sent first, in this order")
+    ap.add_argument("--personalize", action="store_true",
+                    help="one message per recipient: signed unsubscribe link + cards ordered by subscriber tags (needs UNSUB_SECRET)")
 
-    args = ap.parse_args()
+    # delivery ledger / resume
+    ap.add_argument("--issue", help="issue id for the delivery ledger (default: --file name without extension)")
+    ap.add_argument("--resume", action="store_true", help="skip recipients the ledger marks as delivered for this issue")
+    ap.add_argument("--ledger", help="JSONL ledger file (default: Mongo 'deliveries' collection, else .cache/deliveries.jsonl)")
 
+    args = ap.parse_args(argv)
+    mongo.warm_up()  # 连接 Mongo 与读取 HTML / 解析收件人并行
+    try:
+        send(args)
+    finally:
+        mongo.report("send_email")
+
+def send(args):
     user = os.getenv("EMAIL_USER")
     pwd  = os.getenv("EMAIL_PASS")
     assert user and pwd, "EMAIL_USER/EMAIL_PASS required"
@@ -125,42 +451,114 @@ def main():
                 if line and not line.startswith("#"):
                     file_list.append(line)
 
-    # mongo list (optional)
-    mongo_list = []
-    if args.from_mongo:
-        tag_list = parse_list(args.tags)
-        mongo_list = fetch_recipients_from_mongo(tags=tag_list, status=args.status, limit=args.limit)
-
     # priority: CLI/ENV > file > Mongo
     base_rcpts = to_list or file_list or []
-    all_rcpts = uniq(base_rcpts + cc_list + bcc_list + mongo_list)
-    assert all_rcpts, "No recipients: use --from-mongo or provide --to/MAIL_TO"
-
+    lists = [base_rcpts, cc_list, bcc_list]
+    assert args.from_mongo or any(lists), "No recipients: use --from-mongo or provide --to/MAIL_TO"
     with open(args.file, "r", encoding="utf-8") as f:
         html = f.read()
 
-    msg = MIMEText(html, "html", "utf-8")
-    msg["Subject"] = args.subject
-    msg["From"] = formataddr(("TechSum", user))
-    if base_rcpts: msg["To"] = ", ".join(base_rcpts)
-    if cc_list:    msg["Cc"] = ", ".join(cc_list)
-    msg["Message-ID"] = make_msgid(domain=user.split("@")[-1])
+    # 个性化：每人的退订 token + 按订阅 tags 排序的卡片，只拼接预编码的片段
+    skeleton = None
+    if args.personalize:
+        secret = os.getenv("UNSUB_SECRET")
+        assert secret, "--personalize requires UNSUB_SECRET"
+        import personalize
+        skeleton = personalize.Skeleton.parse(html)
+        if skeleton is None:
+            print("⚠️ No personalization markers in the HTML; sending the same message to everyone")
+    elif os.getenv("UNSUB_SECRET"):
+        # 同一封信发给一批人，退订链接没法按人签名；/api/unsubscribe 会改为发确认邮件
+        print("⚠️ UNSUB_SECRET is set but --personalize is not: unsubscribe links are unsigned and will ask for email confirmation")
+    tags_of: dict = {}
+
+    # mongo list (optional)：游标是惰性的，发送时才边读边发
+    stream = ()
+    audience = None
+    if args.from_mongo:
+        tag_list = parse_list(args.tags)
+        stream = fetch_recipients_from_mongo(tags=tag_list, status=args.status, limit=args.limit,
+                                             with_tags=skeleton is not None or bool(args.by_domain and args.priority_tags))
+        audience = mongo_audience(tag_list, args.status, args.limit)
+        if audience is not None:
+            print(f"👥 Audience: ~{audience} subscribers (from subscriber stats)")
+
+    issue = args.issue or os.path.splitext(os.path.basename(args.file))[0]
+    ledger = open_ledger(issue, args.ledger)
+    done = ledger.delivered()
+    if done and not args.resume:
+        print(f"⚠️ {len(done)} recipients already received {issue}; pass --resume to skip them")
+    stats: dict = {}
+    rcpts = iter_recipients(lists, stream, skip=done if args.resume else frozenset(), stats=stats, tags_of=tags_of)
+
+    from email.mime.text import MIMEText
+    from email.utils import formataddr, make_msgid
+    headers = [("Subject", args.subject), ("From", formataddr(("TechSum", user)))]
+    if base_rcpts: headers.append(("To", ", ".join(base_rcpts)))
+    if cc_list:    headers.append(("Cc", ", ".join(cc_list)))
+    # 续发时沿用同一 Message-ID，保证同一期邮件的标识一致
+    msg_id = (ledger.message_id() if args.resume else None) or make_msgid(domain=user.split("@")[-1])
+    headers.append(("Message-ID", msg_id))
 
     batch = max(1, int(args.batch_size))
     delay = max(0.0, float(args.sleep))
-    total = len(all_rcpts); sent = 0
-
-    with smtplib.SMTP("smtp.gmail.com", 587, timeout=30) as s:
-        s.starttls(); s.login(user, pwd)
-        for i in range(0, total, batch):
-            chunk = all_rcpts[i:i+batch]
-            s.sendmail(user, chunk, msg.as_string())
-            sent += len(chunk)
-            print(f"✅ Batch {i//batch+1}: sent {len(chunk)} (total {sent}/{total})")
-            if i + batch < total and delay > 0:
-                time.sleep(delay)
-
-    print(f"🎉 Done. Sent to {sent} recipients.")
+    batches = chunked(rcpts, batch)
+
+    # 速率：--rate 批/秒；未指定时沿用 --sleep（每 delay 秒一批）
+    rate = args.rate if args.rate is not None else (1.0 / delay if delay > 0 else 0.0)
+    bucket = TokenBucket(rate) if rate > 0 else None
+
+    if skeleton is not None:
+        # 头部只序列化一次；每人一封不同的邮件，Message-ID 各自生成
+        head = personalize.mime_headers(personalize.qp_message([h for h in headers if h[0] != "Message-ID"]))
+        unsub_base = os.getenv("UNSUB_URL") or skeleton.unsub_url or ""
+        msgid_domain = user.split("@")[-1]
+        def payload(r: str) -> str:
+            return (f"Message-ID: {make_msgid(domain=msgid_domain)}\n" + head
+                    + skeleton.body(personalize.unsub_link(unsub_base, r, secret), tags_of.get(r, ())))
+    else:
+        msg = MIMEText(html, "html", "utf-8")
+        for k, v in headers:
+            msg[k] = v
+        payload = msg.as_string()  # 只序列化一次
+
+    def on_batch(_i, delivered, _e):
+        ledger.record(delivered, msg_id)
+        for r in delivered:
+            tags_of.pop(r, None)
+
+    t0 = time.monotonic()
+    total = audience if not any(lists) else None
+    if args.by_domain:
+        import scheduler
+        tiers = [t.lower() for t in parse_list(args.priority_tags)]
+        def tier_of(r: str) -> int:
+            return min((tiers.index(t.lower()) for t in tags_of.get(r, ()) if t.lower() in tiers), default=len(tiers))
+        sched = scheduler.DomainScheduler(
+            lambda: SMTPConnection(user, pwd), user, payload,
+            rate=args.domain_rate, rates=parse_rates(args.domain_rates), batch_size=batch,
+            workers=args.workers, retries=max(0, args.retries), segment_of=tier_of if tiers else None,
+            bucket=TokenBucket(args.rate) if args.rate else None, on_batch=on_batch, total=total)
+        sent, failed = sched.run(rcpts)
+        print(sched.summary())
+    else:
+        sent, failed = deliver(batches, user, pwd, payload,
+                               workers=args.workers, bucket=bucket, retries=max(0, args.retries),
+                               on_batch=on_batch, total=total)
+    elapsed = max(time.monotonic() - t0, 1e-9)
+
+    if done and args.resume:
+        print(f"↩️  Resume {issue}: skipped {stats['skipped']} already delivered")
+    if not stats["count"]:
+        assert stats["skipped"], "No recipients: use --from-mongo or provide --to/MAIL_TO"
+        print("🎉 Nothing left to send.")
+        return
+    n_msgs = stats["count"] if skeleton is not None else (sched.turns if args.by_domain else -(-stats["count"] // batch))
+    print(f"🎉 Done. Sent to {sent} recipients in {elapsed:.1f}s "
+          f"({n_msgs/elapsed:.2f} msgs/s, {sent/elapsed:.1f} rcpts/s).")
+    if failed:
+        print(f"⚠️ Failed: {len(failed)} recipients")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
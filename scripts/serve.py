@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Long-lived build / send daemon: cron or the Node admin server trigger runs over a local socket
+instead of cold-starting Python each time.
+
+- 监听本地 Unix socket（默认 .cache/techsum.sock，权限 0600）；每个连接一行 JSON 请求、一行 JSON 响应：
+    {"cmd": "build", "args": ["--offline"]}                → scripts/api.py
+    {"cmd": "send", "args": ["--file", "...", "--to", …]}  → scripts/send_email.py
+    {"cmd": "subscribers", "args": ["stats"]}              → scripts/subscribers.py
+    {"cmd": "archive", "args": ["search", "openai"]}       → scripts/archive_store.py
+    {"cmd": "ping"} / {"cmd": "shutdown"}
+  响应：{"ok": true, "code": 0, "output": "<stdout+stderr>", "elapsed_s": 1.23}
+- 各 CLI 模块只导入一次：Jinja Environment、HTTP 连接池、MongoClient、日期解析缓存等一直常驻
+- 作业串行执行（各 CLI 共用进程级的 stdout 与全局缓存）；ping 不排队
+
+Usage:
+  python scripts/serve.py                                  # 前台运行
+  python scripts/serve.py call build -- --offline --topk 10
+  python scripts/serve.py call subscribers -- stats
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SOCKET_PATH = Path(os.getenv("TECHSUM_SOCKET") or ROOT_DIR / ".cache" / "techsum.sock")
+
+def _commands() -> Dict[str, Callable[[List[str]], Any]]:
+    import api
+    import archive_store
+    import send_email
+    import subscribers
+    return {"build": api.main, "send": send_email.main, "subscribers": subscribers.main, "archive": archive_store.main}
+
+def warm_up():
+    """预先导入各 CLI 并建好连接池 / 模板环境，第一次请求不用再等。"""
+    import api
+    import mongo
+    _commands()
+    api.get_session()
+    api.resolve_template("src/newsletter_template.html")
+    mongo.warm_up()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line.strip():
+            return  # 只是探测连接（例如 _clear_stale）
+        try:
+            req = json.loads(line)
+            resp = self.server.dispatch(req)
+        except ValueError as e:
+            resp = {"ok": False, "code": 2, "output": f"bad request: {e}"}
+        self.wfile.write(json.dumps(resp, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class BuildServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.commands = _commands()
+        self.job_lock = threading.Lock()
+        self.started = time.time()
+        self.jobs = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        _clear_stale(self.path)
+        old = os.umask(0o177)  # socket 文件只给当前用户读写
+        try:
+            super().__init__(str(self.path), _Handler)
+        finally:
+            os.umask(old)
+
+    def dispatch(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = req.get("cmd")
+        if cmd == "ping":
+            return {"ok": True, "code": 0, "pid": os.getpid(), "jobs": self.jobs,
+                    "uptime_s": round(time.time() - self.started, 1), "busy": self.job_lock.locked()}
+        if cmd == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"ok": True, "code": 0, "output": "shutting down"}
+        fn = self.commands.get(cmd)
+        args = req.get("args") or []
+        if fn is None or not isinstance(args, list):
+            return {"ok": False, "code": 2, "output": f"unknown command {cmd!r}; expected one of {sorted(self.commands)}"}
+        with self.job_lock:
+            return run_job(fn, [str(a) for a in args], self)
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+
+def run_job(fn: Callable[[List[str]], Any], args: List[str], server: Optional[BuildServer] = None) -> Dict[str, Any]:
+    """在本进程里跑一次 CLI main(args)，收集输出与退出码（SystemExit 不会结束守护进程）。"""
+    buf = io.StringIO()
+    code = 0
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+        try:
+            fn(args)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if isinstance(e.code, str):
+                print(e.code)
+        except Exception as e:
+            code = 1
+            print(f"[Error] {type(e).__name__}: {e}")
+    if server is not None:
+        server.jobs += 1
+    return {"ok": code == 0, "code": code, "output": buf.getvalue(), "elapsed_s": round(time.perf_counter() - t, 3)}
+
+def _clear_stale(path: Path):
+    """上次没正常退出留下的 socket 文件：连不上就删掉；有进程在监听则报错。"""
+    if not path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(str(path))
+        except OSError:
+            path.unlink()
+            return
+    raise SystemExit(f"already serving on {path}")
+
+def call(cmd: str, args: Optional[List[str]] = None, path: Path = SOCKET_PATH, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """客户端：发送一个请求并等待响应。"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(str(path))
+        s.sendall(json.dumps({"cmd": cmd, "args": args or []}).encode("utf-8") + b"\n")
+        with s.makefile("rb") as f:
+            return json.loads(f.readline())
+
+def main():
+    ap = argparse.ArgumentParser(description="Keep the newsletter CLIs warm behind a local socket")
+    ap.add_argument("--socket", default=str(SOCKET_PATH), help="Unix socket path (default .cache/techsum.sock, or TECHSUM_SOCKET)")
+    sub = ap.add_subparsers(dest="action")
+    c = sub.add_parser("call", help="send one request to a running server")
+    c.add_argument("cmd", help="build | send | subscribers | archive | ping | shutdown")
+    c.add_argument("args", nargs=argparse.REMAINDER, help="CLI arguments (after --)")
+    c.add_argument("--timeout", type=float, help="seconds to wait for the response")
+    args = ap.parse_args()
+
+    if args.action == "call":
+        rest = args.args[1:] if args.args[:1] == ["--"] else args.args
+        try:
+            resp = call(args.cmd, rest, Path(args.socket), args.timeout)
+        except OSError as e:
+            raise SystemExit(f"cannot reach {args.socket}: {e}")
+        if "output" in resp:
+            sys.stdout.write(resp["output"])
+        else:
+            print(json.dumps(resp))
+        if "elapsed_s" in resp:
+            print(f"⏱ {args.cmd} {resp['elapsed_s']:.2f}s (server)", file=sys.stderr)
+        sys.exit(resp.get("code", 1))
+
+    t = time.perf_counter()
+    server = BuildServer(Path(args.socket))
+    warm_up()
+    print(f"🚀 serving on {server.path} (pid {os.getpid()}, warm in {time.perf_counter() - t:.2f}s)", flush=True)
+    # SIGTERM（systemd / Railway 停止进程）同样走正常关闭，删除 socket 文件
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local SMTP stand-in for trying scripts/send_email.py without a real provider.
+
+- 接受任意登录（AUTH PLAIN / LOGIN，不要求 TLS）；发送端设 SMTP_HOST=127.0.0.1 SMTP_PORT=<port> SMTP_STARTTLS=0
+- 按收件域名模拟服务商限流：--limit gmail.com=5 表示该域名每秒最多接受 5 个收件人，
+  超出的在 RCPT 阶段回 450 4.2.1（临时拒绝）；--default-limit 作用于其余域名（0 为不限）
+- --latency 模拟每封邮件的处理耗时；--log 把接受的收件人逐行写成 JSONL
+- --fail-every N：每第 N 封新邮件在 DATA 阶段回 421（smtplib 收到后会断开连接），同一批收件人重试时放行；
+  用来检查发送端的重连与重试
+- 退出（Ctrl-C / SIGTERM）时打印各域名接受 / 限流的人数
+- 需要 aiosmtpd（pip install aiosmtpd）；只用于本地测试
+
+Usage:
+  python scripts/smtp_sandbox.py --port 2525 --limit gmail.com=5,outlook.com=2 --default-limit 20
+  SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_STARTTLS=0 EMAIL_USER=me@x.com EMAIL_PASS=x \
+    python scripts/send_email.py --file ... --to-file rcpts.txt --by-domain --workers 4 --domain-rate 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import threading
+import time
+from typing import Dict, List, Optional
+
+THROTTLE_REPLY = "450 4.2.1 Receiving mail at a rate that prevents additional messages from being delivered"
+FAULT_REPLY = "421 4.3.0 Temporary system problem, try again later"
+
+def parse_limits(spec: Optional[str]) -> Dict[str, float]:
+    """"gmail.com=5,outlook.com=2" → {域名: 每秒收件人数}。"""
+    out = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, rate = part.partition("=")
+        try:
+            out[name.strip().lower()] = float(rate)
+        except ValueError:
+            raise SystemExit(f"bad limit {part!r}; expected domain=rate")
+    return out
+
+
+class _Buckets:
+    """每个域名一个令牌桶（容量 = 1 秒的量）。"""
+
+    def __init__(self, limits: Dict[str, float], default: float):
+        self.limits, self.default = limits, default
+        self.state: Dict[str, List[float]] = {}  # 域名 → [令牌, 上次更新]
+        self.lock = threading.Lock()
+
+    def allow(self, domain: str) -> bool:
+        rate = self.limits.get(domain, self.default)
+        if rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            tokens, last = self.state.get(domain, (rate, now))
+            tokens = min(rate, tokens + (now - last) * rate)
+            ok = tokens >= 1
+            self.state[domain] = [tokens - 1 if ok else tokens, now]
+            return ok
+
+
+class SandboxHandler:
+    def __init__(self, limits: Dict[str, float], default_limit: float = 0.0, latency: float = 0.0,
+                 log: Optional[str] = None, fail_every: int = 0):
+        self.buckets = _Buckets(limits, default_limit)
+        self.latency = latency
+        self.log = log
+        self.fail_every = fail_every
+        self.stats: Dict[str, Dict[str, int]] = {}  # 域名 → {"accepted", "throttled"}
+        self.messages = 0
+        self.attempts = 0
+        self.faults = 0
+        self.failed: set = set()  # 回过 421 的收件人组合；重试时不再失败
+        self.lock = threading.Lock()
+
+    def _count(self, domain: str, key: str, n: int = 1):
+        with self.lock:
+            s = self.stats.setdefault(domain, {"accepted": 0, "throttled": 0})
+            s[key] += n
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        domain = address.rsplit("@", 1)[-1].lower()
+        if not self.buckets.allow(domain):
+            self._count(domain, "throttled")
+            return THROTTLE_REPLY
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with self.lock:
+            rcpts = tuple(envelope.rcpt_tos)
+            fault = False
+            if self.fail_every > 0 and rcpts not in self.failed:
+                self.attempts += 1
+                fault = self.attempts % self.fail_every == 0
+                if fault:
+                    self.failed.add(rcpts)
+                    self.faults += 1
+        if fault:
+            return FAULT_REPLY
+        now = time.time()
+        rows = []
+        for r in envelope.rcpt_tos:
+            self._count(r.rsplit("@", 1)[-1].lower(), "accepted")
+            rows.append(json.dumps({"rcpt": r, "from": envelope.mail_from, "bytes": len(envelope.content or b""), "ts": now}))
+        with self.lock:
+            self.messages += 1
+            if self.log and rows:
+                with open(self.log, "a", encoding="utf-8") as f:
+                    f.write("\n".join(rows) + "\n")
+        return "250 OK"
+
+    def report(self) -> str:
+        lines = [f"📮 {self.messages} messages" + (f", {self.faults} failed with 421" if self.faults else "")]
+        for d, s in sorted(self.stats.items(), key=lambda kv: -kv[1]["accepted"]):
+            lines.append(f"   {d:<24} accepted {s['accepted']:>6}  throttled {s['throttled']:>6}")
+        return "\n".join(lines)
+
+def start(host: str = "127.0.0.1", port: int = 2525, **kw):
+    """在后台线程里启动；返回 (controller, handler)，controller.stop() 关闭。"""
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+    except ImportError:
+        raise SystemExit("smtp_sandbox needs aiosmtpd: pip install aiosmtpd")
+    # aiosmtpd 每次登录都会记一条 login_data 的弃用日志，与发送端无关
+    logging.getLogger("mail.log").addFilter(lambda r: "login_data is deprecated" not in r.getMessage())
+    handler = SandboxHandler(**kw)
+    controller = Controller(handler, hostname=host, port=port, auth_require_tls=False,
+                            authenticator=lambda *a: AuthResult(success=True))
+    controller.start()
+    return controller, handler
+
+def main():
+    ap = argparse.ArgumentParser(description="Local SMTP server that simulates per-domain throttling")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2525)
+    ap.add_argument("--limit", help="per-domain recipients per second, e.g. gmail.com=5,outlook.com=2")
+    ap.add_argument("--default-limit", type=float, default=0.0, help="recipients per second for other domains (0 = unlimited)")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds spent on each message")
+    ap.add_argument("--log", help="append accepted recipients to this JSONL file")
+    ap.add_argument("--fail-every", type=int, default=0, help="answer every Nth message with 421 at DATA (0 = never)")
+    args = ap.parse_args()
+
+    controller, handler = start(args.host, args.port, limits=parse_limits(args.limit),
+                                default_limit=args.default_limit, latency=args.latency, log=args.log,
+                                fail_every=args.fail_every)
+    print(f"🧪 SMTP sandbox on {args.host}:{args.port} (SMTP_STARTTLS=0)", flush=True)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+        print(handler.report())
+
+if __name__ == "__main__":
+    main()
@@ -20,43 +20,60 @@ Usage examples:
 
   # 5) 列表（可过滤）
   python scripts/subscribers.py list --status active --tags preview --limit 100
+  python scripts/subscribers.py list --limit 100 --after bob@example.com   # 下一页（按 email_lc 翻页）
 
-  # 6) 导入CSV（列：email,status,tags；tags用逗号）
-  python scripts/subscribers.py import-csv --file subs.csv --default-status active --default-tags preview
+  # 6) 导入CSV（列：email,status,tags；tags用逗号）；按批 bulk_write 无序 upsert
+  python scripts/subscribers.py import-csv --file subs.csv --default-status active --default-tags preview --batch-size 1000
 
   # 7) 导出CSV（可过滤）
   python scripts/subscribers.py export-csv --file out.csv --status active --tags preview
 
-  # 8) 建索引（唯一约束 email_lc）
+  # 8) 建索引（唯一约束 email_lc）；没有 email_lc 的旧文档先按 email 补上
   python scripts/subscribers.py ensure-index
+
+  # 9) 统计（读汇总文档；--refresh 用一次 $facet 聚合重算，import-csv 之后会自动重算）
+  python scripts/subscribers.py stats --refresh
 """
 
-import os, csv, argparse, sys
-from typing import List
-from pymongo import MongoClient, ASCENDING
-from pymongo.server_api import ServerApi
+import os, csv, argparse, sys, time
+from typing import Dict, List
+
+import mongo
 
-try:
-    from dotenv import load_dotenv
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    load_dotenv(os.path.join(BASE_DIR, ".env"))
-except Exception:
-    pass
+# pymongo / dotenv 在解析完参数后才导入：--help 不连库也不付导入开销
 
-DBNAME  = os.getenv("MONGODB_DB", "techsum")
-COLL    = os.getenv("MONGODB_COLL", "subscribers")
-URI     = os.getenv("MONGODB_URI")
+def load_env():
+    try:
+        from dotenv import load_dotenv
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        load_dotenv(os.path.join(base_dir, ".env"))
+    except Exception:
+        pass
 
 def col():
-    assert URI, "MONGODB_URI not set"
-    client = MongoClient(URI, server_api=ServerApi('1'), serverSelectionTimeoutMS=8000)
-    return client[DBNAME][COLL]
+    c = mongo.get_collection()
+    assert c is not None, "MONGODB_URI not set"
+    return c
 
 def parse_tags(s: str | None) -> List[str]:
     if not s: return []
     parts = [x.strip() for x in s.replace(";",",").split(",")]
     return [p for p in parts if p]
 
+# 单条修改：取回修改前的文档，按前后状态增量更新统计汇总（mongo.apply_stats_delta）
+_SHAPE = {"_id": 0, "email_lc": 1, "status": 1, "tags": 1}
+
+def tracked_update(c, email_lc: str, update: dict, after, upsert: bool = False):
+    """after(before) 给出修改后的文档；返回 (before, after)，不存在且未 upsert 时都为 None。"""
+    from pymongo import ReturnDocument
+    before = c.find_one_and_update({"email_lc": email_lc}, update, projection=_SHAPE,
+                                   upsert=upsert, return_document=ReturnDocument.BEFORE)
+    if before is None and not upsert:
+        return None, None
+    new = after(before)
+    mongo.apply_stats_delta(before, new)
+    return before, new
+
 def cmd_add(args):
     c = col()
     email = args.email.strip()
@@ -66,54 +83,101 @@ def cmd_add(args):
         "status": args.status,
         "tags": parse_tags(args.tags) or [],
     }
-    res = c.update_one({"email_lc": doc["email_lc"]}, {"$set": doc}, upsert=True)
-    if res.matched_count: print(f"✅ updated: {email}")
-    else:                 print(f"✅ inserted: {email}")
+    before, _ = tracked_update(c, doc["email_lc"], {"$set": doc}, lambda b: doc, upsert=True)
+    if before is not None: print(f"✅ updated: {email}")
+    else:                  print(f"✅ inserted: {email}")
 
 def cmd_remove(args):
     c = col()
     email_lc = args.email.strip().lower()
-    res = c.delete_one({"email_lc": email_lc})
-    print(f"🗑 deleted: {res.deleted_count}")
+    before = c.find_one_and_delete({"email_lc": email_lc}, projection=_SHAPE)
+    mongo.apply_stats_delta(before, None)
+    print(f"🗑 deleted: {int(before is not None)}")
 
 def cmd_set_status(args):
     c = col()
     email_lc = args.email.strip().lower()
-    res = c.update_one({"email_lc": email_lc}, {"$set": {"status": args.status}})
-    print(f"✅ set-status affected: {res.modified_count}")
+    b, a = tracked_update(c, email_lc, {"$set": {"status": args.status}}, lambda b: {**b, "status": args.status})
+    print(f"✅ set-status affected: {int(b is not None and b != a)}")
 
 def cmd_add_tags(args):
     c = col()
     email_lc = args.email.strip().lower()
     tags = parse_tags(args.tags)
-    res = c.update_one({"email_lc": email_lc}, {"$addToSet": {"tags": {"$each": tags}}})
-    print(f"✅ add-tags affected: {res.modified_count}")
+    b, a = tracked_update(c, email_lc, {"$addToSet": {"tags": {"$each": tags}}},
+                          lambda b: {**b, "tags": (b.get("tags") or []) + [t for t in dict.fromkeys(tags) if t not in (b.get("tags") or [])]})
+    print(f"✅ add-tags affected: {int(b is not None and b != a)}")
 
 def cmd_remove_tags(args):
     c = col()
     email_lc = args.email.strip().lower()
     tags = parse_tags(args.tags)
-    res = c.update_one({"email_lc": email_lc}, {"$pull": {"tags": {"$in": tags}}})
-    print(f"✅ remove-tags affected: {res.modified_count}")
+    b, a = tracked_update(c, email_lc, {"$pull": {"tags": {"$in": tags}}},
+                          lambda b: {**b, "tags": [t for t in (b.get("tags") or []) if t not in tags]})
+    print(f"✅ remove-tags affected: {int(b is not None and b != a)}")
 
 def cmd_list(args):
-    c = col()
-    q = {}
-    if args.status: q["status"] = args.status
-    if args.tags:   q["tags"]   = {"$in": parse_tags(args.tags)}
-    cur = c.find(q, {"_id":0,"email":1,"status":1,"tags":1}).sort("email_lc", ASCENDING)
-    if args.limit: cur = cur.limit(int(args.limit))
+    cur = mongo.find_subscribers(args.status, parse_tags(args.tags), args.limit, coll=col(), after=args.after)
     cnt = 0
+    last = None
     for d in cur:
         print(f"{d.get('email'):40s}  status={d.get('status','')}  tags={','.join(d.get('tags',[]))}")
         cnt += 1
+        last = d.get("email_lc")
     print(f"Total: {cnt}")
+    if args.limit and cnt == args.limit and last:
+        print(f"Next page: --after {last}")
+
+def cmd_stats(args):
+    c = col()
+    t = time.monotonic()
+    if args.refresh:
+        mongo.refresh_stats(c)
+    doc = mongo.read_stats()
+    if doc is None:
+        print("No stats yet; run: python scripts/subscribers.py stats --refresh")
+        return
+    print(f"Total: {doc.get('total', 0)}  (refreshed {doc.get('refreshed_at', '-')}, updated {doc.get('updated_at', '-')}, "
+          f"{(time.monotonic() - t) * 1000:.0f}ms)")
+    for name, counts in (("status", doc.get("status", {})), ("tags", doc.get("tags", {}))):
+        for k, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+            if n:
+                print(f"  {name:<6} {k:<24} {n}")
+
+def flush_upserts(c, batch: Dict[str, dict]) -> tuple[int, int]:
+    """一次 bulk_write 提交一批（无序）；返回 (成功写入数, 错误数)。"""
+    if not batch:
+        return 0, 0
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+    ops = [UpdateOne({"email_lc": k}, {"$set": doc}, upsert=True) for k, doc in batch.items()]
+    try:
+        res = c.bulk_write(ops, ordered=False)
+        return res.upserted_count + res.matched_count, 0
+    except BulkWriteError as e:
+        d = e.details
+        errs = len(d.get("writeErrors", []))
+        return d.get("nUpserted", 0) + d.get("nMatched", 0), errs
 
 def cmd_import_csv(args):
     c = col()
     default_status = args.default_status
     default_tags   = parse_tags(args.default_tags)
-    n=0
+    size = max(1, args.batch_size)
+    n = ok = errs = 0
+    nb = 0
+    batch: Dict[str, dict] = {}  # email_lc -> doc；同批内重复地址以最后一行为准
+    t0 = time.monotonic()
+
+    def flush():
+        nonlocal ok, errs, nb
+        t = time.monotonic()
+        w, e = flush_upserts(c, batch)
+        nb += 1; ok += w; errs += e
+        dt = max(time.monotonic() - t, 1e-9)
+        print(f"  batch {nb}: {len(batch)} upserts, {e} errors, {len(batch)/dt:.0f} rows/s")
+        batch.clear()
+
     with open(args.file, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -122,16 +186,21 @@ def cmd_import_csv(args):
             status = (row.get("status") or default_status).strip()
             tags   = parse_tags(row.get("tags")) or default_tags
             doc = {"email": email, "email_lc": email.lower(), "status": status, "tags": tags}
-            c.update_one({"email_lc": doc["email_lc"]}, {"$set": doc}, upsert=True)
+            batch[doc["email_lc"]] = doc
             n += 1
-    print(f"✅ imported/upserted: {n}")
+            if len(batch) >= size:
+                flush()
+    if batch:
+        flush()
+    dt = max(time.monotonic() - t0, 1e-9)
+    print(f"✅ imported/upserted: {ok} (rows {n}, errors {errs}, {n/dt:.0f} rows/s)")
+    # 批量 upsert 拿不到修改前的文档，直接整体重算汇总
+    t = time.monotonic()
+    stats = mongo.refresh_stats(c)
+    print(f"📊 stats refreshed: total {stats['total']} ({(time.monotonic() - t) * 1000:.0f}ms)")
 
 def cmd_export_csv(args):
-    c = col()
-    q = {}
-    if args.status: q["status"] = args.status
-    if args.tags:   q["tags"]   = {"$in": parse_tags(args.tags)}
-    cur = c.find(q, {"_id":0,"email":1,"status":1,"tags":1}).sort("email_lc", ASCENDING)
+    cur = mongo.find_subscribers(args.status, parse_tags(args.tags), coll=col())
     with open(args.file, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["email","status","tags"])
@@ -141,15 +210,45 @@ def cmd_export_csv(args):
             n+=1
     print(f"✅ exported: {n} -> {args.file}")
 
+def backfill_email_lc(c):
+    """没有 email_lc 的旧文档：按 email 补上（去空白、小写）。地址已被别的文档占用的不动。返回 (补上, 冲突)。"""
+    from pymongo.errors import DuplicateKeyError
+    fixed = conflicts = 0
+    for d in c.find({"email_lc": None, "email": {"$type": "string"}}, {"_id": 1, "email": 1}):
+        e = d["email"].strip().lower()
+        if not e:
+            continue
+        if c.count_documents({"email_lc": e}, limit=1):
+            conflicts += 1
+            continue
+        try:
+            c.update_one({"_id": d["_id"]}, {"$set": {"email_lc": e}})
+            fixed += 1
+        except DuplicateKeyError:
+            conflicts += 1
+    return fixed, conflicts
+
 def cmd_ensure_index(_):
+    from pymongo import ASCENDING
     c = col()
+    # 先补 email_lc：否则多条缺字段的旧文档在唯一索引里都是 null，建索引会失败，发送时也只能逐条读文档
+    fixed, conflicts = backfill_email_lc(c)
+    if fixed or conflicts:
+        print(f"email_lc backfilled: {fixed}" + (f" ({conflicts} left as-is: address already taken)" if conflicts else ""))
+    if fixed:
+        mongo.refresh_stats(c)  # 补上的文档从此计入统计
     # email_lc 唯一索引；另外建 status / tags 的普通索引
     c.create_index([("email_lc", ASCENDING)], unique=True, name="uniq_email_lc")
     c.create_index([("status", ASCENDING)], name="idx_status")
     c.create_index([("tags", ASCENDING)],   name="idx_tags")
+    # send_email 拉收件人（按 status 过滤、只取 email_lc）：两个字段都不是数组，查询只读索引、不取文档。
+    # 旧版本建的 {status, email_lc, tags} 含数组字段 tags，是 multikey 索引，覆盖不了，删掉
+    c.create_index([("status", ASCENDING), ("email_lc", ASCENDING)], name="idx_status_email")
+    if "idx_status_email_tags" in c.index_information():
+        c.drop_index("idx_status_email_tags")
     print("✅ indexes ensured")
 
-def main():
+def main(argv=None):
     p = argparse.ArgumentParser()
     sub = p.add_subparsers(dest="cmd", required=True)
 
@@ -158,16 +257,21 @@ def main():
     s = sub.add_parser("set-status");    s.add_argument("--email", required=True); s.add_argument("--status", required=True); s.set_defaults(func=cmd_set_status)
     s = sub.add_parser("add-tags");      s.add_argument("--email", required=True); s.add_argument("--tags", required=True); s.set_defaults(func=cmd_add_tags)
     s = sub.add_parser("remove-tags");   s.add_argument("--email", required=True); s.add_argument("--tags", required=True); s.set_defaults(func=cmd_remove_tags)
-    s = sub.add_parser("list");          s.add_argument("--status"); s.add_argument("--tags"); s.add_argument("--limit", type=int); s.set_defaults(func=cmd_list)
-    s = sub.add_parser("import-csv");    s.add_argument("--file", required=True); s.add_argument("--default-status", default="active"); s.add_argument("--default-tags"); s.set_defaults(func=cmd_import_csv)
+    s = sub.add_parser("list");          s.add_argument("--status"); s.add_argument("--tags"); s.add_argument("--limit", type=int); s.add_argument("--after", help="email_lc of the last row of the previous page"); s.set_defaults(func=cmd_list)
+    s = sub.add_parser("import-csv");    s.add_argument("--file", required=True); s.add_argument("--default-status", default="active"); s.add_argument("--default-tags"); s.add_argument("--batch-size", type=int, default=1000); s.set_defaults(func=cmd_import_csv)
     s = sub.add_parser("export-csv");    s.add_argument("--file", required=True); s.add_argument("--status"); s.add_argument("--tags"); s.set_defaults(func=cmd_export_csv)
     s = sub.add_parser("ensure-index");  s.set_defaults(func=cmd_ensure_index)
+    s = sub.add_parser("stats");         s.add_argument("--refresh", action="store_true", help="recompute with one $facet aggregation"); s.set_defaults(func=cmd_stats)
 
-    args = p.parse_args()
+    args = p.parse_args(argv)
+    load_env()
+    mongo.warm_up()
     try:
         args.func(args)
     except AssertionError as e:
         print(f"[ERR] {e}", file=sys.stderr); sys.exit(1)
+    finally:
+        mongo.report(f"subscribers {args.cmd}")
 
 if __name__ == "__main__":
     main()
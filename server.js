@@ -139,26 +139,28 @@ app.get('/api/health', (req, res) => {
 // 订阅者统计（需要认证）
 app.get('/api/stats', requireAuth, async (req, res) => {
   try {
-    const { getCollection } = await import('./lib/mongo.js');
+    const { getCollection, readStats } = await import('./lib/mongo.js');
     const coll = await getCollection();
     
-    // 排除 email_lc 为 null 的旧数据
-    const total = await coll.countDocuments({ email_lc: { $ne: null } });
-    const active = await coll.countDocuments({ status: 'active', email_lc: { $ne: null } });
-    const inactive = await coll.countDocuments({ status: 'inactive', email_lc: { $ne: null } });
+    // 计数读预先汇总的统计文档（排除 email_lc 为 null 的旧数据），不再每次扫全表
+    const stats = await readStats();
     
-    // 获取所有订阅者（按更新时间排序）
+    // 最近更新的订阅者（按更新时间排序），最多 ?limit= 条（默认 500）
     // 过滤掉 email_lc 为 null 的旧数据
+    const limit = Math.min(Math.max(parseInt(req.query.limit, 10) || 500, 1), 5000);
     const all = await coll.find({ email_lc: { $ne: null } })
       .sort({ updatedAt: -1, createdAt: -1 })
       .project({ _id: 0, email: 1, status: 1, tags: 1, updatedAt: 1, createdAt: 1 })
+      .limit(limit)
       .toArray();
     
     res.json({
       ok: true,
-      total,
-      active,
-      inactive,
+      total: stats.total || 0,
+      active: stats.status?.active || 0,
+      inactive: stats.status?.inactive || 0,
+      tags: stats.tags || {},
+      stats_updated_at: stats.updated_at,
       recent: all.map(d => ({
         email: d.email,
         status: d.status,
@@ -176,7 +178,7 @@ app.get('/api/stats', requireAuth, async (req, res) => {
 // 更新订阅者标签（需要认证）
 app.patch('/api/subscribers/:email/tags', requireAuth, async (req, res) => {
   try {
-    const { getCollection } = await import('./lib/mongo.js');
+    const { getCollection, applyStatsDelta } = await import('./lib/mongo.js');
     const coll = await getCollection();
     const email = decodeURIComponent(req.params.email).toLowerCase().trim();
     const { tag, add } = req.body;
@@ -208,6 +210,7 @@ app.patch('/api/subscribers/:email/tags', requireAuth, async (req, res) => {
     );
     
     if (result.modifiedCount > 0 || result.matchedCount > 0) {
+      await applyStatsDelta(doc, { ...doc, tags: newTags });
       res.json({ ok: true, tags: newTags });
     } else {
       res.status(404).json({ ok: false, error: 'Subscriber not found' });
@@ -221,19 +224,20 @@ app.patch('/api/subscribers/:email/tags', requireAuth, async (req, res) => {
 // 删除订阅者（需要认证）
 app.delete('/api/subscribers/:email', requireAuth, async (req, res) => {
   try {
-    const { getCollection } = await import('./lib/mongo.js');
+    const { getCollection, applyStatsDelta } = await import('./lib/mongo.js');
     const coll = await getCollection();
     const email = decodeURIComponent(req.params.email).toLowerCase().trim();
     
-    // 尝试用 email 或 email_lc 字段删除（兼容不同数据格式）
-    const result = await coll.deleteOne({ 
+    // 尝试用 email 或 email_lc 字段删除（兼容不同数据格式）；取回被删文档以更新统计
+    const deleted = await coll.findOneAndDelete({ 
       $or: [
         { email: email },
         { email_lc: email }
       ]
     });
     
-    if (result.deletedCount > 0) {
+    if (deleted) {
+      await applyStatsDelta(deleted, null);
       res.json({ ok: true, message: `Deleted ${email}` });
     } else {
       res.status(404).json({ ok: false, error: 'Subscriber not found' });
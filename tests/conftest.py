@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared fixtures for the scripts/ tests (run from the repo root: python -m pytest -q tests).
+
+- scripts/ 不是包，这里把它放进 sys.path，测试里直接 import api / send_email / ...
+- stub_api：本地假接口（ThreadingHTTPServer，后台线程），按分类返回 bench.make_corpus 的种子语料
+"""
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from bench import make_corpus  # noqa: E402
+
+
+class StubAPI:
+    """
+    GET /<category> 返回 corpus[category]。每个请求先睡 latency 秒；fail[cat] = k 让该分类接下来
+    k 个请求回 503；delay[cat] 为额外延迟。响应带 ETag / Last-Modified，条件请求命中时回 304；
+    set_body 换内容（ETag 随之改变）。hits 记录每个分类收到的请求数，codes 记录各状态码的次数。
+    """
+
+    def __init__(self, corpus: Dict[str, Any], latency: float = 0.0):
+        self.bodies: Dict[str, bytes] = {}
+        self.etags: Dict[str, str] = {}
+        self.modified: Dict[str, str] = {}
+        for cat, data in corpus.items():
+            self.set_body(cat, data)
+        self.latency = latency
+        self.fail: Dict[str, int] = {}
+        self.delay: Dict[str, float] = {}
+        self.hits: Dict[str, int] = {}
+        self.codes: Dict[int, int] = {}
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def set_body(self, cat: str, data: Any) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.bodies[cat] = body
+        self.etags[cat] = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        self.modified[cat] = formatdate(time.time(), usegmt=True)
+
+    def reset_counts(self) -> None:
+        with self.lock:
+            self.hits, self.codes = {}, {}
+
+    @property
+    def requests(self) -> int:
+        return sum(self.hits.values())
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive：连接复用才看得出来
+
+            def log_message(self, *a):
+                pass
+
+            def do_GET(self):
+                cat = self.path.strip("/").split("?")[0]
+                with stub.lock:
+                    stub.hits[cat] = stub.hits.get(cat, 0) + 1
+                    failing = stub.fail.get(cat, 0) > 0
+                    if failing:
+                        stub.fail[cat] -= 1
+                time.sleep(stub.latency + stub.delay.get(cat, 0.0))
+                body = stub.bodies.get(cat)
+                code = 503 if failing else (200 if body is not None else 404)
+                headers = {}
+                if code == 200:
+                    headers = {"ETag": stub.etags[cat], "Last-Modified": stub.modified[cat]}
+                    inm, ims = self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")
+                    if (inm == stub.etags[cat]) if inm else (ims == stub.modified[cat]):
+                        code = 304
+                with stub.lock:
+                    stub.codes[code] = stub.codes.get(code, 0) + 1
+                self.send_response(code)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                if code == 304:
+                    self.end_headers()
+                    return
+                body = body if code == 200 else b"{}"
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def endpoints(self) -> Dict[str, str]:
+        host, port = self.server.server_address[:2]
+        return {cat: f"http://{host}:{port}/{cat}" for cat in self.bodies}
+
+    def __enter__(self) -> "StubAPI":
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.server.block_on_close = False  # 超过截止时间被放弃的请求不拖住退出
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def titles(results: Dict[str, Any]) -> Dict[str, Any]:
+    """fetch_all 的结果 → {分类: 标题列表 或 异常}，便于整体比较。"""
+    return {cat: r if isinstance(r, Exception) else [x.title for x in r] for cat, r in results.items()}
+
+
+@pytest.fixture(scope="session")
+def corpus() -> Dict[str, Any]:
+    return make_corpus(300, seed=42)
+
+
+@pytest.fixture
+def stub_api(corpus):
+    with StubAPI(corpus) as srv:
+        yield srv
+
+
+@pytest.fixture
+def smtp_sandbox(tmp_path, monkeypatch):
+    """
+    进程内的 smtp_sandbox（需要 aiosmtpd，没有则跳过），send_email 指向它。
+    返回 handler：handler.log 为接受的收件人 JSONL，latency / fail_every 可在测试里改。
+    """
+    pytest.importorskip("aiosmtpd")
+    import socket
+    import send_email
+    import smtp_sandbox
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(send_email, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(send_email, "SMTP_PORT", port)
+    monkeypatch.setattr(send_email, "SMTP_STARTTLS", False)
+    controller, handler = smtp_sandbox.start("127.0.0.1", port, limits={}, log=str(tmp_path / "accepted.jsonl"))
+    handler.port = port
+    try:
+        yield handler
+    finally:
+        controller.stop()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""api.fetch_all against the local stub API: same items as the old serial loop, concurrency, retries, deadline."""
+
+import time
+
+import requests
+
+import api
+from conftest import titles
+
+TOKEN = "test-token"
+
+
+def serial_fetch(endpoints):
+    """原先的写法：逐个 requests.get，没有连接复用。"""
+    out = {}
+    for cat, url in endpoints.items():
+        r = requests.get(url, headers=api._auth_headers(TOKEN), timeout=30)
+        r.raise_for_status()
+        out[cat] = api.normalize_items(r.json(), cat)
+    return out
+
+
+def test_same_items_as_serial(stub_api):
+    endpoints = stub_api.endpoints()
+    want = titles(serial_fetch(endpoints))
+    assert sum(len(v) for v in want.values()) > 0
+    assert titles(api.fetch_all(endpoints, TOKEN)) == want
+
+
+def test_concurrent_is_faster(stub_api):
+    endpoints = stub_api.endpoints()
+    stub_api.latency = 0.3
+    t0 = time.perf_counter()
+    serial_fetch(endpoints)
+    t1 = time.perf_counter()
+    api.fetch_all(endpoints, TOKEN)
+    t2 = time.perf_counter()
+    # 串行约为 分类数 × latency，并发约为一个 latency
+    assert t2 - t1 < (t1 - t0) / 1.7
+
+
+def test_503_is_retried(stub_api):
+    endpoints = stub_api.endpoints()
+    cat = next(iter(endpoints))
+    stub_api.fail[cat] = 2
+    res = api.fetch_all(endpoints, TOKEN)
+    assert not isinstance(res[cat], Exception)
+    assert stub_api.hits[cat] == 3
+    assert stub_api.codes[503] == 2
+
+
+def test_deadline_only_drops_the_slow_category(stub_api):
+    endpoints = stub_api.endpoints()
+    cat = next(iter(endpoints))
+    deadline = 1.0
+    stub_api.delay[cat] = deadline + 1.0
+    t0 = time.perf_counter()
+    res = api.fetch_all(endpoints, TOKEN, deadline=deadline)
+    took = time.perf_counter() - t0
+    assert isinstance(res[cat], TimeoutError)
+    assert not any(isinstance(res[c], Exception) for c in endpoints if c != cat)
+    assert took < deadline + 0.5
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""ResponseCache through api.fetch_all: TTL hits, ETag/304 revalidation, changed bodies, --offline, token scoping."""
+
+import pytest
+
+import api
+from bench import make_corpus
+from conftest import titles
+from http_cache import CacheMiss, ResponseCache
+
+TOKEN = "test-token"
+STREAMS = [False, pytest.param(True, marks=pytest.mark.skipif(api.load_ijson() is None, reason="needs ijson"))]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(tmp_path / "cache", ttl=60)
+
+
+@pytest.fixture
+def warm(stub_api, cache):
+    """缓存里已有全部分类；返回不走缓存时的结果，计数清零。"""
+    endpoints = stub_api.endpoints()
+    want = titles(api.fetch_all(endpoints, TOKEN))
+    api.fetch_all(endpoints, TOKEN, cache=cache)
+    stub_api.reset_counts()
+    return want
+
+
+def test_cold_downloads_and_matches_uncached(stub_api, cache):
+    endpoints = stub_api.endpoints()
+    want = titles(api.fetch_all(endpoints, TOKEN))
+    stub_api.reset_counts()
+    assert titles(api.fetch_all(endpoints, TOKEN, cache=cache)) == want
+    assert stub_api.codes == {200: len(endpoints)}
+
+
+@pytest.mark.parametrize("stream", STREAMS)
+def test_fresh_entries_send_no_request(stub_api, cache, warm, stream):
+    assert titles(api.fetch_all(stub_api.endpoints(), TOKEN, cache=cache, stream=stream)) == warm
+    assert stub_api.requests == 0
+
+
+@pytest.mark.parametrize("stream", STREAMS)
+def test_stale_entries_revalidate_with_304(stub_api, cache, warm, stream):
+    cache.ttl = 0
+    assert titles(api.fetch_all(stub_api.endpoints(), TOKEN, cache=cache, stream=stream)) == warm
+    assert stub_api.codes == {304: len(warm)}
+
+
+def test_changed_body_is_downloaded_again(stub_api, cache, warm):
+    endpoints = stub_api.endpoints()
+    cat = next(iter(endpoints))
+    stub_api.set_body(cat, make_corpus(300, seed=43)[cat])
+    want = {**warm, cat: titles(api.fetch_all({cat: endpoints[cat]}, TOKEN))[cat]}
+    assert want[cat] != warm[cat]
+    stub_api.reset_counts()
+    cache.ttl = 0
+    assert titles(api.fetch_all(endpoints, TOKEN, cache=cache)) == want
+    assert stub_api.codes == {200: 1, 304: len(endpoints) - 1}
+
+
+def test_offline_reads_only_the_cache(stub_api, cache, warm):
+    cache.ttl = 0  # 过期也不发请求
+    assert titles(api.fetch_all(stub_api.endpoints(), TOKEN, cache=cache, offline=True)) == warm
+    assert stub_api.requests == 0
+
+
+def test_offline_with_empty_cache_raises_cache_miss(stub_api, tmp_path):
+    res = api.fetch_all(stub_api.endpoints(), TOKEN, cache=ResponseCache(tmp_path / "empty"), offline=True)
+    assert all(isinstance(r, CacheMiss) for r in res.values())
+    assert stub_api.requests == 0
+
+
+def test_other_token_does_not_share_entries(stub_api, cache, warm):
+    assert titles(api.fetch_all(stub_api.endpoints(), TOKEN + "-2", cache=cache)) == warm
+    assert stub_api.codes == {200: len(warm)}
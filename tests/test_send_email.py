@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""send_email.deliver against the in-process SMTP sandbox: reconnects and retries, exactly-once delivery, pool speedup."""
+
+import json
+import smtplib
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+import send_email
+
+USER = "test@example.com"
+PAYLOAD = "Subject: test\nFrom: test@example.com\n\n" + ("x" * 76 + "\n") * 26
+DOMAINS = ["gmail.com", "outlook.com", "qq.com", "example.org"]
+
+
+def recipients(n):
+    return [f"user{i}@{DOMAINS[i % len(DOMAINS)]}" for i in range(n)]
+
+
+def batched(rcpts, size=5):
+    return [rcpts[i:i + size] for i in range(0, len(rcpts), size)]
+
+
+def accepted(handler) -> Counter:
+    log = Path(handler.log)
+    return Counter(json.loads(line)["rcpt"] for line in log.read_text().splitlines()) if log.exists() else Counter()
+
+
+def old_loop(port, batches):
+    """原先的发送循环：一条连接，逐批 sendmail（不 sleep）。"""
+    with smtplib.SMTP("127.0.0.1", port, timeout=30) as s:
+        s.login(USER, "x")
+        for chunk in batches:
+            s.sendmail(USER, chunk, PAYLOAD)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_faults_are_retried_and_each_recipient_gets_one_copy(smtp_sandbox, workers):
+    rcpts = recipients(100)
+    smtp_sandbox.fail_every = 7  # 每第 7 封新邮件回 421，同一批重试时放行
+    sent, failed = send_email.deliver(batched(rcpts), USER, "x", PAYLOAD, workers=workers, retries=3, backoff=0.05)
+    assert (sent, failed) == (len(rcpts), [])
+    assert smtp_sandbox.faults > 0
+    got = accepted(smtp_sandbox)
+    assert set(got) == set(rcpts)
+    assert max(got.values()) == 1
+
+
+def test_pool_outpaces_the_old_loop(smtp_sandbox):
+    rcpts = recipients(100)
+    smtp_sandbox.latency = 0.1  # 每封邮件 0.1 秒：连接数才是瓶颈
+    t0 = time.perf_counter()
+    old_loop(smtp_sandbox.port, batched(rcpts))
+    t1 = time.perf_counter()
+    sent, failed = send_email.deliver(batched(rcpts), USER, "x", PAYLOAD, workers=4, retries=3, backoff=0.05)
+    t2 = time.perf_counter()
+    assert (sent, failed) == (len(rcpts), [])
+    assert accepted(smtp_sandbox) == Counter({r: 2 for r in rcpts})  # 两轮各一次
+    assert (t1 - t0) / (t2 - t1) > 1.5